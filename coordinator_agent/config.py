@@ -5,6 +5,20 @@ load_dotenv()
 
 LLM_MODEL_ID = os.getenv('LLM_MODEL_ID')
 
+# LLMバックエンド: gemini (デフォルト) / fake (オフライン負荷試験用の疑似LLM)
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'gemini')
+
+# 疑似LLMの設定 (LLM_BACKEND=fake のときのみ使用)
+FAKE_LLM_SEED = int(os.getenv('FAKE_LLM_SEED', '0'))
+FAKE_LLM_LATENCY_MS = float(os.getenv('FAKE_LLM_LATENCY_MS', '0'))
+FAKE_LLM_LATENCY_JITTER_MS = float(os.getenv('FAKE_LLM_LATENCY_JITTER_MS', '0'))
+# fixed / uniform / normal / lognormal
+FAKE_LLM_LATENCY_DISTRIBUTION = os.getenv('FAKE_LLM_LATENCY_DISTRIBUTION', 'fixed')
+FAKE_LLM_TOKEN_INTERVAL_MS = float(os.getenv('FAKE_LLM_TOKEN_INTERVAL_MS', '0'))
+FAKE_LLM_CHUNK_SIZE = int(os.getenv('FAKE_LLM_CHUNK_SIZE', '8'))
+# 応答スクリプト(JSON)のパス。未指定の場合は fake_llm_script.json を使用
+FAKE_LLM_SCRIPT = os.getenv('FAKE_LLM_SCRIPT', '')
+
 UCHINA_GUCHI_AGENT_URL = os.getenv('UCHINA_GUCHI_AGENT_URL')
 
 # 必要に応じて他のエージェントのURLもここに追加
@@ -23,9 +23,10 @@ from a2a.types import (
 )
 
 from remote_agent_connection import RemoteAgentConnections, TaskUpdateCallback
+from llm_backend import create_model
 
 # 各エージェントのURLを環境変数から取得（必要に応じて追加する）
-from config import LLM_MODEL_ID, UCHINA_GUCHI_AGENT_URL
+from config import UCHINA_GUCHI_AGENT_URL
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -122,7 +123,7 @@ class CoordinatorAgent:
 
     def create_agent(self) -> Agent:
         return Agent(
-            model=LLM_MODEL_ID,
+            model=create_model(),
             name="コーディネーターエージェント",
             instruction=self.coordinator_instruction,
             before_model_callback=self.before_model_callback,
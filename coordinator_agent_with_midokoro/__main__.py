@@ -0,0 +1,124 @@
+import asyncio
+import click
+import os
+
+from a2a.server.apps import A2AStarletteApplication
+from a2a.types import (
+    AgentCapabilities,
+    AgentCard,
+    AgentSkill,
+)
+from google.adk.artifacts import InMemoryArtifactService
+from google.adk.memory import InMemoryMemoryService
+from google.adk.runners import Runner
+
+from coordinator_agent import CoordinatorAgent
+from coordinator_executor import CoordinatorAgentExecutor
+from lifecycle import ServerLifecycle
+from draining_request_handler import DrainingRequestHandler
+from session_service import create_session_service
+from task_store import create_task_store
+from config import (
+    LLM_BACKEND,
+    SESSION_CACHE_SIZE,
+    SHUTDOWN_GRACE_PERIOD,
+)
+
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from logging import getLogger
+logger = getLogger(__name__)
+
+
+def create_agent_card(host: str, port: int) -> AgentCard:
+    skill = AgentSkill(
+        id="okinawa_coordinator",
+        name="Okinawa-Coordinator",
+        description=(
+            "沖縄方言エージェントと見どころエージェントに問い合わせを振り分け、"
+            "回答をまとめて返します。"
+        ),
+        tags=["coordinator", "沖縄", "方言", "観光"],
+        examples=["首里城について沖縄方言で教えて", "沖縄のおすすめビーチはどこ?"],
+    )
+
+    return AgentCard(
+        name="coordinator_agent",
+        description="沖縄方言と沖縄の見どころについての問い合わせを、登録されたエージェントに振り分けるコーディネーターです。",
+        url=f"http://{host}:{port}/",
+        version="0.0.1",
+        defaultInputModes=["text"],
+        defaultOutputModes=["text"],
+        capabilities=AgentCapabilities(streaming=True),
+        skills=[skill],
+    )
+
+
+async def serve(host: str, port: int):
+    # 登録簿の監視やヘルスチェックはサーバーと同じイベントループで動かす
+    coordinator = await CoordinatorAgent.create()
+    try:
+        agent_card = create_agent_card(host, port)
+
+        runner = Runner(
+            app_name=agent_card.name,
+            agent=coordinator.create_agent(),
+            artifact_service=InMemoryArtifactService(),
+            session_service=create_session_service(),
+            memory_service=InMemoryMemoryService(),
+        )
+
+        # contextId ごとのセッションでコーディネーターを実行し、回答をストリーミングで返す
+        agent_executor = CoordinatorAgentExecutor(
+            runner, session_cache_size=SESSION_CACHE_SIZE
+        )
+
+        # 停止処理中は新しいメッセージを受け付けない
+        request_handler = DrainingRequestHandler(
+            agent_executor=agent_executor,
+            task_store=create_task_store(),
+        )
+
+        # A2Aサーバー
+        a2a_app = A2AStarletteApplication(
+            agent_card=agent_card, http_handler=request_handler
+        )
+
+        # 停止時は新しいタスクの受け付けを止め、実行中のタスクの完了を猶予期間まで待つ
+        # /readyz は問い合わせ可能なエージェントの有無も反映する
+        lifecycle = ServerLifecycle(
+            request_handler,
+            grace_period=SHUTDOWN_GRACE_PERIOD,
+            available_agents=coordinator.available_agents,
+        )
+
+        # サーバーの実行
+        app = a2a_app.build(
+            routes=lifecycle.routes(), lifespan=lifecycle.lifespan
+        )
+        await lifecycle.serve(app, host=host, port=port)
+    finally:
+        await coordinator.aclose()
+
+
+@click.command()
+@click.option("--host", "host", default="0.0.0.0")
+@click.option("--port", "port", default=10000)
+def main(host: str, port: int):
+    if (
+        LLM_BACKEND != "fake"
+        and os.getenv("GOOGLE_GENAI_USE_VERTEXAI") != "TRUE"
+        and not os.getenv("GOOGLE_API_KEY")
+    ):
+        raise ValueError(
+            "GOOGLE_API_KEY environment variable not set and "
+            "GOOGLE_GENAI_USE_VERTEXAI is not TRUE."
+        )
+
+    asyncio.run(serve(host, port))
+
+
+if __name__ == "__main__":
+    main()
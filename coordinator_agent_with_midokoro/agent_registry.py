@@ -0,0 +1,121 @@
+"""リモートエージェントの登録簿
+
+コーディネーターが接続するエージェントのURLを、登録ファイル (JSON) またはHTTPで公開された
+登録サービスから読み込み、一定間隔で読み直して on_change に渡す。
+登録簿の形式:
+    {
+      "agents": [
+        {"url": "http://0.0.0.0:10001"},
+        {"url": "http://0.0.0.0:10002"}
+      ]
+    }
+source が http:// または https:// で始まる場合は GET で同じ形式のJSONを取得する。
+読み込みに失敗した場合 (編集途中のファイルなど) は直前の内容を使い続ける。
+"""
+
+import asyncio
+import json
+import os
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import httpx
+
+
+DEFAULT_REGISTRY_PATH = Path(__file__).parent / "agent_registry.json"
+
+
+class AgentRegistry:
+    """登録簿を監視し、エージェントのURLの一覧を on_change に渡す"""
+
+    def __init__(
+        self,
+        source: str,
+        on_change: Callable[[list[str]], Awaitable[None]],
+        poll_interval: float = 5.0,
+    ):
+        self.source = source or str(DEFAULT_REGISTRY_PATH)
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.urls: list[str] = []
+        # ファイルの場合は更新時刻とサイズが変わったときだけ読み直す
+        self._file_stamp: tuple[float, int] | None = None
+        self._last_error: str | None = None
+        self._client: httpx.AsyncClient | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def _is_remote(self) -> bool:
+        return self.source.startswith(("http://", "https://"))
+
+    async def load(self) -> list[str]:
+        """登録簿を読み込み、現在のURLの一覧を返す"""
+        urls = await self._read()
+        if urls is not None:
+            self.urls = urls
+        return self.urls
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            urls = await self._read()
+            if urls is not None and urls != self.urls:
+                print(f"Agent registry changed: {self.urls} -> {urls}")
+                self.urls = urls
+            try:
+                # 接続できなかったエージェントを再試行できるよう、変更が無くても毎回渡す
+                await self.on_change(self.urls)
+            except Exception as e:
+                print(f"Warning: Failed to apply agent registry: {e}")
+
+    async def _read(self) -> list[str] | None:
+        """登録簿を読み込む (変更が無い場合・読み込めなかった場合は None)"""
+        try:
+            if self._is_remote:
+                if self._client is None:
+                    self._client = httpx.AsyncClient(timeout=self.poll_interval)
+                response = await self._client.get(self.source)
+                response.raise_for_status()
+                registry = response.json()
+            else:
+                stat = os.stat(self.source)
+                stamp = (stat.st_mtime, stat.st_size)
+                if stamp == self._file_stamp:
+                    return None
+                with open(self.source, encoding="utf-8") as f:
+                    registry = json.load(f)
+                self._file_stamp = stamp
+            urls = _parse_registry(registry)
+        except (OSError, ValueError, KeyError, TypeError, httpx.HTTPError) as e:
+            # 同じエラーが続く間は一度だけ表示する
+            error = f"{type(e).__name__}: {e}"
+            if error != self._last_error:
+                print(f"Warning: Failed to read agent registry {self.source}: {error}")
+                self._last_error = error
+            return None
+        self._last_error = None
+        return urls
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def _parse_registry(registry: dict) -> list[str]:
+    urls = []
+    for entry in registry["agents"]:
+        url = entry["url"].rstrip("/")
+        if url not in urls:
+            urls.append(url)
+    return urls
@@ -0,0 +1,385 @@
+"""コーディネーターのオーケストレーション層のベンチマーク
+
+ローカルに uchina_guchi_agent / midokoro_agent を疑似LLM (LLM_BACKEND=fake, レイテンシ0) で起動し、
+CoordinatorAgent の各プリミティブの所要時間を測定する。モデルの推論時間を含まないため、
+測定値はオーケストレーション層とA2A通信のオーバーヘッドとなる。
+
+結果は --results-file (デフォルト: benchmark_results.jsonl) に追記され、
+同じパラメータでの前回の結果と比較して性能劣化を検出する。
+
+実行方法:
+    uv run python benchmark.py --iterations 50 --fan-out 4 --chain-depth 3
+"""
+
+import asyncio
+import contextlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+import click
+import httpx
+
+from a2a.types import MessageSendParams, SendMessageRequest
+
+from coordinator_agent import CoordinatorAgent, create_send_message_payload
+
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+# ベンチマーク用に起動するエージェントサーバー (開発用のポートと衝突しないようにずらす)
+AGENT_SERVERS = {
+    "uchina_guchi_agent": 10101,
+    "midokoro_agent": 10102,
+}
+
+SAMPLE_TASKS = {
+    "uchina_guchi_agent": "ありがとう、を沖縄方言にしてください",
+    "midokoro_agent": "首里城の見どころを教えてください",
+}
+
+SAMPLE_QUERIES = [
+    "こんにちは",
+    "ありがとう、を沖縄方言にしてください",
+    "沖縄のおすすめビーチはどこ?",
+    "首里城について教えて、その説明を沖縄方言で教えてください。",
+]
+
+
+class BenchmarkToolContext:
+    """ベンチマーク用の最小限のツールコンテキスト（コーディネーターのツールは state のみ参照する）"""
+
+    def __init__(self):
+        self.state: dict[str, Any] = {"session_id": str(uuid.uuid4())}
+
+
+def _agent_python(agent_dir: Path, python: str | None) -> str:
+    if python:
+        return python
+    venv_python = agent_dir / ".venv" / "bin" / "python"
+    return str(venv_python) if venv_python.exists() else sys.executable
+
+
+def start_agent_servers(host: str, python: str | None) -> list[subprocess.Popen]:
+    """疑似LLM・レイテンシ0でエージェントサーバーを起動する"""
+    env = {
+        **os.environ,
+        "LLM_BACKEND": "fake",
+        "FAKE_LLM_LATENCY_MS": "0",
+        "FAKE_LLM_TOKEN_INTERVAL_MS": "0",
+        "FAKE_SEARCH_LATENCY_MS": "0",
+    }
+    processes = []
+    for name, port in AGENT_SERVERS.items():
+        agent_dir = ROOT_DIR / name
+        processes.append(
+            subprocess.Popen(
+                [
+                    _agent_python(agent_dir, python),
+                    "__main__.py",
+                    f"--host={host}",
+                    f"--port={port}",
+                ],
+                cwd=agent_dir,
+                env=env,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        )
+    return processes
+
+
+def stop_agent_servers(processes: list[subprocess.Popen]):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+async def wait_until_ready(urls: list[str], timeout: float):
+    """全エージェントのエージェントカードが取得できるまで待機する"""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=5) as client:
+        for url in urls:
+            while True:
+                try:
+                    response = await client.get(f"{url}/.well-known/agent.json")
+                    if response.status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Agent server did not become ready: {url}")
+                await asyncio.sleep(0.5)
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    """所要時間(秒)のリストを統計値(ミリ秒)に変換する"""
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "min_ms": ordered[0] * 1000,
+    }
+
+
+async def measure(
+    func: Callable[[], Awaitable[Any]], iterations: int, warmup: int
+) -> dict[str, float]:
+    for _ in range(warmup):
+        await func()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await func()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+async def run_benchmarks(
+    urls: list[str], iterations: int, warmup: int, fan_out: int, chain_depth: int
+) -> tuple[dict[str, dict[str, float]], dict[str, dict[str, int]]]:
+    """ベンチマーク結果と、計測後の接続プールの使用状況を返す"""
+    results: dict[str, dict[str, float]] = {}
+
+    async def discover_cards():
+        instance = await CoordinatorAgent.create(remote_agent_addresses=urls)
+        await instance.aclose()
+
+    results["card_discovery"] = await measure(discover_cards, iterations, warmup)
+
+    coordinator = await CoordinatorAgent.create(remote_agent_addresses=urls)
+    agent_names = list(coordinator.remote_agent_connections)
+    try:
+        # コーディネーターを経由しないA2A呼び出し（通信とサーバー処理のみ）
+        connection = coordinator.remote_agent_connections["uchina_guchi_agent"]
+
+        async def a2a_baseline():
+            request = SendMessageRequest(
+                id=str(uuid.uuid4()),
+                params=MessageSendParams.model_validate(
+                    create_send_message_payload(SAMPLE_TASKS["uchina_guchi_agent"])
+                ),
+            )
+            await connection.send_message(message_request=request)
+
+        results["a2a_baseline"] = await measure(a2a_baseline, iterations, warmup)
+
+        async def send_message():
+            await coordinator.send_message(
+                "uchina_guchi_agent",
+                SAMPLE_TASKS["uchina_guchi_agent"],
+                BenchmarkToolContext(),
+            )
+
+        results["send_message"] = await measure(send_message, iterations, warmup)
+
+        fan_out_tasks = [
+            {
+                "agent_name": agent_names[i % len(agent_names)],
+                "task": SAMPLE_TASKS[agent_names[i % len(agent_names)]],
+            }
+            for i in range(fan_out)
+        ]
+
+        async def send_messages_parallel():
+            await coordinator.send_messages_parallel(
+                fan_out_tasks, BenchmarkToolContext()
+            )
+
+        results[f"send_messages_parallel[n={fan_out}]"] = await measure(
+            send_messages_parallel, iterations, warmup
+        )
+
+        async def send_message_batch():
+            await coordinator.send_message_batch(
+                "uchina_guchi_agent",
+                [SAMPLE_TASKS["uchina_guchi_agent"]] * fan_out,
+                BenchmarkToolContext(),
+            )
+
+        results[f"send_message_batch[n={fan_out}]"] = await measure(
+            send_message_batch, iterations, warmup
+        )
+
+        chain = [
+            {"agent_name": "midokoro_agent", "task": SAMPLE_TASKS["midokoro_agent"]}
+        ]
+        for i in range(1, chain_depth):
+            previous = chain[-1]["agent_name"]
+            chain.append(
+                {
+                    "agent_name": agent_names[i % len(agent_names)],
+                    "task_template": "{result}を要約してください",
+                    "use_agent_result": previous,
+                }
+            )
+
+        async def send_message_chain():
+            await coordinator.send_message_chain(chain, BenchmarkToolContext())
+
+        results[f"send_message_chain[d={chain_depth}]"] = await measure(
+            send_message_chain, iterations, warmup
+        )
+
+        async def analyze_query_intent():
+            for query in SAMPLE_QUERIES:
+                coordinator.analyze_query_intent(query)
+
+        results["analyze_query_intent"] = await measure(
+            analyze_query_intent, iterations * 10, warmup
+        )
+        pool_stats = coordinator.get_connection_pool_stats()
+    finally:
+        await coordinator.aclose()
+
+    # コーディネーター自身に起因するオーバーヘッド = send_message - 直接のA2A呼び出し
+    results["coordinator_overhead"] = {
+        key: results["send_message"][key] - results["a2a_baseline"][key]
+        for key in ("mean_ms", "p50_ms", "p95_ms", "min_ms")
+    }
+    return results, pool_stats
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT_DIR,
+            text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_previous(results_file: Path, params: dict[str, Any]) -> dict[str, Any] | None:
+    """同じパラメータで記録された直近の結果を返す"""
+    if not results_file.exists():
+        return None
+    previous = None
+    with results_file.open(encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("params") == params:
+                previous = record
+    return previous
+
+
+def find_regressions(
+    results: dict[str, dict[str, float]],
+    previous: dict[str, Any] | None,
+    threshold: float,
+) -> list[str]:
+    """前回からp50が threshold 以上悪化した項目を返す"""
+    if not previous:
+        return []
+    regressions = []
+    for name, stats in results.items():
+        before = previous["results"].get(name, {}).get("p50_ms")
+        if before and before > 0 and stats["p50_ms"] > before * (1 + threshold):
+            regressions.append(
+                f"{name}: p50 {before:.2f}ms -> {stats['p50_ms']:.2f}ms "
+                f"(+{(stats['p50_ms'] / before - 1) * 100:.0f}%)"
+            )
+    return regressions
+
+
+def print_report(
+    results: dict[str, dict[str, float]], pool_stats: dict[str, dict[str, int]]
+):
+    print(f"{'benchmark':<32}{'mean':>10}{'p50':>10}{'p95':>10}{'min':>10}  (ms)")
+    print("-" * 80)
+    for name, stats in results.items():
+        print(
+            f"{name:<32}{stats['mean_ms']:>10.3f}{stats['p50_ms']:>10.3f}"
+            f"{stats['p95_ms']:>10.3f}{stats['min_ms']:>10.3f}"
+        )
+    print("\nConnection pools:")
+    for name, stats in pool_stats.items():
+        print(f"  {name}: {stats}")
+
+
+@click.command()
+@click.option("--iterations", default=30, help="各ベンチマークの計測回数")
+@click.option("--warmup", default=3, help="計測前のウォームアップ回数")
+@click.option(
+    "--fan-out",
+    "fan_out",
+    default=4,
+    help="send_messages_parallel の並列数 / send_message_batch の件数",
+)
+@click.option("--chain-depth", "chain_depth", default=3, help="send_message_chain の段数")
+@click.option("--host", default="127.0.0.1")
+@click.option("--python", default=None, help="エージェントサーバーの起動に使うPython")
+@click.option("--startup-timeout", "startup_timeout", default=120.0)
+@click.option(
+    "--results-file",
+    "results_file",
+    default="benchmark_results.jsonl",
+    type=click.Path(path_type=Path),
+)
+@click.option("--threshold", default=0.2, help="性能劣化とみなすp50の悪化率")
+@click.option("--fail-on-regression", "fail_on_regression", is_flag=True)
+def main(
+    iterations: int,
+    warmup: int,
+    fan_out: int,
+    chain_depth: int,
+    host: str,
+    python: str | None,
+    startup_timeout: float,
+    results_file: Path,
+    threshold: float,
+    fail_on_regression: bool,
+):
+    urls = [f"http://{host}:{port}" for port in AGENT_SERVERS.values()]
+    processes = start_agent_servers(host, python)
+    try:
+        asyncio.run(wait_until_ready(urls, startup_timeout))
+        # コーディネーターのデバッグ出力でレポートが埋もれないようにする
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            results, pool_stats = asyncio.run(
+                run_benchmarks(urls, iterations, warmup, fan_out, chain_depth)
+            )
+    finally:
+        stop_agent_servers(processes)
+
+    params = {"iterations": iterations, "fan_out": fan_out, "chain_depth": chain_depth}
+    previous = load_previous(results_file, params)
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "params": params,
+        "results": results,
+        "pool_stats": pool_stats,
+    }
+    with results_file.open("a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    print_report(results, pool_stats)
+    regressions = find_regressions(results, previous, threshold)
+    if regressions:
+        print("\nPerformance regressions detected:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        if fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
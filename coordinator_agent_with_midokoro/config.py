@@ -5,8 +5,113 @@ load_dotenv()
 
 LLM_MODEL_ID = os.getenv('LLM_MODEL_ID')
 
-UCHINA_GUCHI_AGENT_URL = os.getenv('UCHINA_GUCHI_AGENT_URL')
-MIDOKORO_AGENT_URL = os.getenv('MIDOKORO_AGENT_URL')
+# LLMバックエンド: gemini (デフォルト) / fake (オフライン負荷試験用の疑似LLM)
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'gemini')
 
-# 必要に応じて他のエージェントのURLもここに追加
-# ****_AGENT_URL = os.getenv('****_AGENT_URL')
+# 疑似LLMの設定 (LLM_BACKEND=fake のときのみ使用)
+FAKE_LLM_SEED = int(os.getenv('FAKE_LLM_SEED', '0'))
+FAKE_LLM_LATENCY_MS = float(os.getenv('FAKE_LLM_LATENCY_MS', '0'))
+FAKE_LLM_LATENCY_JITTER_MS = float(os.getenv('FAKE_LLM_LATENCY_JITTER_MS', '0'))
+# fixed / uniform / normal / lognormal
+FAKE_LLM_LATENCY_DISTRIBUTION = os.getenv('FAKE_LLM_LATENCY_DISTRIBUTION', 'fixed')
+FAKE_LLM_TOKEN_INTERVAL_MS = float(os.getenv('FAKE_LLM_TOKEN_INTERVAL_MS', '0'))
+FAKE_LLM_CHUNK_SIZE = int(os.getenv('FAKE_LLM_CHUNK_SIZE', '8'))
+# 応答スクリプト(JSON)のパス。未指定の場合は fake_llm_script.json を使用
+FAKE_LLM_SCRIPT = os.getenv('FAKE_LLM_SCRIPT', '')
+
+# コーディネーターの静的なプロンプトに Gemini の明示的コンテキストキャッシュを使用するか
+# （プロンプトが短い場合はモデルの最小トークン数に満たず、自動的に無効化される）
+COORDINATOR_CONTEXT_CACHE = os.getenv('COORDINATOR_CONTEXT_CACHE', 'FALSE') == 'TRUE'
+COORDINATOR_CONTEXT_CACHE_TTL = int(os.getenv('COORDINATOR_CONTEXT_CACHE_TTL', '3600'))
+
+# 単一エージェントで完結する問い合わせをコーディネーターのLLMを介さずに直接振り分けるか
+DIRECT_DISPATCH = os.getenv('DIRECT_DISPATCH', 'FALSE') == 'TRUE'
+# 直接振り分けに必要なインテント分類の確信度 (0.0〜1.0)
+DIRECT_DISPATCH_THRESHOLD = float(os.getenv('DIRECT_DISPATCH_THRESHOLD', '0.8'))
+
+# 見込みの高いエージェントへの問い合わせを、LLMの判断を待たずに投機的に先読みするか
+SPECULATIVE_PREFETCH = os.getenv('SPECULATIVE_PREFETCH', 'FALSE') == 'TRUE'
+# 先読みの対象にするエージェント（カンマ区切り）
+SPECULATIVE_PREFETCH_AGENTS = os.getenv('SPECULATIVE_PREFETCH_AGENTS', 'midokoro_agent').split(',')
+# 先読みを開始するインテント分類の確信度
+SPECULATIVE_PREFETCH_THRESHOLD = float(os.getenv('SPECULATIVE_PREFETCH_THRESHOLD', '0.5'))
+# LLMが送ろうとしたタスクと先読みしたタスクの類似度がこの値以上なら先読みの結果を使う
+SPECULATIVE_PREFETCH_SIMILARITY = float(os.getenv('SPECULATIVE_PREFETCH_SIMILARITY', '0.85'))
+# コストの上限: 同時に実行する先読みの数と、1分あたりに開始する先読みの数
+SPECULATIVE_PREFETCH_MAX_IN_FLIGHT = int(os.getenv('SPECULATIVE_PREFETCH_MAX_IN_FLIGHT', '4'))
+SPECULATIVE_PREFETCH_MAX_PER_MINUTE = int(os.getenv('SPECULATIVE_PREFETCH_MAX_PER_MINUTE', '30'))
+# 使われなかった先読みを保持する最大秒数（ターンの終了処理が呼ばれなかった場合に破棄する）
+SPECULATIVE_PREFETCH_TTL = float(os.getenv('SPECULATIVE_PREFETCH_TTL', '300'))
+
+# 並列問い合わせで各エージェントの結果として返す最大文字数（0は無制限）
+PARALLEL_RESULT_MAX_CHARS = int(os.getenv('PARALLEL_RESULT_MAX_CHARS', '0'))
+
+# 並列問い合わせでエージェントごとに同時に送るタスク数の上限
+PARALLEL_MAX_CONCURRENCY_PER_AGENT = int(os.getenv('PARALLEL_MAX_CONCURRENCY_PER_AGENT', '4'))
+
+# エージェントごとに記録する（get_previous_result で再取得できる）過去のタスクの件数
+REMOTE_TASK_HISTORY_LIMIT = int(os.getenv('REMOTE_TASK_HISTORY_LIMIT', '5'))
+
+# プッシュ通知モード: 対象エージェントへの問い合わせを blocking=false で送信し、
+# HTTP接続を保持せずにローカルの受信サーバーへの完了通知を待つ
+PUSH_NOTIFICATIONS = os.getenv('PUSH_NOTIFICATIONS', 'FALSE') == 'TRUE'
+PUSH_NOTIFICATION_AGENTS = os.getenv('PUSH_NOTIFICATION_AGENTS', 'midokoro_agent').split(',')
+PUSH_RECEIVER_HOST = os.getenv('PUSH_RECEIVER_HOST', '127.0.0.1')
+PUSH_RECEIVER_PORT = int(os.getenv('PUSH_RECEIVER_PORT', '10100'))
+# エージェントサーバーから見た受信サーバーのURL（未指定時は http://HOST:PORT）
+PUSH_RECEIVER_PUBLIC_URL = os.getenv('PUSH_RECEIVER_PUBLIC_URL', '')
+# 完了通知を待つ最大秒数。過ぎた場合は通知が失われたとみなし、PUSH_POLL_INTERVAL 秒ごとに tasks/get で完了を確認する
+PUSH_TASK_TIMEOUT = float(os.getenv('PUSH_TASK_TIMEOUT', '300'))
+PUSH_POLL_INTERVAL = float(os.getenv('PUSH_POLL_INTERVAL', '5'))
+
+# submit_task でエージェントごとに保持できるバックグラウンドのタスク数と、完了後に結果を保持する秒数
+SUBMITTED_TASK_MAX_PER_AGENT = int(os.getenv('SUBMITTED_TASK_MAX_PER_AGENT', '20'))
+SUBMITTED_TASK_RESULT_TTL = float(os.getenv('SUBMITTED_TASK_RESULT_TTL', '600'))
+# wait_any で完了を待つデフォルトの秒数
+WAIT_ANY_TIMEOUT = float(os.getenv('WAIT_ANY_TIMEOUT', '30'))
+
+# リモートエージェントのヘルスチェック: 各エージェントの /readyz を定期的に確認し、
+# 連続して失敗したエージェントをLLMに提示するエージェント一覧から外す（回復すると戻す）
+AGENT_HEALTH_CHECK = os.getenv('AGENT_HEALTH_CHECK', 'TRUE') == 'TRUE'
+AGENT_HEALTH_CHECK_INTERVAL = float(os.getenv('AGENT_HEALTH_CHECK_INTERVAL', '10'))
+AGENT_HEALTH_CHECK_TIMEOUT = float(os.getenv('AGENT_HEALTH_CHECK_TIMEOUT', '3'))
+# 利用不可とみなす連続失敗回数
+AGENT_HEALTH_CHECK_FAILURE_THRESHOLD = int(os.getenv('AGENT_HEALTH_CHECK_FAILURE_THRESHOLD', '2'))
+
+# チャット画面で毎回描画する直近のメッセージ数（それより前は「過去のメッセージを表示」で読み込む）
+CHAT_HISTORY_WINDOW = max(1, int(os.getenv('CHAT_HISTORY_WINDOW', '20')))
+
+# リモートエージェントの登録簿: JSONファイルのパス、または同じ形式のJSONを返すURL
+# （未指定の場合は agent_registry.json）。一定間隔で読み直し、実行中にエージェントを追加・削除する
+AGENT_REGISTRY = os.getenv('AGENT_REGISTRY', '')
+AGENT_REGISTRY_POLL_INTERVAL = float(os.getenv('AGENT_REGISTRY_POLL_INTERVAL', '5'))
+
+
+# A2Aサーバーとして起動した場合 (python __main__.py) のセッションサービス: memory (デフォルト) / database
+# 複数のコーディネーターで SESSION_DB_URL のデータベースを共有すると、どのコーディネーターでも会話を続けられる
+SESSION_SERVICE = os.getenv('SESSION_SERVICE', 'memory')
+SESSION_DB_URL = os.getenv('SESSION_DB_URL', 'sqlite:///sessions.db')
+# コンテキストIDごとにキャッシュするセッションの数
+SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', '1000'))
+# 停止時に応答中のリクエストの完了を待つ猶予期間 (秒)
+SHUTDOWN_GRACE_PERIOD = float(os.getenv('SHUTDOWN_GRACE_PERIOD', '30'))
+
+# リモートエージェントへのHTTP接続設定（全エージェント共通のデフォルト値）
+# エージェント名を接頭辞にした環境変数で個別に上書きできる（例: MIDOKORO_AGENT_READ_TIMEOUT=120）
+# HTTP/2 は TLS (https) 接続でのみ有効になり、h2 パッケージ (httpx[http2]) が必要
+REMOTE_AGENT_HTTP_DEFAULTS = {
+    'HTTP2': 'FALSE',
+    'MAX_CONNECTIONS': '100',
+    'MAX_KEEPALIVE_CONNECTIONS': '20',
+    'KEEPALIVE_EXPIRY': '5',
+    'CONNECT_TIMEOUT': '10',
+    'READ_TIMEOUT': '60',
+}
+
+
+def get_remote_agent_http_setting(agent_name: str, key: str) -> str:
+    """エージェント個別の設定 → REMOTE_AGENT_* → デフォルト値の順に参照する"""
+    return os.getenv(
+        f'{agent_name.upper()}_{key}',
+        os.getenv(f'REMOTE_AGENT_{key}', REMOTE_AGENT_HTTP_DEFAULTS[key]),
+    )
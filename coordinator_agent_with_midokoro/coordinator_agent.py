@@ -1,6 +1,9 @@
-from typing import Any, List, Dict, Optional
+from contextvars import ContextVar
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, List, Dict, Optional
+import hashlib
 import json
 import httpx
+import time
 import uuid
 import asyncio
 import re
@@ -8,24 +11,74 @@ import re
 from google.adk import Agent
 from google.adk.agents.readonly_context import ReadonlyContext
 from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.agents.run_config import StreamingMode
+from google.adk.events import Event
 from google.adk.tools.tool_context import ToolContext
 from google.adk.tools import load_memory
+from google.adk.models.llm_request import LlmRequest
+from google.genai import Client, types
 from a2a.client import A2ACardResolver
 
 from a2a.types import (
+    Artifact,
+    GetTaskSuccessResponse,
+    Message,
     SendMessageResponse,
     SendMessageRequest,
+    SendStreamingMessageRequest,
+    SendStreamingMessageSuccessResponse,
     MessageSendParams,
     SendMessageSuccessResponse,
     Task,
+    TaskArtifactUpdateEvent,
+    TaskState,
+    TaskStatusUpdateEvent,
+    TextPart,
     Part,
     AgentCard,
 )
 
-from remote_agent_connection import RemoteAgentConnections, TaskUpdateCallback
-
-# 各エージェントのURLを環境変数から取得
-from config import LLM_MODEL_ID, UCHINA_GUCHI_AGENT_URL, MIDOKORO_AGENT_URL
+from remote_agent_connection import PendingTask, RemoteAgentConnections, TaskUpdateCallback
+from push_receiver import PushNotificationReceiver
+from health_checker import AgentHealthChecker
+from agent_registry import AgentRegistry
+from speculative_prefetch import DetachedToolContext, SpeculativePrefetcher
+from llm_backend import create_model
+
+from config import (
+    AGENT_REGISTRY,
+    AGENT_REGISTRY_POLL_INTERVAL,
+    LLM_BACKEND,
+    COORDINATOR_CONTEXT_CACHE,
+    COORDINATOR_CONTEXT_CACHE_TTL,
+    DIRECT_DISPATCH,
+    DIRECT_DISPATCH_THRESHOLD,
+    SPECULATIVE_PREFETCH,
+    SPECULATIVE_PREFETCH_AGENTS,
+    SPECULATIVE_PREFETCH_THRESHOLD,
+    SPECULATIVE_PREFETCH_SIMILARITY,
+    SPECULATIVE_PREFETCH_MAX_IN_FLIGHT,
+    SPECULATIVE_PREFETCH_MAX_PER_MINUTE,
+    SPECULATIVE_PREFETCH_TTL,
+    PARALLEL_RESULT_MAX_CHARS,
+    PARALLEL_MAX_CONCURRENCY_PER_AGENT,
+    REMOTE_TASK_HISTORY_LIMIT,
+    PUSH_NOTIFICATIONS,
+    PUSH_NOTIFICATION_AGENTS,
+    PUSH_RECEIVER_HOST,
+    PUSH_RECEIVER_PORT,
+    PUSH_RECEIVER_PUBLIC_URL,
+    PUSH_TASK_TIMEOUT,
+    PUSH_POLL_INTERVAL,
+    SUBMITTED_TASK_MAX_PER_AGENT,
+    SUBMITTED_TASK_RESULT_TTL,
+    WAIT_ANY_TIMEOUT,
+    AGENT_HEALTH_CHECK,
+    AGENT_HEALTH_CHECK_INTERVAL,
+    AGENT_HEALTH_CHECK_TIMEOUT,
+    AGENT_HEALTH_CHECK_FAILURE_THRESHOLD,
+)
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -65,6 +118,233 @@ def create_send_message_payload(
     return payload
 
 
+def create_task_request_payload(
+    state, agent_name: str, parts: list[dict[str, Any]], new_context: bool = False
+) -> dict[str, Any]:
+    """state に記録されたタスクを引き継いで、リモートエージェントへ送るメッセージを作る
+
+    new_context=True の場合はコンテキストIDを送らない。結果のコンテキストは記録せず
+    続けて問い合わせることもないため、エージェント側では1回限りのリクエストとして扱われる
+    (EPHEMERAL_ONE_SHOT_SESSIONS が有効なら一時的なセッションで処理される)。
+    """
+    previous = {} if new_context else (state.get(REMOTE_TASKS_STATE_KEY) or {}).get(agent_name, {})
+    # 入力待ちなどで完了していないタスクのみ同じタスクとして続行し、それ以外は新しいタスクにする
+    # （完了済みのタスクIDを再利用すると、前回のアーティファクトに今回の結果が追記されてしまう）
+    if previous.get("state") in RESUMABLE_TASK_STATES:
+        task_id = previous["task_id"]
+    else:
+        task_id = str(uuid.uuid4())
+    # 会話を続ける問い合わせでは、最初の問い合わせからコンテキストIDを指定する
+    context_id = None if new_context else previous.get("context_id") or str(uuid.uuid4())
+
+    messageId = (state.get("input_message_metadata") or {}).get("message_id") or str(uuid.uuid4())
+
+    payload = {
+        "message": {
+            "role": "user",
+            "parts": parts,
+            "messageId": messageId,
+            "taskId": task_id,
+        },
+    }
+
+    if context_id:
+        payload["message"]["contextId"] = context_id
+
+    return payload
+
+
+# 並列問い合わせで各タスクの結果が届くたびに呼び出されるリスナー (タスクID, 結果のテキスト)
+# UIなどがリクエスト単位で設定する
+partial_result_listener: ContextVar[Optional[Callable[[str, str], None]]] = ContextVar(
+    "partial_result_listener", default=None
+)
+
+
+# エージェントごとのタスクID・コンテキストIDを記録する state のキー
+REMOTE_TASKS_STATE_KEY = "remote_tasks"
+
+# 同じタスクとして続行できる（完了していない）タスクの状態
+RESUMABLE_TASK_STATES = {TaskState.input_required.value, TaskState.auth_required.value}
+
+# プッシュ通知モードで、まだ処理中（完了通知を待つ）とみなすタスクの状態
+PENDING_TASK_STATES = {TaskState.submitted.value, TaskState.working.value}
+
+
+class AcceptedTaskError(Exception):
+    """リモートエージェントがタスクを受け付けた後に、結果を取得できなかったエラー
+
+    メッセージを再送すると同じタスクが重複して実行されるため、リトライしない
+    """
+
+
+# 直接振り分け用のインテント分類パターン: エージェント名 -> [(正規表現, 重み)]
+INTENT_PATTERNS: dict[str, list[tuple[str, float]]] = {
+    "uchina_guchi_agent": [
+        (r"方言|うちなーぐち|ウチナーグチ|ウチナー", 0.6),
+        (r"訳して|翻訳|変換|にして|で言うと|でなんていう|で教えて", 0.3),
+    ],
+    "midokoro_agent": [
+        (r"観光|見どころ|スポット|ビーチ|グルメ", 0.5),
+        (r"アクセス|営業|料金|おすすめ|人気|行き方", 0.3),
+        (r"首里城|美ら海|国際通り", 0.4),
+    ],
+}
+
+# 複数の処理が必要そうな問い合わせの目印（直接振り分けの対象外とする）
+MULTI_STEP_PATTERN = r"その(説明|内容|結果|答え)|それを|してから|した(後|あと)|両方|それぞれ"
+
+
+def _assign_task_ids(agent_tasks: List[Dict[str, str]]) -> List[tuple[str, str, str]]:
+    """並列問い合わせの各タスクに一意なIDを割り当て、(タスクID, エージェント名, タスク) のリストを返す
+
+    task_id が指定されていない場合、エージェントが一度しか現れなければエージェント名を、
+    複数回現れる場合は「エージェント名#連番」をIDとする。
+    """
+    counts: dict[str, int] = {}
+    for agent_task in agent_tasks:
+        counts[agent_task["agent_name"]] = counts.get(agent_task["agent_name"], 0) + 1
+
+    assigned = []
+    used: set[str] = set()
+    sequence: dict[str, int] = {}
+    for agent_task in agent_tasks:
+        agent_name = agent_task["agent_name"]
+        task_id = agent_task.get("task_id")
+        if not task_id:
+            if counts[agent_name] == 1:
+                task_id = agent_name
+            else:
+                sequence[agent_name] = sequence.get(agent_name, 0) + 1
+                task_id = f"{agent_name}#{sequence[agent_name]}"
+        # 指定されたIDが重複している場合も結果が上書きされないようにする
+        unique_id, n = task_id, 1
+        while unique_id in used:
+            n += 1
+            unique_id = f"{task_id}#{n}"
+        used.add(unique_id)
+        assigned.append((unique_id, agent_name, agent_task["task"]))
+    return assigned
+
+
+def _truncate_result(result: list, max_chars: int) -> list:
+    """回答パーツのテキストの合計が max_chars を超えないように切り詰める"""
+    truncated = []
+    remaining = max_chars
+    for part in result:
+        if not (isinstance(part, dict) and isinstance(part.get("text"), str)):
+            truncated.append(part)
+            continue
+        if remaining <= 0:
+            continue
+        text = part["text"]
+        if len(text) > remaining:
+            text = text[:remaining] + "…（以下省略）"
+        remaining -= len(part["text"])
+        truncated.append({**part, "text": text})
+    return truncated
+
+
+def _describe_file_part(part: Dict[str, Any]) -> str:
+    """ファイルパートを名前・形式・URIの参照に置き換える（埋め込みのbase64は含めない）"""
+    file = part.get("file") or {}
+    name = file.get("name") or "ファイル"
+    mime_type = file.get("mimeType") or "application/octet-stream"
+    if file.get("uri"):
+        return f"[{name} ({mime_type}): {file['uri']}]"
+    size = len(file.get("bytes") or "") * 3 // 4
+    return f"[{name} ({mime_type}), 約{size}バイト]"
+
+
+def _artifact_parts(json_content: Dict[str, Any]) -> list:
+    """タスクのレスポンス(JSON)からアーティファクトのパーツを取り出す"""
+    resp = []
+    if json_content.get("result"):
+        result = json_content["result"]
+
+        # 標準形式: {"result": {"artifacts": [{"parts": [...]}]}}
+        if isinstance(result, dict) and result.get("artifacts"):
+            for artifact in result["artifacts"]:
+                if artifact.get("parts"):
+                    print(f"[DEBUG] Found {len(artifact['parts'])} parts in artifact")
+                    resp.extend(artifact["parts"])
+        elif isinstance(result, list):
+            # リストの各要素をそのまま追加
+            resp.extend(result)
+    return resp
+
+
+def _supports_batch(card: AgentCard) -> bool:
+    """エージェントがバッチ問い合わせのスキルを公開しているか"""
+    return any("batch" in (skill.tags or []) for skill in card.skills)
+
+
+def _summarize_card(card: AgentCard) -> dict[str, Any]:
+    """ルーティング判断に必要な項目だけをカードから抜き出す（空の項目は省略）"""
+    skills = []
+    for skill in card.skills:
+        skill_info = {
+            "name": skill.name,
+            "description": skill.description,
+            "tags": skill.tags,
+            "examples": skill.examples,
+            "input_modes": skill.inputModes,
+            "output_modes": skill.outputModes,
+        }
+        skills.append({k: v for k, v in skill_info.items() if v})
+    agent_info = {
+        "name": card.name,
+        "description": card.description,
+        "input_modes": card.defaultInputModes,
+        "output_modes": card.defaultOutputModes,
+        "skills": skills,
+    }
+    return {k: v for k, v in agent_info.items() if v}
+
+
+class DirectDispatchAgent(Agent):
+    """LLMを呼ぶ前に、dispatch で問い合わせの直接振り分けを試みる Agent
+
+    dispatch は回答のテキストを (テキスト, 部分応答かどうか) の組で順に返し、最後に回答全体を返す。
+    回答全体を返さずに終わった場合は、通常どおりLLMで処理する。
+    部分応答はストリーミング（StreamingMode.SSE）で実行している場合のみイベントとして返す。
+    """
+
+    dispatch: Optional[Callable[[CallbackContext], AsyncIterator[tuple[str, bool]]]] = None
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        if self.dispatch is not None:
+            callback_context = CallbackContext(ctx)
+            streaming = ctx.run_config is not None and ctx.run_config.streaming_mode == StreamingMode.SSE
+            async for text, partial in self.dispatch(callback_context):
+                if partial and not streaming:
+                    continue
+                event = Event(
+                    invocation_id=ctx.invocation_id,
+                    author=self.name,
+                    branch=ctx.branch,
+                    content=types.ModelContent(parts=[types.Part(text=text)]),
+                )
+                if partial:
+                    event.partial = True
+                    yield event
+                    continue
+                event.actions = callback_context._event_actions
+                yield event
+                return
+            if callback_context.state.has_delta():
+                yield Event(
+                    invocation_id=ctx.invocation_id,
+                    author=self.name,
+                    branch=ctx.branch,
+                    actions=callback_context._event_actions,
+                )
+        async for event in super()._run_async_impl(ctx):
+            yield event
+
+
 class CoordinatorAgent:
     def __init__(
         self,
@@ -74,26 +354,172 @@ class CoordinatorAgent:
         self.remote_agent_connections: dict[str, RemoteAgentConnections] = {}
         self.cards: dict[str, AgentCard] = {}
         self.agents: str = ""
+        # ロスター確定後に一度だけ組み立てる静的なプロンプト（キャッシュ可能な接頭辞）
+        self._static_instruction: str | None = None
+        # Gemini のコンテキストキャッシュ: キー -> (キャッシュ名, 有効期限)
+        self._context_caches: dict[str, tuple[str, float]] = {}
+        self._context_cache_lock = asyncio.Lock()
+        self._context_cache_enabled = COORDINATOR_CONTEXT_CACHE and LLM_BACKEND == "gemini"
+        self._genai_client: Client | None = None
+        self.prefetcher = (
+            SpeculativePrefetcher(
+                similarity_threshold=SPECULATIVE_PREFETCH_SIMILARITY,
+                max_in_flight=SPECULATIVE_PREFETCH_MAX_IN_FLIGHT,
+                max_per_minute=SPECULATIVE_PREFETCH_MAX_PER_MINUTE,
+                ttl=SPECULATIVE_PREFETCH_TTL,
+            )
+            if SPECULATIVE_PREFETCH
+            else None
+        )
+        self.push_receiver: PushNotificationReceiver | None = None
+        self.health_checker: AgentHealthChecker | None = None
+        self.registry: AgentRegistry | None = None
+        self._sync_lock = asyncio.Lock()
+        # 接続できなかったURL -> 直前のエラー（同じエラーを繰り返し表示しないため）
+        self._connect_errors: dict[str, str] = {}
+
+    async def _async_init_components(self, remote_agent_addresses: Optional[List[str]]):
+        if PUSH_NOTIFICATIONS:
+            self.push_receiver = PushNotificationReceiver(
+                PUSH_RECEIVER_HOST, PUSH_RECEIVER_PORT, PUSH_RECEIVER_PUBLIC_URL
+            )
+            await self.push_receiver.start()
+        if remote_agent_addresses is None:
+            # 登録簿からエージェントのURLを読み込み、以降の変更も実行中に反映する
+            self.registry = AgentRegistry(
+                AGENT_REGISTRY,
+                self.sync_remote_agents,
+                poll_interval=AGENT_REGISTRY_POLL_INTERVAL,
+            )
+            remote_agent_addresses = await self.registry.load()
+        await self.sync_remote_agents(remote_agent_addresses)
+        if self.registry is not None:
+            self.registry.start()
+        if AGENT_HEALTH_CHECK:
+            self.health_checker = AgentHealthChecker(
+                self._on_agent_health_change,
+                interval=AGENT_HEALTH_CHECK_INTERVAL,
+                timeout=AGENT_HEALTH_CHECK_TIMEOUT,
+                failure_threshold=AGENT_HEALTH_CHECK_FAILURE_THRESHOLD,
+            )
+            self.health_checker.start(self.remote_agent_connections)
 
-    async def _async_init_components(self, remote_agent_addresses: List[str]):
-        async with httpx.AsyncClient(timeout=30) as client:
-            for address in remote_agent_addresses:
-                card_resolver = A2ACardResolver(client, address)
-                try:
-                    card = await card_resolver.get_agent_card()
+    async def sync_remote_agents(self, remote_agent_addresses: List[str]):
+        """接続するエージェントをURLの一覧に合わせ、変化があればロスターを更新する
 
-                    remote_connection = RemoteAgentConnections(
-                        agent_card=card, agent_url=address
+        一覧から消えたエージェントの接続を閉じ、新しいURLと前回接続できなかったURLに接続する。
+        同じ名前のエージェントが複数のURLにある場合は、先に接続したものだけを使う。
+        """
+        async with self._sync_lock:
+            wanted = [address.rstrip("/") for address in remote_agent_addresses]
+            removed = [
+                name
+                for name, connection in self.remote_agent_connections.items()
+                if connection.agent_url.rstrip("/") not in wanted
+            ]
+            for name in removed:
+                connection = self.remote_agent_connections.pop(name)
+                self.cards.pop(name, None)
+                await connection.aclose()
+                print(f"Removed agent {name} ({connection.agent_url})")
+            for address in list(self._connect_errors):
+                if address not in wanted:
+                    del self._connect_errors[address]
+
+            connected = {
+                connection.agent_url.rstrip("/")
+                for connection in self.remote_agent_connections.values()
+            }
+            new_addresses = [address for address in wanted if address not in connected]
+            async with httpx.AsyncClient(timeout=30) as client:
+                cards = await asyncio.gather(
+                    *(self._fetch_agent_card(client, address) for address in new_addresses)
+                )
+            added = []
+            # 登録簿の順にロスターへ追加する（プロンプトを安定させるため）
+            for address, card in zip(new_addresses, cards):
+                if card is None:
+                    continue
+                if card.name in self.remote_agent_connections:
+                    self._report_connect_error(
+                        address, f"agent {card.name} is already connected at "
+                        f"{self.remote_agent_connections[card.name].agent_url}"
                     )
-                    self.remote_agent_connections[card.name] = remote_connection
-                    self.cards[card.name] = card
-                except httpx.ConnectError as e:
-                    print(f"ERROR: Failed to get agent card from {address}: {e}")
+                    continue
+                self.remote_agent_connections[card.name] = RemoteAgentConnections(
+                    agent_card=card, agent_url=address
+                )
+                self.cards[card.name] = card
+                self._connect_errors.pop(address, None)
+                added.append(card.name)
+            if added:
+                print(f"Added agents: {added}")
+            if removed or added:
+                self._refresh_roster()
+
+    async def _fetch_agent_card(
+        self, client: httpx.AsyncClient, address: str
+    ) -> AgentCard | None:
+        try:
+            card = await A2ACardResolver(client, address).get_agent_card()
+        except Exception as e:
+            self._report_connect_error(address, f"{type(e).__name__}: {e}")
+            return None
+        return card
+
+    def _report_connect_error(self, address: str, error: str):
+        if self._connect_errors.get(address) != error:
+            print(f"ERROR: Failed to connect to agent at {address}: {error}")
+        self._connect_errors[address] = error
+
+    async def refresh_agent_cards(self):
+        """接続済みのエージェントのカードを取得し直し、ロスターを更新する"""
+        async with httpx.AsyncClient(timeout=30) as client:
+            for name, connection in self.remote_agent_connections.items():
+                try:
+                    card = await A2ACardResolver(client, connection.agent_url).get_agent_card()
+                    connection.card = card
+                    self.cards[name] = card
                 except Exception as e:
-                    print(f"ERROR: Failed to initialize connection for {address}: {e}")
+                    print(f"Warning: Failed to refresh agent card for {name}: {e}")
+        self._refresh_roster()
+
+    def _is_available(self, agent_name: str) -> bool:
+        """接続済みで、ヘルスチェックで利用不可になっていないか"""
+        return agent_name in self.remote_agent_connections and (
+            self.health_checker is None or self.health_checker.is_healthy(agent_name)
+        )
+
+    def _check_available(self, agent_name: str):
+        if agent_name not in self.remote_agent_connections:
+            raise ValueError(f"Agent {agent_name} not found")
+        if not self._is_available(agent_name):
+            raise ValueError(f"Agent {agent_name} is currently unavailable")
+
+    def _on_agent_health_change(self, agent_name: str, healthy: bool):
+        """ヘルスチェックの結果が変わったエージェントをロスターに出し入れする"""
+        if healthy:
+            print(f"Agent {agent_name} recovered, adding it back to the roster")
+        else:
+            error = self.health_checker.status[agent_name]["last_error"]
+            print(f"Warning: Agent {agent_name} is unhealthy ({error}), removing it from the roster")
+        self._refresh_roster()
+
+    def _refresh_roster(self):
+        """カードからプロンプト用のエージェント一覧を組み立てる（カードの読み込み・更新時のみ）"""
+        self.agents = "\n".join(
+            json.dumps(agent_detail_dict, ensure_ascii=False, separators=(",", ":"))
+            for agent_detail_dict in self.list_remote_agents()
+        )
+        self._static_instruction = None
 
     async def aclose(self):
         """すべてのリモートエージェント接続を安全にクローズする"""
+        async with self._context_cache_lock:
+            for name, _ in self._context_caches.values():
+                await self._delete_context_cache(name)
+            self._context_caches.clear()
+
         for name, connection in self.remote_agent_connections.items():
             try:
                 await connection.aclose()
@@ -101,30 +527,46 @@ class CoordinatorAgent:
             except Exception as e:
                 print(f"Warning: Error closing connection to {name}: {e}")
 
+        if self.registry is not None:
+            await self.registry.aclose()
+            self.registry = None
+
+        if self.health_checker is not None:
+            await self.health_checker.aclose()
+            self.health_checker = None
+
+        if self.push_receiver is not None:
+            await self.push_receiver.aclose()
+            self.push_receiver = None
+
         # 接続辞書をクリア
         self.remote_agent_connections.clear()
         self.cards.clear()
-
-        agent_info = []
-        for agent_detail_dict in self.list_remote_agents():
-            agent_info.append(json.dumps(agent_detail_dict))
-        self.agents = "\n".join(agent_info)
+        self._refresh_roster()
 
     @classmethod
     async def create(
         cls,
-        remote_agent_addresses: List[str],
+        remote_agent_addresses: Optional[List[str]] = None,
         task_callback: TaskUpdateCallback | None = None,
     ):
+        """コーディネーターを作成する
+
+        remote_agent_addresses を省略すると、登録簿（AGENT_REGISTRY）のエージェントに接続し、
+        登録簿の変更に合わせて実行中にエージェントを追加・削除する。
+        """
         instance = cls(task_callback)
         await instance._async_init_components(remote_agent_addresses)
         return instance
 
     def create_agent(self) -> Agent:
-        return Agent(
-            model=LLM_MODEL_ID,
+        return DirectDispatchAgent(
+            model=create_model(),
             name="コーディネーターエージェント",
             instruction=self.coordinator_instruction,
+            dispatch=self.direct_dispatch if DIRECT_DISPATCH else None,
+            before_agent_callback=self.before_agent_callback if SPECULATIVE_PREFETCH else None,
+            after_agent_callback=self.after_agent_callback if SPECULATIVE_PREFETCH else None,
             before_model_callback=self.before_model_callback,
             description=(
                 "ユーザーからの質問に対して、適切な専門エージェントに問い合わせて回答を提供します。"
@@ -132,14 +574,49 @@ class CoordinatorAgent:
             tools=[
                 self.send_message,
                 self.send_messages_parallel,
+                self.send_message_batch,
                 self.send_message_chain,
+                self.get_previous_result,
+                self.submit_task,
+                self.get_task_result,
+                self.wait_any,
                 self.analyze_query_intent,
                 load_memory
             ],
         )
 
     def coordinator_instruction(self, context: ReadonlyContext) -> str:
+        """静的な接頭辞 + 動的な接尾辞でプロンプトを組み立てる
+
+        会話ごとに変わる値は末尾の接尾辞にのみ含め、接頭辞をモデル呼び出し間で
+        バイト単位で同一に保つことで、プロバイダー側のプロンプトキャッシュを効かせる。
+        """
+        return self.static_instruction + self._dynamic_instruction(context)
+
+    @property
+    def static_instruction(self) -> str:
+        if self._static_instruction is None:
+            self._static_instruction = self._build_static_instruction()
+        return self._static_instruction
+
+    def _dynamic_instruction(self, context: ReadonlyContext) -> str:
         current_agent = self.check_active_agent(context)
+        previous_tasks = "".join(
+            f"\n          - {agent_name}: task_id=`{item['task_id']}` 「{item['task']}」"
+            for agent_name, record in (context.state.get(REMOTE_TASKS_STATE_KEY) or {}).items()
+            for item in record.get("history") or []
+        )
+        submitted_tasks = "".join(
+            f"\n          - task_id=`{p.task_id}` {p.agent_name} ({p.status()['status']}) 「{p.task[:40]}」"
+            for p in self._session_pending_tasks(context)
+        )
+        return f"""
+        * Currently Active Seller Agent: `{current_agent["active_agent"]}`
+        * Submitted Background Tasks (`get_task_result` / `wait_any` で結果を取得できます):{submitted_tasks or " なし"}
+        * Previous Remote Tasks (`get_previous_result` で結果を再取得できます):{previous_tasks or " なし"}
+                """
+
+    def _build_static_instruction(self) -> str:
         return f"""
         **Role:**
         * あなたは真面目で有能なサポーターです。ユーザーからの質問に対して、必要に応じて専門エージェントに問い合わせて回答を提供します。
@@ -158,8 +635,14 @@ class CoordinatorAgent:
 
         **Multi-Agent Capabilities:**
         * **並列問い合わせ:** 複数のエージェントに同時に問い合わせたい場合は `send_messages_parallel` を使用してください。
+          - 同じエージェントに複数のタスクを送ることもできます（例: 複数のスポットの営業時間をスポットごとに問い合わせる）。回答は `task_id`（省略時はエージェント名、または「エージェント名#連番」）ごとに返されます。
+          - いずれか一つの回答で十分な場合は `first_k` を指定すると、必要な数の回答が揃った時点で残りの問い合わせを打ち切ります。
+        * **バッチ問い合わせ:** 同じエージェントに多数の小さな問い合わせ（例: 複数スポットの営業時間、複数フレーズの方言変換）がある場合は `send_message_batch` で1回にまとめて送ってください。
         * **エージェントチェーン:** あるエージェントの回答を別のエージェントに渡したい場合は `send_message_chain` を使用してください。
           - 例: 見どころエージェントの観光情報を取得 → ウチナーグチエージェントで沖縄方言に変換
+        * **バックグラウンドでの問い合わせ:** 時間のかかる問い合わせ（検索を伴う調査など）は `submit_task` で開始し、ユーザーとの会話を続けてください。結果は `get_task_result`（待たずに状態を確認）または `wait_any`（いずれかの完了を待つ）で取得します。
+        * **過去の結果の再利用:** 以前と同じ内容を問い合わせる場合は、問い合わせを再送せずに `get_previous_result` で過去のタスクの結果を取得してください。
+        * **会話の継続:** 同じエージェントへの続けての問い合わせは、そのエージェントとの会話の続きとして処理されます。前回の問い合わせ内容を繰り返し含める必要はありません。
         * **インテント分析:** ユーザーのクエリから関連するエージェントを自動的に特定するには `analyze_query_intent` を使用してください。
 
         **Core Directives:**
@@ -182,9 +665,7 @@ class CoordinatorAgent:
 
         **Agent Roster:**
 
-        * Available Agents: `{self.agents}`
-        * Currently Active Seller Agent: `{current_agent["active_agent"]}`
-                """
+        * Available Agents: `{self.agents}`"""
 
     def check_active_agent(self, context: ReadonlyContext):
         state = context.state
@@ -197,31 +678,258 @@ class CoordinatorAgent:
             return {"active_agent": f"{state['active_agent']}"}
         return {"active_agent": "None"}
 
-    def before_model_callback(self, callback_context: CallbackContext, llm_request):
-        state = callback_context.state
+    def _activate_session(self, state):
         if "session_active" not in state or not state["session_active"]:
             if "session_id" not in state:
                 state["session_id"] = str(uuid.uuid4())
             state["session_active"] = True
 
+    def _dispatch_target(self, callback_context: CallbackContext) -> tuple[Optional[str], float, str]:
+        """ユーザーの発話を分類し、(問い合わせ先のエージェント, 確信度, 発話) を返す"""
+        user_content = callback_context.user_content
+        if not user_content or not user_content.parts:
+            return None, 0.0, ""
+        query = "".join(part.text for part in user_content.parts if part.text)
+        agent_name, confidence = self.classify_query(query)
+        if agent_name is None or not self._is_available(agent_name):
+            return None, 0.0, query
+        return agent_name, confidence, query
+
+    async def before_agent_callback(
+        self, callback_context: CallbackContext
+    ) -> Optional[types.Content]:
+        """直接振り分けない問い合わせのうち見込みの高いものを、先読みとしてバックグラウンドで開始しておく"""
+        agent_name, confidence, query = self._dispatch_target(callback_context)
+        if agent_name is None:
+            return None
+        if DIRECT_DISPATCH and confidence >= DIRECT_DISPATCH_THRESHOLD:
+            return None
+        self._start_speculative_call(callback_context, agent_name, query, confidence)
+        return None
+
+    async def direct_dispatch(
+        self, callback_context: CallbackContext
+    ) -> AsyncIterator[tuple[str, bool]]:
+        """単一エージェントで完結する問い合わせを、LLMを介さずに直接振り分ける
+
+        インテント分類の確信度が DIRECT_DISPATCH_THRESHOLD 以上の場合のみ、
+        ユーザーの発話をそのままタスクとして専門エージェントに message/stream で送り、
+        アーティファクトのチャンクを部分応答として返してから回答全体を返す。
+        曖昧な問い合わせや複数の処理が必要な問い合わせ、送信に失敗した場合（リトライはしない）は
+        回答を返さずに終わり、コーディネーターのLLMに処理を任せる。
+        """
+        agent_name, confidence, query = self._dispatch_target(callback_context)
+        if agent_name is None or confidence < DIRECT_DISPATCH_THRESHOLD:
+            return
+
+        print(f"Direct dispatch to {agent_name} (confidence: {confidence:.2f})")
+        self._activate_session(callback_context.state)
+        artifacts: dict[str, Artifact] = {}
+        streamed: dict[str, str] = {}
+        task_state = None
+        try:
+            async for event in self._stream_task_request(
+                agent_name, [{"type": "text", "text": query}], callback_context
+            ):
+                if isinstance(event, (Task, TaskStatusUpdateEvent)):
+                    task_state = event.status.state
+                    continue
+                artifact = event.artifact
+                previous = artifacts.get(artifact.artifactId)
+                if event.append and previous is not None:
+                    artifact = previous.model_copy(update={"parts": [*previous.parts, *artifact.parts]})
+                artifacts[artifact.artifactId] = artifact
+                # 最後のチャンクは回答全体で置き換えられるため、まだ返していない差分だけを返す
+                text = "".join(p.root.text for p in artifact.parts if isinstance(p.root, TextPart))
+                sent = streamed.get(artifact.artifactId)
+                if sent is None:
+                    prefix = "\n" if streamed else ""
+                    sent = ""
+                else:
+                    prefix = ""
+                if len(text) > len(sent) and text.startswith(sent):
+                    streamed[artifact.artifactId] = text
+                    yield prefix + text[len(sent):], True
+        except Exception as e:
+            # 返し始めた部分応答は取り消せないが、回答全体はLLMの応答で置き換えられる
+            print(f"Warning: Direct dispatch to {agent_name} failed: {e}")
+            return
+
+        if task_state != TaskState.completed:
+            print(f"Warning: Direct dispatch to {agent_name} ended in state {task_state}")
+            return
+        result_text = self._format_agent_result(
+            [part.model_dump(mode="json", exclude_none=True) for a in artifacts.values() for part in a.parts]
+        )
+        if result_text:
+            yield result_text, False
+
+    def _start_speculative_call(
+        self,
+        callback_context: CallbackContext,
+        agent_name: str,
+        query: str,
+        confidence: float,
+    ):
+        if (
+            self.prefetcher is None
+            or agent_name not in SPECULATIVE_PREFETCH_AGENTS
+            or confidence < SPECULATIVE_PREFETCH_THRESHOLD
+        ):
+            return
+        self._activate_session(callback_context.state)
+        # 先読みは実際のセッションの state を変更しないよう、複製したコンテキストで送信する。
+        # 外れた先読みがリモートエージェントの会話履歴に残らないよう、記録されたタスクと
+        # コンテキストは引き継がずに新しいコンテキストで送る（結果を使うときに採用する）
+        state = callback_context.state.to_dict()
+        remote_tasks = dict(state.get(REMOTE_TASKS_STATE_KEY) or {})
+        remote_tasks[agent_name] = {
+            "history": (remote_tasks.get(agent_name) or {}).get("history") or []
+        }
+        state[REMOTE_TASKS_STATE_KEY] = remote_tasks
+        started = self.prefetcher.start(
+            callback_context.invocation_id,
+            agent_name,
+            query,
+            self._send_speculative_message(
+                agent_name, query, DetachedToolContext(state)
+            ),
+        )
+        if started:
+            print(f"Speculative prefetch to {agent_name} (confidence: {confidence:.2f})")
+
+    async def _send_speculative_message(
+        self, agent_name: str, task: str, detached_context: DetachedToolContext
+    ):
+        """先読みの問い合わせを送り、結果と複製した state に記録されたタスクを返す"""
+        result = await self._send_message_internal(agent_name, task, detached_context)
+        return result, detached_context.state[REMOTE_TASKS_STATE_KEY][agent_name]
+
+    async def after_agent_callback(self, callback_context: CallbackContext):
+        """使われなかった先読みをキャンセルする"""
+        self.prefetcher.cancel(callback_context.invocation_id)
+
+    async def before_model_callback(
+        self, callback_context: CallbackContext, llm_request: LlmRequest
+    ):
+        self._activate_session(callback_context.state)
+
+        if self._context_cache_enabled:
+            await self._apply_context_cache(callback_context, llm_request)
+
+    async def _apply_context_cache(
+        self, callback_context: CallbackContext, llm_request: LlmRequest
+    ):
+        """静的なシステムプロンプトとツール定義を Gemini のコンテキストキャッシュに載せる
+
+        キャッシュ利用時は system_instruction / tools をリクエストに含められないため、
+        動的な接尾辞は会話の先頭にユーザーターンとして追加する。
+        """
+        config = llm_request.config
+        system_instruction = config.system_instruction if config else None
+        dynamic = self._dynamic_instruction(callback_context)
+        if not isinstance(system_instruction, str) or not system_instruction.endswith(dynamic):
+            return
+        static = system_instruction[: -len(dynamic)]
+
+        try:
+            cache_name = await self._get_context_cache(llm_request.model, static, config.tools)
+        except Exception as e:
+            # 最小トークン数に満たない場合など。以降は通常のリクエストで送信する
+            print(f"Warning: Context caching disabled: {e}")
+            self._context_cache_enabled = False
+            return
+
+        config.cached_content = cache_name
+        config.system_instruction = None
+        config.tools = None
+        config.tool_config = None
+        llm_request.contents.insert(
+            0, types.Content(role="user", parts=[types.Part(text=dynamic)])
+        )
+
+    async def _get_context_cache(
+        self, model: str, static_instruction: str, tools: list[types.Tool] | None
+    ) -> str:
+        key_source = json.dumps(
+            [model, static_instruction, [t.model_dump(mode="json", exclude_none=True) for t in tools or []]],
+            ensure_ascii=False,
+        )
+        key = hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+        async with self._context_cache_lock:
+            cached = self._context_caches.get(key)
+            # 期限切れ直前のキャッシュは使わずに作り直す
+            if cached and cached[1] - time.monotonic() > 60:
+                return cached[0]
+            if self._genai_client is None:
+                self._genai_client = Client()
+            cache = await self._genai_client.aio.caches.create(
+                model=model,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=static_instruction,
+                    tools=tools,
+                    ttl=f"{COORDINATOR_CONTEXT_CACHE_TTL}s",
+                ),
+            )
+            # プロンプト（エージェント一覧）が変わった・期限が近づいたキャッシュは使われなくなるため、
+            # 期限まで課金され続けないよう削除する
+            stale = [name for name, _ in self._context_caches.values()]
+            self._context_caches = {
+                key: (cache.name, time.monotonic() + COORDINATOR_CONTEXT_CACHE_TTL)
+            }
+            for name in stale:
+                await self._delete_context_cache(name)
+            return cache.name
+
+    async def _delete_context_cache(self, name: str):
+        try:
+            await self._genai_client.aio.caches.delete(name=name)
+        except Exception as e:
+            # 期限切れで既に削除されている場合など
+            print(f"Warning: Failed to delete context cache {name}: {e}")
+
+    def get_push_notification_stats(self) -> Dict[str, int]:
+        """プッシュ通知の受信状況（受信数・検証失敗数・完了待ちのタスク数）"""
+        if self.push_receiver is None:
+            return {}
+        return {**self.push_receiver.stats, "in_flight": self.push_receiver.in_flight}
+
+    def available_agents(self) -> List[str]:
+        """問い合わせ可能なリモートエージェントの名前"""
+        return [name for name in self.cards if self._is_available(name)]
+
+    def get_agent_health_stats(self) -> Dict[str, Dict[str, Any]]:
+        """ヘルスチェックで確認した各リモートエージェントの状態"""
+        if self.health_checker is None:
+            return {}
+        return {name: dict(status) for name, status in self.health_checker.status.items()}
+
+    def get_connection_pool_stats(self) -> Dict[str, Dict[str, int]]:
+        """各リモートエージェントとの接続プールの使用状況を返す"""
+        return {
+            name: connection.pool_stats()
+            for name, connection in self.remote_agent_connections.items()
+        }
+
     def list_remote_agents(self):
         """タスクを委任できる利用可能なリモートエージェントをリストアップ"""
         if not self.cards:
             return []
 
         remote_agent_info = []
-        for card in self.cards.values():
+        for name, card in self.cards.items():
+            # ヘルスチェックで利用不可になっているエージェントはLLMに提示しない
+            if not self._is_available(name):
+                continue
             print(f"Found agent card: {card.model_dump(exclude_none=True)}")
             print("=" * 100)
-            remote_agent_info.append(
-                {"name": card.name, "description": card.description}
-            )
+            remote_agent_info.append(_summarize_card(card))
         return remote_agent_info
 
 
     async def send_message_with_retry(
         self, agent_name: str, task: str, tool_context: ToolContext,
-        max_retries: int = 2, retry_count: int = 0
+        max_retries: int = 2, retry_count: int = 0, new_context: bool = False
     ):
         """リトライロジック付きでリモートエージェントにタスクを送信
 
@@ -231,19 +939,24 @@ class CoordinatorAgent:
             tool_context: このメソッドが実行されるツールコンテキスト
             max_retries: 最大リトライ回数（デフォルト: 2）
             retry_count: 現在のリトライ試行回数（内部使用）
+            new_context: 直前のコンテキストを引き継がずに送信するかどうか
 
         Returns:
             レスポンスパーツまたは失敗時の空のリスト
         """
         try:
-            return await self._send_message_internal(agent_name, task, tool_context)
+            return await self._send_message_internal(agent_name, task, tool_context, new_context)
+        except AcceptedTaskError as e:
+            print(f"ERROR: {str(e)}")
+            return []
         except Exception as e:
             print(f"ERROR: Failed to send message to {agent_name}: {str(e)}")
-            if retry_count < max_retries:
+            # 利用不可になったエージェントにはリトライせず、すぐに失敗を返す
+            if retry_count < max_retries and self._is_available(agent_name):
                 print(f"Retrying... (attempt {retry_count + 1} of {max_retries})")
                 await asyncio.sleep(1)  # 1秒待機してからリトライ
                 return await self.send_message_with_retry(
-                    agent_name, task, tool_context, max_retries, retry_count + 1
+                    agent_name, task, tool_context, max_retries, retry_count + 1, new_context
                 )
             else:
                 print(f"ERROR: All retry attempts failed for {agent_name}")
@@ -264,142 +977,547 @@ class CoordinatorAgent:
         Yields:
             JSONデータの辞書
         """
-        return await self.send_message_with_retry(agent_name, task, tool_context)
+        return await self._send_message(agent_name, task, tool_context)
+
+    async def _send_message(
+        self, agent_name: str, task: str, tool_context: ToolContext,
+        new_context: bool = False
+    ):
+        if self.prefetcher is not None and not new_context:
+            speculative = self.prefetcher.take(
+                getattr(tool_context, "invocation_id", None), agent_name, task
+            )
+            if speculative is not None:
+                try:
+                    result, record = await speculative
+                    # 先読みのタスクとコンテキストを採用し、続けての問い合わせや
+                    # get_previous_result で使えるようにする
+                    state = tool_context.state
+                    remote_tasks = dict(state.get(REMOTE_TASKS_STATE_KEY) or {})
+                    remote_tasks[agent_name] = record
+                    state[REMOTE_TASKS_STATE_KEY] = remote_tasks
+                    state["active_agent"] = agent_name
+                    print(f"Using speculative result from {agent_name}")
+                    return result
+                except Exception as e:
+                    print(f"Warning: Speculative call to {agent_name} failed: {e}")
+        return await self.send_message_with_retry(
+            agent_name, task, tool_context, new_context=new_context
+        )
 
     async def _send_message_internal(
-        self, agent_name: str, task: str, tool_context: ToolContext
+        self, agent_name: str, task: str, tool_context: ToolContext,
+        new_context: bool = False
     ):
         """メッセージ送信の内部メソッド（リトライラッパーから呼び出される）"""
-        if agent_name not in self.remote_agent_connections:
-            raise ValueError(f"Agent {agent_name} not found")
+        json_content = await self._send_task_request(
+            agent_name, [{"type": "text", "text": task}], tool_context, new_context
+        )
+
+        resp = _artifact_parts(json_content)
+        print(f"[DEBUG] Returning {len(resp)} parts to coordinator")
+        return resp
+
+    async def _send_task_request(
+        self, agent_name: str, parts: List[Dict[str, Any]], tool_context: ToolContext,
+        new_context: bool = False
+    ) -> Dict[str, Any]:
+        """メッセージパーツをリモートエージェントに送信し、レスポンス全体をJSON形式の辞書で返す
+
+        直前のタスクのコンテキストIDを引き継いで送信するため、リモートエージェントは同じセッション
+        （会話履歴）で処理を続けます。new_context=True の場合はコンテキストIDを送らずに1回限りの
+        リクエストとして送信し、記録されたコンテキストも更新しません（同じエージェントへの並行した問い合わせ用）。
+        """
+        self._check_available(agent_name)
         state = tool_context.state
         state["active_agent"] = agent_name
         client = self.remote_agent_connections[agent_name]
 
         if not client:
             raise ValueError(f"Client not available for {agent_name}")
-        if "task_id" in state:
-            taskId = state["task_id"]
+        payload = create_task_request_payload(state, agent_name, parts, new_context)
+        messageId = payload["message"]["messageId"]
+        task_id = payload["message"]["taskId"]
 
-        else:
-            taskId = str(uuid.uuid4())
-        task_id = taskId
-        sessionId = state["session_id"]
-        if "context_id" in state:
-            context_id = state["context_id"]
-        else:
-            context_id = str(uuid.uuid4())
-
-        messageId = ""
-        metadata = {}
-        if "input_message_metadata" in state:
-            metadata.update(**state["input_message_metadata"])
-            if "message_id" in state["input_message_metadata"]:
-                messageId = state["input_message_metadata"]["message_id"]
-        if not messageId:
-            messageId = str(uuid.uuid4())
-
-        payload = {
-            "message": {
-                "role": "user",
-                "parts": [{"type": "text", "text": task}],
-                "messageId": messageId,
-            },
-        }
-
-        if task_id:
-            payload["message"]["taskId"] = task_id
-
-        if context_id:
-            payload["message"]["contextId"] = context_id
-
-        message_request = SendMessageRequest(
-            id=messageId, params=MessageSendParams.model_validate(payload)
-        )
-        send_response: SendMessageResponse = await client.send_message( message_request= message_request)
-        print("send_response", send_response)
+        use_push = self._use_push_notifications(agent_name)
+        try:
+            if use_push:
+                # タスクの受け付け時点で応答を受け取り、完了はプッシュ通知で待つ
+                token = self.push_receiver.register(task_id)
+                payload["configuration"] = {
+                    "acceptedOutputModes": client.get_agent().defaultOutputModes,
+                    "blocking": False,
+                    "pushNotificationConfig": {"url": self.push_receiver.url, "token": token},
+                }
+
+            message_request = SendMessageRequest(
+                id=messageId, params=MessageSendParams.model_validate(payload)
+            )
+            send_response: SendMessageResponse = await client.send_message( message_request= message_request)
+            print("send_response", send_response)
+            if (
+                use_push
+                and isinstance(send_response.root, SendMessageSuccessResponse)
+                and isinstance(send_response.root.result, Task)
+                and send_response.root.result.status.state.value in PENDING_TASK_STATES
+            ):
+                send_response.root.result = await self._wait_for_pushed_task(
+                    agent_name, task_id
+                )
+        finally:
+            if use_push:
+                self.push_receiver.discard(task_id)
 
         if not isinstance(send_response.root, SendMessageSuccessResponse):
             print("received non-success response. Aborting get task ")
-            raise Exception(f"Non-success response from {agent_name}")
+            error = getattr(send_response.root, "error", None)
+            detail = f": {error.message}" if error is not None else ""
+            raise Exception(f"Non-success response from {agent_name}{detail}")
 
         if not isinstance(send_response.root.result, Task):
             print("received non-task response. Aborting get task ")
             raise Exception(f"Non-task response from {agent_name}")
 
+        if self.task_callback:
+            self.task_callback(send_response.root.result, client.get_agent())
+        self._record_remote_task(
+            state, agent_name, send_response.root.result, parts, update_context=not new_context
+        )
+
         response = send_response
         if hasattr(response, "root"):
             content = response.root.model_dump_json(exclude_none=True)
         else:
             content = response.model_dump(mode="json", exclude_none=True)
 
-        resp = []
         json_content = json.loads(content)
         print(f"[DEBUG] Full response from {agent_name}:")
         print(json.dumps(json_content, indent=2, ensure_ascii=False))
+        return json_content
+
+    async def _wait_for_pushed_task(self, agent_name: str, task_id: str) -> Task:
+        """受け付けられたタスクの完了をプッシュ通知で待つ
 
-        if json_content.get("result"):
-            result = json_content["result"]
+        通知が PUSH_TASK_TIMEOUT 秒以内に届かなければ（エージェントサーバーからの送信失敗など）、
+        tasks/get で完了を確認する。
+        """
+        try:
+            try:
+                return await self.push_receiver.wait(task_id, PUSH_TASK_TIMEOUT)
+            except asyncio.TimeoutError:
+                print(f"Warning: No push notification for task {task_id}; polling {agent_name}")
+            client = self.remote_agent_connections[agent_name]
+            while True:
+                response = await client.get_task(task_id)
+                if not isinstance(response.root, GetTaskSuccessResponse):
+                    raise Exception(f"tasks/get failed: {response.root}")
+                task = response.root.result
+                if task.status.state.value not in PENDING_TASK_STATES:
+                    return task
+                await asyncio.sleep(PUSH_POLL_INTERVAL)
+        except Exception as e:
+            raise AcceptedTaskError(
+                f"Failed to get the result of task {task_id} from {agent_name}: {e}"
+            ) from e
 
-            # 標準形式: {"result": {"artifacts": [{"parts": [...]}]}}
-            if isinstance(result, dict) and result.get("artifacts"):
-                for artifact in result["artifacts"]:
-                    if artifact.get("parts"):
-                        print(f"[DEBUG] Found {len(artifact['parts'])} parts in artifact")
-                        resp.extend(artifact["parts"])
-            elif isinstance(result, list):
-                # リストの各要素をそのまま追加
-                resp.extend(result)
+    async def _stream_task_request(
+        self, agent_name: str, parts: List[Dict[str, Any]], tool_context: ToolContext
+    ) -> AsyncIterator[Task | TaskStatusUpdateEvent | TaskArtifactUpdateEvent]:
+        """メッセージパーツを message/stream でリモートエージェントに送信し、タスクのイベントを受け取った順に返す
 
-        print(f"[DEBUG] Returning {len(resp)} parts to coordinator")
-        return resp
+        最後のイベントまで受け取ると、_send_task_request と同様にタスクを state に記録する。
+        """
+        self._check_available(agent_name)
+        state = tool_context.state
+        state["active_agent"] = agent_name
+        client = self.remote_agent_connections[agent_name]
+        payload = create_task_request_payload(state, agent_name, parts)
+        request = SendStreamingMessageRequest(
+            id=payload["message"]["messageId"], params=MessageSendParams.model_validate(payload)
+        )
+
+        task = None
+        async for response in client.send_message_streaming(request):
+            if not isinstance(response.root, SendStreamingMessageSuccessResponse):
+                error = getattr(response.root, "error", None)
+                detail = f": {error.message}" if error is not None else ""
+                raise Exception(f"Non-success response from {agent_name}{detail}")
+            event = response.root.result
+            if isinstance(event, Message):
+                raise Exception(f"Non-task response from {agent_name}")
+            if self.task_callback:
+                self.task_callback(event, client.get_agent())
+            if isinstance(event, Task):
+                task = event
+            elif isinstance(event, TaskStatusUpdateEvent):
+                task = Task(id=event.taskId, contextId=event.contextId, status=event.status)
+            yield event
+
+        if task is None:
+            raise Exception(f"No task in the response from {agent_name}")
+        self._record_remote_task(state, agent_name, task, parts)
+
+    def _use_push_notifications(self, agent_name: str) -> bool:
+        card = self.cards.get(agent_name)
+        return (
+            self.push_receiver is not None
+            and agent_name in PUSH_NOTIFICATION_AGENTS
+            and card is not None
+            and bool(card.capabilities.pushNotifications)
+        )
+
+    def _record_remote_task(
+        self,
+        state,
+        agent_name: str,
+        task: Task,
+        parts: List[Dict[str, Any]],
+        update_context: bool = True,
+    ):
+        """リモートエージェントから返されたタスクを、次回の続行と結果の再取得のために state に記録する"""
+        remote_tasks = dict(state.get(REMOTE_TASKS_STATE_KEY) or {})
+        record = dict(remote_tasks.get(agent_name) or {})
+        if update_context:
+            record.update(
+                task_id=task.id,
+                context_id=task.contextId,
+                state=task.status.state.value,
+            )
+        summary = " ".join(
+            part["text"] if isinstance(part.get("text"), str) else json.dumps(part.get("data"), ensure_ascii=False)
+            for part in parts
+        )
+        history = list(record.get("history") or [])
+        history.append({"task_id": task.id, "task": summary[:80]})
+        record["history"] = history[-REMOTE_TASK_HISTORY_LIMIT:]
+        remote_tasks[agent_name] = record
+        # ネストした値の変更は検知されないため、辞書ごと再代入する
+        state[REMOTE_TASKS_STATE_KEY] = remote_tasks
+
+    async def get_previous_result(
+        self,
+        agent_name: str,
+        tool_context: ToolContext,
+        task_id: Optional[str] = None,
+    ):
+        """以前にエージェントへ問い合わせたタスクの結果を、問い合わせを再送せずに取得する
+
+        Args:
+            agent_name: エージェントの名前
+            tool_context: ツールコンテキスト
+            task_id: 取得するタスクのID（省略時はそのエージェントへの直近のタスク）
+
+        Returns:
+            回答のパーツのリスト
+        """
+        self._check_available(agent_name)
+        if not task_id:
+            record = (tool_context.state.get(REMOTE_TASKS_STATE_KEY) or {}).get(agent_name) or {}
+            history = record.get("history") or []
+            task_id = record.get("task_id") or (history[-1]["task_id"] if history else None)
+        if not task_id:
+            return {"error": f"{agent_name} への過去の問い合わせはありません"}
+
+        response = await self.remote_agent_connections[agent_name].get_task(task_id)
+        if not isinstance(response.root, GetTaskSuccessResponse):
+            print(f"ERROR: Failed to get task {task_id} from {agent_name}: {response.root}")
+            return {"error": f"タスク {task_id} を取得できませんでした"}
+        return _artifact_parts(json.loads(response.root.model_dump_json(exclude_none=True)))
+
+    async def submit_task(
+        self, agent_name: str, task: str, tool_context: ToolContext
+    ) -> Dict[str, Any]:
+        """時間のかかる問い合わせをバックグラウンドで開始し、完了を待たずにすぐ戻る
+
+        結果は get_task_result または wait_any で後から取得します。
+
+        Args:
+            agent_name: タスクを送信するエージェントの名前
+            task: 問い合わせ内容
+            tool_context: ツールコンテキスト
+
+        Returns:
+            {"task_id": 結果の取得に使うID, "status": "submitted"}
+        """
+        self._check_available(agent_name)
+        connection = self.remote_agent_connections[agent_name]
+        connection.purge_pending_tasks(SUBMITTED_TASK_RESULT_TTL)
+        if len(connection.pending_tasks) >= SUBMITTED_TASK_MAX_PER_AGENT:
+            finished = [p for p in connection.pending_tasks.values() if p.finished_at is not None]
+            if not finished:
+                return {
+                    "status": "rejected",
+                    "error": f"{agent_name} で実行中のタスクが上限（{SUBMITTED_TASK_MAX_PER_AGENT}件）に達しています",
+                }
+            # 上限に達した場合は、完了済みのタスクのうち最も古いものから削除する
+            oldest = min(finished, key=lambda p: p.finished_at)
+            del connection.pending_tasks[oldest.task_id]
+
+        state = tool_context.state
+        # ターンの終了後も実行を続けるため、セッションの state には書き込まない複製したコンテキストで送信する。
+        # 並行する他の問い合わせと会話履歴が混ざらないよう、新しいコンテキストを使う
+        detached_context = DetachedToolContext(
+            state.to_dict() if hasattr(state, "to_dict") else dict(state)
+        )
+        pending = PendingTask(
+            task_id=uuid.uuid4().hex[:8],
+            agent_name=agent_name,
+            session_id=state.get("session_id"),
+            task=task,
+            future=asyncio.ensure_future(
+                self._send_message(agent_name, task, detached_context, new_context=True)
+            ),
+        )
+        connection.pending_tasks[pending.task_id] = pending
+        print(f"Submitted background task {pending.task_id} to {agent_name}")
+        return {"task_id": pending.task_id, "status": "submitted"}
+
+    def _session_pending_tasks(self, tool_context) -> List[PendingTask]:
+        """現在のセッションで submit_task したタスク（期限切れを除く）"""
+        session_id = tool_context.state.get("session_id")
+        tasks = []
+        for connection in self.remote_agent_connections.values():
+            connection.purge_pending_tasks(SUBMITTED_TASK_RESULT_TTL)
+            tasks.extend(
+                p for p in connection.pending_tasks.values() if p.session_id == session_id
+            )
+        return tasks
+
+    def _report_pending_task(self, pending: PendingTask) -> Dict[str, Any]:
+        status = pending.status()
+        if "result" in status:
+            pending.reported = True
+            if PARALLEL_RESULT_MAX_CHARS and status["result"]:
+                status["result"] = _truncate_result(status["result"], PARALLEL_RESULT_MAX_CHARS)
+        return status
+
+    async def get_task_result(self, task_id: str, tool_context: ToolContext) -> Dict[str, Any]:
+        """submit_task で開始したタスクの状態と、完了していれば結果を返す（待機はしない）
+
+        Args:
+            task_id: submit_task が返したタスクID
+            tool_context: ツールコンテキスト
+
+        Returns:
+            {"task_id", "agent_name", "status": "running" | "completed" | "failed" | "cancelled", "result"}
+        """
+        for pending in self._session_pending_tasks(tool_context):
+            if pending.task_id == task_id:
+                return self._report_pending_task(pending)
+        return {"task_id": task_id, "status": "not_found"}
+
+    async def wait_any(
+        self,
+        tool_context: ToolContext,
+        task_ids: Optional[List[str]] = None,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """submit_task で開始したタスクのうち、いずれか一つが完了するまで待ってその結果を返す
+
+        Args:
+            tool_context: ツールコンテキスト
+            task_ids: 待つタスクのID（省略時は、まだ結果を返していないこのセッションのすべてのタスク）
+            timeout: 待機する最大秒数
+
+        Returns:
+            完了したタスクの結果（get_task_result と同じ形式）。時間内に完了しなければ {"status": "timeout", "pending": [...]}
+        """
+        candidates = [
+            p for p in self._session_pending_tasks(tool_context)
+            if (p.task_id in task_ids if task_ids else not p.reported)
+        ]
+        if not candidates:
+            return {"status": "no_tasks"}
+
+        # 既に完了していて、まだ結果を返していないものを優先する
+        finished = [p for p in candidates if p.future.done()]
+        if not finished:
+            done, _ = await asyncio.wait(
+                {p.future for p in candidates},
+                timeout=timeout or WAIT_ANY_TIMEOUT,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            finished = [p for p in candidates if p.future in done]
+        if not finished:
+            return {"status": "timeout", "pending": [p.task_id for p in candidates]}
+        finished.sort(key=lambda p: (p.reported, p.finished_at or 0))
+        return self._report_pending_task(finished[0])
 
     async def send_messages_parallel(
         self,
         agent_tasks: List[Dict[str, str]],
-        tool_context: ToolContext
+        tool_context: ToolContext,
+        first_k: Optional[int] = None,
+        max_result_chars: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
     ) -> Dict[str, Any]:
         """複数のエージェントに並列で問い合わせる
 
+        同じエージェントに複数のタスクを送ることもできます（例: 20か所のスポットの営業時間をそれぞれ問い合わせる）。
+        各タスクの結果は届いた順に処理され、その都度ユーザーにも表示されます。
+
         Args:
-            agent_tasks: エージェント名とタスクのリスト
-                例: [{"agent_name": "midokoro_agent", "task": "沖縄の人気観光スポットを教えて"}, ...]
+            agent_tasks: エージェント名とタスクのリスト。"task_id" で各タスクの識別子を指定できる
+                （省略時はエージェント名、同じエージェントが複数回現れる場合は「エージェント名#連番」）
+                例: [{"agent_name": "midokoro_agent", "task": "首里城の営業時間を教えて", "task_id": "shurijo"}, ...]
             tool_context: ツールコンテキスト
+            first_k: 指定した場合、空でない回答がこの数だけ揃った時点で残りの問い合わせを打ち切る
+            max_result_chars: 各タスクの回答として返す最大文字数（超えた分は省略）
+            max_concurrency: エージェントごとの同時問い合わせ数の上限
 
         Returns:
-            各エージェントからの回答の辞書
+            タスクIDをキーとした各タスクの回答の辞書
         """
-        tasks = []
-        agent_names = []
+        if max_result_chars is None:
+            max_result_chars = PARALLEL_RESULT_MAX_CHARS
+        if not max_concurrency or max_concurrency < 1:
+            max_concurrency = PARALLEL_MAX_CONCURRENCY_PER_AGENT
 
-        for agent_task in agent_tasks:
-            agent_name = agent_task["agent_name"]
-            task = agent_task["task"]
+        # 同じエージェントへの大量のタスクでエージェントサーバーを詰まらせないよう、エージェントごとに同時実行数を制限する
+        limits: dict[str, asyncio.Semaphore] = {}
 
-            if agent_name not in self.remote_agent_connections:
-                print(f"Warning: Agent {agent_name} not found, skipping")
-                continue
+        assigned = _assign_task_ids(agent_tasks)
+        task_counts: dict[str, int] = {}
+        for _, agent_name, _ in assigned:
+            task_counts[agent_name] = task_counts.get(agent_name, 0) + 1
+
+        async def labelled(task_id: str, agent_name: str, task: str):
+            try:
+                async with limits[agent_name]:
+                    # 同じエージェントへの複数のタスクは、互いの会話履歴が混ざらないよう別々のコンテキストで送る
+                    return task_id, await self._send_message(
+                        agent_name, task, tool_context, new_context=task_counts[agent_name] > 1
+                    )
+            except Exception as e:
+                return task_id, e
 
-            agent_names.append(agent_name)
-            tasks.append(self.send_message(agent_name, task, tool_context))
+        pending = []
+        agent_of: dict[str, str] = {}
+        for task_id, agent_name, task in assigned:
+            if not self._is_available(agent_name):
+                print(f"Warning: Agent {agent_name} is not available, skipping")
+                continue
 
-        # 並列実行
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+            limits.setdefault(agent_name, asyncio.Semaphore(max_concurrency))
+            agent_of[task_id] = agent_name
+            pending.append(asyncio.ensure_future(labelled(task_id, agent_name, task)))
 
-        # 結果を辞書形式で返す
+        # 届いた順に結果を処理する
         response_dict = {}
-        for agent_name, result in zip(agent_names, results):
-            if isinstance(result, Exception):
-                print(f"ERROR: Exception from {agent_name}: {str(result)}")
-                response_dict[agent_name] = []  # エラー時は空のリストを返す
-            elif not result:
-                print(f"WARNING: Empty response from {agent_name}")
-                response_dict[agent_name] = []
-            else:
-                response_dict[agent_name] = result
+        completed = 0
+        try:
+            for finished in asyncio.as_completed(pending):
+                task_id, result = await finished
+                if isinstance(result, Exception):
+                    print(f"ERROR: Exception from {agent_of[task_id]} ({task_id}): {str(result)}")
+                    response_dict[task_id] = []  # エラー時は空のリストを返す
+                elif not result:
+                    print(f"WARNING: Empty response from {agent_of[task_id]} ({task_id})")
+                    response_dict[task_id] = []
+                else:
+                    if max_result_chars:
+                        result = _truncate_result(result, max_result_chars)
+                    response_dict[task_id] = result
+                    completed += 1
+                    self._emit_partial_result(task_id, result)
+
+                if first_k and completed >= first_k:
+                    print(f"Received {completed} results, cancelling remaining requests")
+                    break
+        finally:
+            for future in pending:
+                if not future.done():
+                    future.cancel()
 
         return response_dict
 
+    async def send_message_batch(
+        self,
+        agent_name: str,
+        tasks: List[str],
+        tool_context: ToolContext,
+        max_result_chars: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """同じエージェントへの複数の小さな問い合わせを1回のリクエストにまとめて送る
+
+        例: 「20か所のスポットの営業時間」「50個のフレーズの方言変換」など。
+        エージェントがバッチ問い合わせ（スキルのタグに "batch"）に対応していない場合は、
+        send_messages_parallel で個別に問い合わせます。
+
+        Args:
+            agent_name: タスクを送信するエージェントの名前
+            tasks: 問い合わせ内容のリスト
+            tool_context: ツールコンテキスト
+            max_result_chars: 各問い合わせの回答として返す最大文字数（超えた分は省略）
+
+        Returns:
+            問い合わせ順の [{"task": 問い合わせ内容, "result": 回答}, ...]
+        """
+        self._check_available(agent_name)
+        if max_result_chars is None:
+            max_result_chars = PARALLEL_RESULT_MAX_CHARS
+
+        if not _supports_batch(self.cards[agent_name]):
+            print(f"{agent_name} does not support batch requests, falling back to parallel")
+            results = await self.send_messages_parallel(
+                [
+                    {"agent_name": agent_name, "task": task, "task_id": str(i)}
+                    for i, task in enumerate(tasks, start=1)
+                ],
+                tool_context,
+                max_result_chars=max_result_chars,
+            )
+            return [
+                {"task": task, "result": results.get(str(i), [])}
+                for i, task in enumerate(tasks, start=1)
+            ]
+
+        try:
+            json_content = await self._send_task_request(
+                agent_name,
+                [
+                    {
+                        "kind": "data",
+                        "data": {
+                            "batch": [
+                                {"id": str(i), "text": task}
+                                for i, task in enumerate(tasks, start=1)
+                            ]
+                        },
+                    }
+                ],
+                tool_context,
+                new_context=True,
+            )
+        except Exception as e:
+            print(f"ERROR: Batch request to {agent_name} failed: {str(e)}")
+            return [{"task": task, "result": [], "error": str(e)} for task in tasks]
+
+        # 各問い合わせの回答は、id を名前に持つアーティファクトとして返される
+        results: dict[str, list] = {}
+        for artifact in (json_content.get("result") or {}).get("artifacts") or []:
+            item_id = (artifact.get("metadata") or {}).get("batch_item_id") or artifact.get("name")
+            result = artifact.get("parts") or []
+            if result and max_result_chars:
+                result = _truncate_result(result, max_result_chars)
+            results[item_id] = result
+            if result:
+                self._emit_partial_result(f"{agent_name}#{item_id}", result)
+
+        return [
+            {"task": task, "result": results.get(str(i), [])}
+            for i, task in enumerate(tasks, start=1)
+        ]
+
+    def _emit_partial_result(self, task_id: str, result: Any):
+        listener = partial_result_listener.get()
+        if listener is None:
+            return
+        try:
+            listener(task_id, self._format_agent_result(result))
+        except Exception as e:
+            print(f"Warning: Partial result listener failed: {e}")
+
     async def send_message_chain(
         self,
         chain: List[Dict[str, Any]],
@@ -424,8 +1542,8 @@ class CoordinatorAgent:
         for step in chain:
             agent_name = step["agent_name"]
 
-            if agent_name not in self.remote_agent_connections:
-                print(f"Warning: Agent {agent_name} not found, skipping")
+            if not self._is_available(agent_name):
+                print(f"Warning: Agent {agent_name} is not available, skipping")
                 continue
 
             # タスクの構築
@@ -471,8 +1589,11 @@ class CoordinatorAgent:
                     # textフィールドがある場合
                     if "text" in part:
                         texts.append(part["text"])
+                    # ファイルは内容（base64）を展開せず、参照として扱う
+                    elif part.get("kind") == "file":
+                        texts.append(_describe_file_part(part))
                     # 他の情報（kind, type等）もログに記録
-                    if "kind" in part and part["kind"] != "text":
+                    elif "kind" in part and part["kind"] != "text":
                         print(f"Additional part info: {part}")
                 elif hasattr(part, "text"):
                     texts.append(part.text)
@@ -514,6 +1635,29 @@ class CoordinatorAgent:
         # 重複を削除して返す
         return list(set(required_agents))
 
+    def classify_query(self, query: str) -> tuple[Optional[str], float]:
+        """クエリを単一のエージェントに分類し、その確信度を返す
+
+        Args:
+            query: ユーザーのクエリ
+
+        Returns:
+            (エージェント名, 確信度)。複数のエージェントに該当する場合や
+            複数の処理が必要そうな場合は (None, 0.0)
+        """
+        if re.search(MULTI_STEP_PATTERN, query):
+            return None, 0.0
+
+        scores = {}
+        for agent_name, patterns in INTENT_PATTERNS.items():
+            score = sum(weight for pattern, weight in patterns if re.search(pattern, query))
+            if score > 0:
+                scores[agent_name] = round(min(score, 1.0), 2)
+
+        if len(scores) != 1:
+            return None, 0.0
+        return next(iter(scores.items()))
+
 
 # For backward compatibility, if someone imports coordinator_agent directly
 def get_coordinator_agent():
@@ -523,12 +1667,7 @@ def get_coordinator_agent():
     非同期環境では、CoordinatorAgent.create()を直接使用してください。
     """
     async def _async_main():
-        coordinator_agent_instance = await CoordinatorAgent.create(
-            remote_agent_addresses=[
-                UCHINA_GUCHI_AGENT_URL,
-                MIDOKORO_AGENT_URL,
-            ]
-        )
+        coordinator_agent_instance = await CoordinatorAgent.create()
         return coordinator_agent_instance.create_agent()
     try:
         return asyncio.run(_async_main())
@@ -0,0 +1,279 @@
+"""AgentExecutor that serves the CoordinatorAgent over A2A.
+
+Modeled on the agents' ADKAgentExecutor (see midokoro_agent/adk_agent_executor.py),
+without the batch, file and stateless paths: the coordinator takes text and
+answers with text.
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+
+from collections import OrderedDict
+from collections.abc import AsyncGenerator
+from google.adk import Runner
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.events import Event
+from google.adk.sessions import Session
+from google.genai import types
+
+from a2a.server.agent_execution import AgentExecutor
+from a2a.server.agent_execution.context import RequestContext
+from a2a.server.events.event_queue import EventQueue
+from a2a.server.tasks import TaskUpdater
+from a2a.types import (
+    Artifact,
+    DataPart,
+    InvalidParamsError,
+    Part,
+    TaskArtifactUpdateEvent,
+    TaskState,
+    TextPart,
+    UnsupportedOperationError,
+)
+from a2a.utils.errors import ServerError
+
+from coordinator_agent import partial_result_listener
+
+
+logger = logging.getLogger(__name__)
+
+# Set in the call context's state by the request handler for message/stream
+# requests, the only ones whose partial output reaches the client.
+STREAMING_STATE_KEY = "streaming"
+
+
+class CoordinatorAgentExecutor(AgentExecutor):
+    """An AgentExecutor that runs the coordinator's ADK agent.
+
+    Each context ID maps to one ADK session, so the coordinator's
+    per-conversation state (active agent, remote task and context IDs) is
+    kept across requests. With a shared session service, any replica can
+    continue a context.
+
+    With `streaming` enabled, message/stream requests run the runner in SSE
+    mode and partial text is appended to a single artifact as it is
+    generated. Results of remote
+    agents collected by `send_messages_parallel` are sent as `working` status
+    messages as soon as each one arrives, with the remote task ID in the
+    message metadata (`task_id`).
+    """
+
+    def __init__(
+        self,
+        runner: Runner,
+        streaming: bool = True,
+        session_cache_size: int = 1000,
+    ):
+        self.runner = runner
+        self.streaming = streaming
+        self.session_cache_size = session_cache_size
+        self._session_handles: OrderedDict[str, Session] = OrderedDict()
+
+    def _run_agent(
+        self, session_id: str, new_message: types.Content, streaming: bool
+    ) -> AsyncGenerator[Event, None]:
+        run_config = RunConfig(
+            streaming_mode=StreamingMode.SSE if streaming else StreamingMode.NONE
+        )
+        return self.runner.run_async(
+            session_id=session_id,
+            user_id="self",
+            new_message=new_message,
+            run_config=run_config,
+        )
+
+    async def _stream_response(
+        self,
+        session_id: str,
+        new_message: types.Content,
+        task_updater: TaskUpdater,
+        pending: set[asyncio.Task],
+        streaming: bool,
+    ) -> None:
+        # Partial chunks are appended to one artifact. The first chunk of each
+        # model response starts the artifact over (append=False), so text
+        # streamed before a tool call is replaced by the answer that follows.
+        artifact_id = str(uuid.uuid4())
+        streamed = False
+        async for event in self._run_agent(session_id, new_message, streaming):
+            if event.partial:
+                parts = convert_genai_parts_to_a2a(
+                    event.content.parts if event.content else []
+                )
+                if parts:
+                    await add_artifact_chunk(
+                        task_updater, artifact_id, parts, append=streamed
+                    )
+                    streamed = True
+                continue
+            if event.is_final_response():
+                parts = convert_genai_parts_to_a2a(
+                    event.content.parts if event.content else []
+                )
+                logger.debug("Yielding final response: %s", parts)
+                # Partial results still being enqueued must precede the final
+                # status, after which the queue is closed.
+                await asyncio.gather(*pending)
+                if streamed:
+                    await add_artifact_chunk(
+                        task_updater, artifact_id, parts, append=False, last_chunk=True
+                    )
+                else:
+                    await task_updater.add_artifact(parts, artifact_id=artifact_id)
+                await task_updater.complete()
+                break
+            streamed = False
+            if not event.get_function_calls():
+                parts = convert_genai_parts_to_a2a(
+                    event.content.parts if event.content else []
+                )
+                if parts:
+                    logger.debug("Yielding update response")
+                    await task_updater.update_status(
+                        TaskState.working,
+                        message=task_updater.new_agent_message(parts),
+                    )
+            else:
+                logger.debug("Skipping event")
+
+    async def execute(
+        self,
+        context: RequestContext,
+        event_queue: EventQueue,
+    ):
+        try:
+            new_message = types.UserContent(
+                parts=convert_a2a_parts_to_genai(context.message.parts)
+            )
+        except ValueError as e:
+            raise ServerError(error=InvalidParamsError(message=str(e))) from e
+
+        updater = TaskUpdater(event_queue, context.task_id, context.context_id)
+        if not context.current_task:
+            await updater.submit()
+        await updater.start_work()
+
+        pending: set[asyncio.Task] = set()
+
+        def on_partial_result(task_id: str, text: str) -> None:
+            # Called synchronously from the coordinator's tools.
+            task = asyncio.create_task(
+                updater.update_status(
+                    TaskState.working,
+                    message=updater.new_agent_message(
+                        [Part(root=TextPart(text=text))],
+                        metadata={"task_id": task_id},
+                    ),
+                )
+            )
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+
+        streaming = self.streaming and is_streaming_request(context)
+        session = await self._upsert_session(context.context_id)
+        token = partial_result_listener.set(on_partial_result)
+        try:
+            await self._stream_response(
+                session.id, new_message, updater, pending, streaming
+            )
+        finally:
+            partial_result_listener.reset(token)
+            # If the runner failed or was cancelled, partial results not yet
+            # enqueued are dropped rather than left running.
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        logger.debug("execute exiting")
+
+    async def cancel(self, context: RequestContext, event_queue: EventQueue):
+        # Ideally: kill any ongoing tasks.
+        raise ServerError(error=UnsupportedOperationError())
+
+    async def _upsert_session(self, session_id: str) -> Session:
+        """Retrieve a session if it exists, otherwise create a new one.
+
+        Handles are cached, and a session service providing
+        `get_or_create_session` is asked once instead of get then create.
+        """
+        session = self._session_handles.get(session_id)
+        if session is not None:
+            self._session_handles.move_to_end(session_id)
+            return session
+        session_service = self.runner.session_service
+        get_or_create = getattr(session_service, "get_or_create_session", None)
+        if get_or_create is not None:
+            session = await get_or_create(
+                app_name=self.runner.app_name, user_id="self", session_id=session_id
+            )
+        else:
+            session = await session_service.get_session(
+                app_name=self.runner.app_name, user_id="self", session_id=session_id
+            )
+            if session is None:
+                session = await session_service.create_session(
+                    app_name=self.runner.app_name, user_id="self", session_id=session_id
+                )
+        if session is None:
+            raise RuntimeError(f"Failed to get or create session: {session_id}")
+        self._session_handles[session_id] = session
+        if len(self._session_handles) > self.session_cache_size:
+            self._session_handles.popitem(last=False)
+        return session
+
+
+def is_streaming_request(context: RequestContext) -> bool:
+    """Whether the request came in through message/stream."""
+    call_context = context.call_context
+    return bool(call_context and call_context.state.get(STREAMING_STATE_KEY))
+
+
+async def add_artifact_chunk(
+    task_updater: TaskUpdater,
+    artifact_id: str,
+    parts: list[Part],
+    append: bool,
+    last_chunk: bool = False,
+) -> None:
+    """Send a chunk of a streamed artifact.
+
+    With append=False the chunk replaces the artifact's parts; otherwise the
+    parts are appended to it.
+    """
+    await task_updater.event_queue.enqueue_event(
+        TaskArtifactUpdateEvent(
+            taskId=task_updater.task_id,
+            contextId=task_updater.context_id,
+            artifact=Artifact(artifactId=artifact_id, parts=parts),
+            append=append,
+            lastChunk=last_chunk,
+        )
+    )
+
+
+def convert_a2a_parts_to_genai(parts: list[Part]) -> list[types.Part]:
+    """Convert A2A parts into Gen AI parts.
+
+    Text is passed as is and data parts as JSON text. File parts are
+    rejected, since the coordinator only relays text to the remote agents.
+    """
+    converted = []
+    for part in parts:
+        part = part.root
+        if isinstance(part, TextPart):
+            converted.append(types.Part(text=part.text))
+        elif isinstance(part, DataPart):
+            converted.append(
+                types.Part(text=json.dumps(part.data, ensure_ascii=False))
+            )
+        else:
+            raise ValueError(f"Unsupported part type: {part.kind}")
+    if not converted:
+        raise ValueError("Message has no text")
+    return converted
+
+
+def convert_genai_parts_to_a2a(parts: list[types.Part]) -> list[Part]:
+    """Convert the text of Gen AI parts into A2A text parts."""
+    return [Part(root=TextPart(text=part.text)) for part in parts if part.text]
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+
+from collections.abc import AsyncGenerator
+from datetime import datetime, timezone
+
+from a2a.server.context import ServerCallContext
+from a2a.server.events import Event
+from a2a.server.request_handlers import DefaultRequestHandler
+from a2a.types import (
+    InternalError,
+    Message,
+    MessageSendParams,
+    Task,
+    TaskState,
+    TaskStatus,
+)
+from a2a.utils import new_agent_text_message
+from a2a.utils.errors import ServerError
+
+from coordinator_executor import STREAMING_STATE_KEY
+
+
+logger = logging.getLogger(__name__)
+
+# States in which a task no longer runs.
+TERMINAL_STATES = {
+    TaskState.completed,
+    TaskState.failed,
+    TaskState.canceled,
+    TaskState.rejected,
+}
+
+
+class DrainingRequestHandler(DefaultRequestHandler):
+    """DefaultRequestHandler with graceful shutdown.
+
+    The draining part of the agents' PushNotificationRequestHandler (see
+    midokoro_agent/push_request_handler.py). The coordinator does not send
+    push notifications, so message/send is handled by the default
+    implementation.
+
+    `start_draining()` makes the handler reject new messages,
+    `wait_for_running_tasks()` waits for the running executions and
+    `fail_running_tasks()` stops the rest and marks their tasks as failed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.draining = False
+
+    @property
+    def running_task_count(self) -> int:
+        return len(self._running_agents)
+
+    def start_draining(self) -> None:
+        """Reject new messages from now on; running tasks are not affected."""
+        self.draining = True
+
+    async def wait_for_running_tasks(self, timeout: float) -> bool:
+        """Wait until running executions finish.
+
+        Returns False if some are still running after `timeout` seconds.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self._running_agents:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            await asyncio.wait(list(self._running_agents.values()), timeout=remaining)
+        return True
+
+    async def fail_running_tasks(self, reason: str) -> None:
+        """Cancel the running executions and mark their tasks as failed."""
+        running = dict(self._running_agents)
+        for task in running.values():
+            task.cancel()
+        await asyncio.gather(*running.values(), return_exceptions=True)
+
+        for task_id in running:
+            task = await self.task_store.get(task_id)
+            if task is None or task.status.state in TERMINAL_STATES:
+                continue
+            logger.warning("Task %s failed: %s", task_id, reason)
+            task.status = TaskStatus(
+                state=TaskState.failed,
+                message=new_agent_text_message(reason, task.contextId, task.id),
+                timestamp=datetime.now(timezone.utc).isoformat(),
+            )
+            await self.task_store.save(task)
+
+    async def _cleanup_producer(
+        self,
+        producer_task: asyncio.Task,
+        task_id: str,
+    ) -> None:
+        # The default implementation stops at a failed execution, leaving the
+        # task counted as running and blocking the shutdown until the grace
+        # period runs out.
+        try:
+            await producer_task
+        finally:
+            await self._queue_manager.close(task_id)
+            async with self._running_agents_lock:
+                self._running_agents.pop(task_id, None)
+
+    def _check_accepting(self) -> None:
+        if self.draining:
+            raise ServerError(
+                error=InternalError(message="Server is shutting down")
+            )
+
+    async def on_message_send_stream(
+        self,
+        params: MessageSendParams,
+        context: ServerCallContext | None = None,
+    ) -> AsyncGenerator[Event]:
+        self._check_accepting()
+        # Let the executor stream partial output only to message/stream clients.
+        context = context or ServerCallContext()
+        context.state[STREAMING_STATE_KEY] = True
+        async for event in super().on_message_send_stream(params, context):
+            yield event
+
+    async def on_message_send(
+        self,
+        params: MessageSendParams,
+        context: ServerCallContext | None = None,
+    ) -> Message | Task:
+        self._check_accepting()
+        return await super().on_message_send(params, context)
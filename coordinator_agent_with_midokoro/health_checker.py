@@ -0,0 +1,111 @@
+"""リモートエージェントのヘルスチェック
+
+各エージェントサーバーの /readyz を一定間隔で確認し、
+連続して failure_threshold 回失敗したエージェントを利用不可 (unhealthy) に、
+1回でも成功すれば利用可能に戻す。状態が変わったときに on_change を呼び出す。
+/readyz を持たないエージェントはエージェントカードを取得できれば利用可能とみなす。
+
+確認はエージェントへの問い合わせとは別のHTTPクライアントで行うため、
+問い合わせで接続プールが埋まっていてもヘルスチェックが待たされることはない。
+"""
+
+import asyncio
+import time
+from typing import Callable
+
+import httpx
+
+from remote_agent_connection import RemoteAgentConnections
+
+
+READY_PATH = "/readyz"
+AGENT_CARD_PATH = "/.well-known/agent.json"
+
+
+class AgentHealthChecker:
+    """エージェントごとの状態を保持し、バックグラウンドで定期的に確認する"""
+
+    def __init__(
+        self,
+        on_change: Callable[[str, bool], None],
+        interval: float = 10.0,
+        timeout: float = 3.0,
+        failure_threshold: int = 2,
+    ):
+        self.on_change = on_change
+        self.interval = interval
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        # エージェント名 -> 状態 (healthy, 連続失敗回数, 直前のエラー, 確認した時刻)
+        self.status: dict[str, dict] = {}
+        self._client: httpx.AsyncClient | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self, connections: dict[str, RemoteAgentConnections]):
+        """接続の辞書を参照し続け、追加・削除されたエージェントも確認の対象にする"""
+        self._client = httpx.AsyncClient(timeout=self.timeout)
+        self._task = asyncio.create_task(self._run(connections))
+
+    def is_healthy(self, agent_name: str) -> bool:
+        return self.status.get(agent_name, {}).get("healthy", True)
+
+    async def _run(self, connections: dict[str, RemoteAgentConnections]):
+        while True:
+            for name in list(self.status):
+                if name not in connections:
+                    del self.status[name]
+            await asyncio.gather(
+                *(
+                    self.check(name, connection.agent_url)
+                    for name, connection in list(connections.items())
+                )
+            )
+            await asyncio.sleep(self.interval)
+
+    async def check(self, agent_name: str, agent_url: str) -> bool:
+        """エージェントを1回確認して状態を更新し、利用可能かどうかを返す"""
+        error = await self._probe(agent_url)
+        status = self.status.setdefault(
+            agent_name, {"healthy": True, "failures": 0, "last_error": None}
+        )
+        status["checked_at"] = time.time()
+        was_healthy = status["healthy"]
+        if error is None:
+            status.update(healthy=True, failures=0, last_error=None)
+        else:
+            status["failures"] += 1
+            status["last_error"] = error
+            if status["failures"] >= self.failure_threshold:
+                status["healthy"] = False
+        if status["healthy"] != was_healthy:
+            self.on_change(agent_name, status["healthy"])
+        return status["healthy"]
+
+    async def _probe(self, agent_url: str) -> str | None:
+        """利用できなければエラーの内容を返す"""
+        base_url = agent_url.rstrip("/")
+        try:
+            response = await self._client.get(base_url + READY_PATH)
+            if response.status_code == 404:
+                response = await self._client.get(base_url + AGENT_CARD_PATH)
+            if response.status_code == 200:
+                return None
+            try:
+                detail = response.json().get("status")
+            except (ValueError, AttributeError):
+                detail = None
+            return f"HTTP {response.status_code}" + (f" ({detail})" if detail else "")
+        except httpx.HTTPError as e:
+            return f"{type(e).__name__}: {e}"
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,132 @@
+"""サーバーの停止処理とヘルスチェックのエンドポイント
+
+エージェントの lifecycle.py (midokoro_agent/lifecycle.py) と同じ順で停止する。
+
+1. 新しいメッセージの受け付けを止める (readyz が 503 を返し、message/send はエラーを返す)
+2. 実行中のタスクが終わるのを猶予期間 (grace_period 秒) まで待つ
+3. 猶予期間内に終わらなかったタスクは中断し、失敗にする
+
+オーケストレーター向けに次のエンドポイントを提供する。
+
+* /healthz: プロセスが応答できれば 200 (liveness)
+* /readyz: 新しいタスクを受け付けられれば 200 (readiness)。次の場合は 503 を返す
+  - 停止処理中 (draining)
+  - 問い合わせ可能なエージェントがない (no_agents)
+"""
+
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Callable
+
+import uvicorn
+from sse_starlette.sse import AppStatus
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from draining_request_handler import DrainingRequestHandler
+
+
+logger = logging.getLogger(__name__)
+
+SHUTDOWN_REASON = "サーバーの停止により処理を中断しました。再度リクエストしてください。"
+
+
+class ServerLifecycle:
+    """コーディネーターのA2Aサーバーの停止処理とヘルスチェック"""
+
+    def __init__(
+        self,
+        request_handler: DrainingRequestHandler,
+        grace_period: float,
+        available_agents: Callable[[], list[str]],
+    ):
+        self.request_handler = request_handler
+        self.grace_period = grace_period
+        self.available_agents = available_agents
+        self._deadline: float | None = None
+
+    def start_draining(self):
+        """新しいメッセージの受け付けを止め、猶予期間の計測を始める"""
+        if self._deadline is not None:
+            return
+        logger.info(
+            "Draining: %d running task(s), grace period %.0fs",
+            self.request_handler.running_task_count,
+            self.grace_period,
+        )
+        self.request_handler.start_draining()
+        self._deadline = time.monotonic() + self.grace_period
+
+    async def shutdown(self):
+        """猶予期間の残りまで実行中のタスクを待ち、終わらなかったタスクを失敗にする"""
+        self.start_draining()
+        remaining = self._deadline - time.monotonic()
+        if await self.request_handler.wait_for_running_tasks(max(remaining, 0)):
+            return
+        logger.warning(
+            "Grace period exceeded, failing %d running task(s)",
+            self.request_handler.running_task_count,
+        )
+        await self.request_handler.fail_running_tasks(SHUTDOWN_REASON)
+
+    @asynccontextmanager
+    async def lifespan(self, app: Starlette):
+        yield
+        await self.shutdown()
+
+    def routes(self) -> list[Route]:
+        return [
+            Route("/healthz", self._healthz, methods=["GET"]),
+            Route("/readyz", self._readyz, methods=["GET"]),
+        ]
+
+    async def _healthz(self, request: Request) -> JSONResponse:
+        return JSONResponse({"status": "ok"})
+
+    async def _readyz(self, request: Request) -> JSONResponse:
+        agents = self.available_agents()
+        if self.request_handler.draining:
+            status = "draining"
+        elif not agents:
+            status = "no_agents"
+        else:
+            status = "ready"
+        body = {
+            "status": status,
+            "running_tasks": self.request_handler.running_task_count,
+            "agents": agents,
+        }
+        return JSONResponse(body, status_code=200 if status == "ready" else 503)
+
+    async def serve(self, app: Starlette, host: str, port: int):
+        """シグナルを受けたら停止処理を始める uvicorn サーバーでアプリを実行する
+
+        登録簿の監視などと同じイベントループで動かすため、呼び出し元のループで実行する。
+        uvicorn は接続中のリクエストの完了を待ってから lifespan の停止処理を呼ぶため、
+        両方の待ち時間を合わせて猶予期間に収める。
+        """
+        config = uvicorn.Config(
+            app,
+            host=host,
+            port=port,
+            timeout_graceful_shutdown=self.grace_period,
+        )
+        # 新しい sse-starlette はサーバーの should_exit も監視してストリーミング中の応答を打ち切るため無効にする
+        AppStatus.enable_automatic_graceful_drain = False
+        await _DrainingServer(config, self).serve()
+
+
+class _DrainingServer(uvicorn.Server):
+    def __init__(self, config: uvicorn.Config, lifecycle: ServerLifecycle):
+        super().__init__(config)
+        self.lifecycle = lifecycle
+
+    def handle_exit(self, sig, frame):
+        self.lifecycle.start_draining()
+        # sse-starlette は Server.handle_exit を差し替え、シグナルを受けるとストリーミング中の応答
+        # (message/stream) をすぐに打ち切るため、差し替え前の処理を呼ぶ。
+        # 猶予期間を過ぎても終わらない応答は uvicorn が打ち切る
+        (AppStatus.original_handler or uvicorn.Server.handle_exit)(self, sig, frame)
@@ -0,0 +1,116 @@
+"""A2Aプッシュ通知の受信サーバー
+
+時間のかかるタスクを blocking=false で送信し、HTTP接続を保持したまま完了を待つ代わりに、
+エージェントサーバーからのプッシュ通知（完了したタスクのPOST）で結果を受け取る。
+待機中のタスクは Future として保持するだけなので、多数のタスクを同時に待つことができる。
+"""
+
+import asyncio
+import contextlib
+import secrets
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+from a2a.types import Task
+
+
+NOTIFICATION_PATH = "/a2a/notifications"
+NOTIFICATION_TOKEN_HEADER = "X-A2A-Notification-Token"
+
+
+class _EmbeddedServer(uvicorn.Server):
+    """呼び出し元のイベントループ上で動かすため、シグナルハンドラを登録しないuvicornサーバー"""
+
+    @contextlib.contextmanager
+    def capture_signals(self):
+        yield
+
+
+class PushNotificationReceiver:
+    """タスクごとのトークンで通知を検証し、待機中の Future に完了したタスクを渡す"""
+
+    def __init__(self, host: str, port: int, public_url: str = ""):
+        self.host = host
+        self.port = port
+        # エージェントサーバーから見た通知先URL（コンテナ・別ホスト構成では PUBLIC_URL を指定する）
+        self.url = (public_url or f"http://{host}:{port}").rstrip("/") + NOTIFICATION_PATH
+        self._waiters: dict[str, tuple[str, asyncio.Future]] = {}
+        self._server: _EmbeddedServer | None = None
+        self._serve_task: asyncio.Task | None = None
+        self.stats = {"received": 0, "rejected": 0, "unknown": 0}
+
+    async def start(self, timeout: float = 10):
+        app = Starlette(
+            routes=[Route(NOTIFICATION_PATH, self._handle, methods=["POST"])]
+        )
+        self._server = _EmbeddedServer(
+            uvicorn.Config(
+                app, host=self.host, port=self.port, log_level="warning", lifespan="off"
+            )
+        )
+        self._serve_task = asyncio.create_task(self._server.serve())
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not self._server.started:
+            if self._serve_task.done():
+                # ポートの使用中などで起動できなかった場合
+                self._serve_task.result()
+                raise RuntimeError(f"Push notification receiver failed to start on {self.url}")
+            if asyncio.get_running_loop().time() > deadline:
+                raise TimeoutError(f"Push notification receiver did not start: {self.url}")
+            await asyncio.sleep(0.05)
+        print(f"Push notification receiver listening on {self.url}")
+
+    async def aclose(self):
+        if self._server is not None:
+            self._server.should_exit = True
+            with contextlib.suppress(Exception):
+                await self._serve_task
+            self._server = None
+            self._serve_task = None
+        for _, future in self._waiters.values():
+            future.cancel()
+        self._waiters.clear()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._waiters)
+
+    def register(self, task_id: str) -> str:
+        """タスクの完了通知を待ち受ける。通知の検証用トークンを返す"""
+        token = secrets.token_urlsafe(16)
+        self._waiters[task_id] = (token, asyncio.get_running_loop().create_future())
+        return token
+
+    async def wait(self, task_id: str, timeout: float) -> Task:
+        """register 済みのタスクの通知を待ち、通知されたタスクを返す"""
+        _, future = self._waiters[task_id]
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+
+    def discard(self, task_id: str):
+        waiter = self._waiters.pop(task_id, None)
+        if waiter is not None and not waiter[1].done():
+            waiter[1].cancel()
+
+    async def _handle(self, request: Request) -> Response:
+        try:
+            task = Task.model_validate(await request.json())
+        except Exception:
+            return Response(status_code=400)
+        waiter = self._waiters.get(task.id)
+        if waiter is None:
+            self.stats["unknown"] += 1
+            return Response(status_code=404)
+        token, future = waiter
+        if not secrets.compare_digest(
+            request.headers.get(NOTIFICATION_TOKEN_HEADER, ""), token
+        ):
+            self.stats["rejected"] += 1
+            return Response(status_code=401)
+        self.stats["received"] += 1
+        if not future.done():
+            future.set_result(task)
+        return Response(status_code=204)
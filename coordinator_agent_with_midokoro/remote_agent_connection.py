@@ -14,14 +14,23 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
-from typing import Callable
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable
+from uuid import uuid4
 
 import httpx
 
 from a2a.client import A2AClient
 from a2a.types import (
+    GetTaskRequest,
+    GetTaskResponse,
     SendMessageResponse,
     SendMessageRequest,
+    SendStreamingMessageRequest,
+    SendStreamingMessageResponse,
+    TaskQueryParams,
     AgentCard,
     Task,
     TaskStatusUpdateEvent,
@@ -29,32 +38,235 @@ from a2a.types import (
 )
 from dotenv import load_dotenv
 
+from config import get_remote_agent_http_setting
+
 load_dotenv()
 
 TaskCallbackArg = Task | TaskStatusUpdateEvent | TaskArtifactUpdateEvent
 TaskUpdateCallback = Callable[[TaskCallbackArg, AgentCard], Task]
 
+
+@dataclass
+class PendingTask:
+    """submit_task でバックグラウンドに投入した問い合わせ"""
+
+    task_id: str
+    agent_name: str
+    session_id: str | None
+    task: str
+    future: asyncio.Future
+    submitted_at: float = field(default_factory=time.monotonic)
+    finished_at: float | None = None
+    # get_task_result / wait_any で結果を返したかどうか
+    reported: bool = False
+
+    def __post_init__(self):
+        self.future.add_done_callback(self._on_done)
+
+    def _on_done(self, _future: asyncio.Future):
+        self.finished_at = time.monotonic()
+
+    def status(self) -> dict[str, Any]:
+        if not self.future.done():
+            return {
+                "task_id": self.task_id,
+                "agent_name": self.agent_name,
+                "status": "running",
+                "elapsed_seconds": round(time.monotonic() - self.submitted_at, 1),
+            }
+        if self.future.cancelled():
+            return {"task_id": self.task_id, "agent_name": self.agent_name, "status": "cancelled"}
+        result = self.future.result()
+        return {
+            "task_id": self.task_id,
+            "agent_name": self.agent_name,
+            # send_message_with_retry はすべてのリトライに失敗すると空の結果を返す
+            "status": "completed" if result else "failed",
+            "result": result,
+        }
+
+
+@dataclass
+class HttpTransportSettings:
+    """リモートエージェントとのHTTP接続設定"""
+
+    http2: bool = False
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 5.0
+    connect_timeout: float = 10.0
+    read_timeout: float = 60.0
+
+    @classmethod
+    def for_agent(cls, agent_name: str) -> "HttpTransportSettings":
+        """config.py の設定（エージェント個別の上書きを含む）から生成する"""
+        def setting(key: str) -> str:
+            return get_remote_agent_http_setting(agent_name, key)
+
+        return cls(
+            http2=setting("HTTP2") == "TRUE",
+            max_connections=int(setting("MAX_CONNECTIONS")),
+            max_keepalive_connections=int(setting("MAX_KEEPALIVE_CONNECTIONS")),
+            keepalive_expiry=float(setting("KEEPALIVE_EXPIRY")),
+            connect_timeout=float(setting("CONNECT_TIMEOUT")),
+            read_timeout=float(setting("READ_TIMEOUT")),
+        )
+
+    def create_client(self) -> tuple[httpx.AsyncClient, "InstrumentedTransport"]:
+        http2 = self.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                print("Warning: HTTP/2 requires the 'h2' package (httpx[http2]). Falling back to HTTP/1.1.")
+                http2 = False
+
+        transport = InstrumentedTransport(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+        )
+        client = httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(
+                self.read_timeout,
+                connect=self.connect_timeout,
+                # 接続プールの空き待ちは接続タイムアウトと同じ扱いにする
+                pool=self.connect_timeout,
+            ),
+        )
+        return client, transport
+
+
+class _TrackedByteStream(httpx.AsyncByteStream):
+    """レスポンスボディを読み終えた時点を通知するストリーム"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close: Callable[[], None]):
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._on_close()
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """接続プールの使用状況を記録する AsyncHTTPTransport のラッパー"""
+
+    def __init__(self, **kwargs):
+        self._transport = httpx.AsyncHTTPTransport(**kwargs)
+        self.requests_total = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests_total += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self.in_flight -= 1
+            raise
+        # ボディを読み終えるまでをリクエスト中として数える
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_TrackedByteStream(response.stream, self._on_response_closed),
+            extensions=response.extensions,
+        )
+
+    def _on_response_closed(self):
+        self.in_flight -= 1
+
+    def stats(self) -> dict:
+        """リクエスト数の記録と、取得できれば接続プールの接続数を返す"""
+        stats = {
+            "requests_total": self.requests_total,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+        }
+        # httpx は内部の httpcore の接続プールを公開していないため、取得できない版では
+        # リクエスト数の記録だけを返す
+        pool = getattr(self._transport, "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is not None:
+            stats.update(
+                connections=len(connections),
+                idle_connections=sum(1 for c in connections if c.is_idle()),
+                http2_connections=sum(1 for c in connections if "HTTP/2" in c.info()),
+            )
+        return stats
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
 class RemoteAgentConnections:
     """A class to hold the connections to the remote agents."""
 
-    def __init__(self, agent_card: AgentCard, agent_url: str):
+    def __init__(
+        self,
+        agent_card: AgentCard,
+        agent_url: str,
+        http_settings: HttpTransportSettings | None = None,
+    ):
         print(f"agent_card: {agent_card}")
         print(f"agent_url: {agent_url}")
-        self._httpx_client = httpx.AsyncClient(timeout=60)
+        self.http_settings = http_settings or HttpTransportSettings.for_agent(agent_card.name)
+        self._httpx_client, self._transport = self.http_settings.create_client()
         self.agent_client = A2AClient(self._httpx_client, agent_card, url=agent_url)
+        self.agent_url = agent_url
         self.card = agent_card
         self.conversation_name = None
         self.conversation = None
-        self.pending_tasks = set()
+        # submit_task で投入したタスク（タスクID -> PendingTask）
+        self.pending_tasks: dict[str, PendingTask] = {}
 
     def get_agent(self) -> AgentCard:
         return self.card
 
     async def send_message(self, message_request: SendMessageRequest) -> SendMessageResponse:
         return  await self.agent_client.send_message(message_request)
+
+    async def send_message_streaming(
+        self, message_request: SendStreamingMessageRequest
+    ) -> AsyncIterator[SendStreamingMessageResponse]:
+        """message/stream で送信し、タスクのイベントを受け取った順に返す"""
+        async for response in self.agent_client.send_message_streaming(message_request):
+            yield response
+
+    async def get_task(self, task_id: str) -> GetTaskResponse:
+        """リモートエージェントのタスクストアから既存のタスク（結果を含む）を取得する"""
+        return await self.agent_client.get_task(
+            GetTaskRequest(id=str(uuid4()), params=TaskQueryParams(id=task_id))
+        )
+
+    def purge_pending_tasks(self, result_ttl: float):
+        """完了後 result_ttl 秒を過ぎたタスクを削除する"""
+        now = time.monotonic()
+        for task_id, pending in list(self.pending_tasks.items()):
+            if pending.finished_at is not None and now - pending.finished_at > result_ttl:
+                del self.pending_tasks[task_id]
+
+    def pool_stats(self) -> dict:
+        """接続プールの使用状況（プールサイズの調整用）"""
+        return self._transport.stats()
     
     async def aclose(self):
         """HTTPXクライアントを安全にクローズする"""
+        for pending in self.pending_tasks.values():
+            pending.future.cancel()
+        self.pending_tasks.clear()
         try:
             if hasattr(self, '_httpx_client') and self._httpx_client:
                 await self._httpx_client.aclose()
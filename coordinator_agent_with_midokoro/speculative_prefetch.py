@@ -0,0 +1,149 @@
+"""サブエージェント呼び出しの投機的な先読み
+
+ユーザーの発話が届いた時点で、呼び出される可能性の高いエージェントへの問い合わせを
+バックグラウンドで開始しておき、コーディネーターのLLMが同じエージェントに似たタスクを
+送ろうとしたときに、実行中（または完了済み）の結果をそのまま渡す。
+使われなかった先読みは呼び出しの終了時にキャンセルする。
+エラーなどで終了時の処理が呼ばれなかった先読みも、保持期間 (ttl 秒) を過ぎたら破棄する。
+"""
+
+import asyncio
+import time
+import unicodedata
+from collections import deque
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from typing import Any, Awaitable
+
+
+class DetachedToolContext:
+    """先読み用のツールコンテキスト
+
+    呼び出し元の state の複製だけを持ち、実際のセッションの state には書き込まない。
+    """
+
+    def __init__(self, state: dict[str, Any]):
+        self.state = dict(state)
+
+
+@dataclass
+class SpeculativeCall:
+    agent_name: str
+    task: str
+    future: asyncio.Task
+    started_at: float = field(default_factory=time.monotonic)
+
+
+class SpeculativePrefetcher:
+    """呼び出し (invocation) ごとの先読みを管理する
+
+    コストの上限として、同時に実行中の先読み数と、直近1分間に開始した先読み数を制限する。
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: float,
+        max_in_flight: int,
+        max_per_minute: int,
+        ttl: float,
+    ):
+        self.similarity_threshold = similarity_threshold
+        self.max_in_flight = max_in_flight
+        self.max_per_minute = max_per_minute
+        self.ttl = ttl
+        self._calls: dict[str, list[SpeculativeCall]] = {}
+        self._started_at: deque[float] = deque()
+        self.stats = {"started": 0, "hits": 0, "cancelled": 0, "over_budget": 0, "expired": 0}
+
+    def _in_flight(self) -> int:
+        return sum(
+            1
+            for calls in self._calls.values()
+            for call in calls
+            if not call.future.done()
+        )
+
+    def _expire(self, now: float):
+        """保持期間を過ぎた先読みを破棄する
+
+        after_agent_callback はエージェントがエラーで終了した場合や、ストリーミングが途中で
+        閉じられた場合に呼ばれないため、ここで取り残された先読みを片付ける。
+        """
+        for invocation_id, calls in list(self._calls.items()):
+            expired = [call for call in calls if now - call.started_at > self.ttl]
+            for call in expired:
+                calls.remove(call)
+                self._discard(call)
+                self.stats["expired"] += 1
+            if not calls:
+                del self._calls[invocation_id]
+
+    def _within_budget(self) -> bool:
+        now = time.monotonic()
+        self._expire(now)
+        while self._started_at and now - self._started_at[0] > 60:
+            self._started_at.popleft()
+        return (
+            self._in_flight() < self.max_in_flight
+            and len(self._started_at) < self.max_per_minute
+        )
+
+    def start(
+        self, invocation_id: str, agent_name: str, task: str, coro: Awaitable[Any]
+    ) -> bool:
+        """先読みを開始する。予算を超える場合は開始せずに False を返す"""
+        if not self._within_budget():
+            self.stats["over_budget"] += 1
+            coro.close()
+            return False
+        self._started_at.append(time.monotonic())
+        self.stats["started"] += 1
+        future = asyncio.ensure_future(coro)
+        self._calls.setdefault(invocation_id, []).append(
+            SpeculativeCall(agent_name, task, future)
+        )
+        return True
+
+    def take(
+        self, invocation_id: str | None, agent_name: str, task: str
+    ) -> asyncio.Task | None:
+        """同じエージェントへの十分に似たタスクの先読みがあれば取り出す"""
+        for call in self._calls.get(invocation_id, []):
+            if call.agent_name == agent_name and self._similar(call.task, task):
+                self._calls[invocation_id].remove(call)
+                self.stats["hits"] += 1
+                return call.future
+        return None
+
+    def cancel(self, invocation_id: str):
+        """使われなかった先読みをキャンセルする"""
+        for call in self._calls.pop(invocation_id, []):
+            self._discard(call)
+
+    def _discard(self, call: SpeculativeCall):
+        if not call.future.done():
+            call.future.cancel()
+            self.stats["cancelled"] += 1
+        elif not call.future.cancelled():
+            # 失敗した先読みの例外が未取得のまま警告されないようにする
+            call.future.exception()
+
+    def _similar(self, speculative_task: str, task: str) -> bool:
+        """表記の揺れを除いて、先読みしたタスクが含まれるか十分に似ていれば True"""
+        speculative_task = _normalize(speculative_task)
+        task = _normalize(task)
+        if speculative_task and speculative_task in task:
+            return True
+        return (
+            SequenceMatcher(None, speculative_task, task).ratio()
+            >= self.similarity_threshold
+        )
+
+
+def _normalize(text: str) -> str:
+    """全角・半角を揃え、空白と句読点・記号を取り除く"""
+    return "".join(
+        char
+        for char in unicodedata.normalize("NFKC", text).lower()
+        if not char.isspace() and unicodedata.category(char)[0] not in ("P", "S")
+    )
@@ -0,0 +1,62 @@
+"""A2Aタスクストアの切り替え
+
+SESSION_SERVICE に合わせて、A2Aサーバーのタスク (tasks/get や input_required への返信で参照する) の保存先を選択する。
+
+* memory (デフォルト): a2a の InMemoryTaskStore
+* database: SESSION_DB_URL のデータベースに保存する DatabaseTaskStore
+
+複数のコーディネーターで同じデータベースを使うと、どのコーディネーターに届いたリクエストでもタスクを参照できる。
+"""
+
+from a2a.server.tasks import InMemoryTaskStore, TaskStore
+from a2a.types import Task
+from sqlalchemy import String, Text, create_engine
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, sessionmaker
+
+from config import SESSION_SERVICE, SESSION_DB_URL
+
+
+class _Base(DeclarativeBase):
+    pass
+
+
+class StorageTask(_Base):
+    """タスク全体を JSON で保存する行"""
+
+    __tablename__ = "a2a_tasks"
+
+    id: Mapped[str] = mapped_column(String(128), primary_key=True)
+    data: Mapped[str] = mapped_column(Text)
+
+
+class DatabaseTaskStore(TaskStore):
+    """SQLAlchemy のデータベースにタスクを保存する TaskStore"""
+
+    def __init__(self, db_url: str):
+        self.engine = create_engine(db_url)
+        _Base.metadata.create_all(self.engine)
+        self.database_session_factory = sessionmaker(bind=self.engine)
+
+    async def save(self, task: Task) -> None:
+        with self.database_session_factory() as session:
+            session.merge(StorageTask(id=task.id, data=task.model_dump_json()))
+            session.commit()
+
+    async def get(self, task_id: str) -> Task | None:
+        with self.database_session_factory() as session:
+            stored = session.get(StorageTask, task_id)
+            return Task.model_validate_json(stored.data) if stored else None
+
+    async def delete(self, task_id: str) -> None:
+        with self.database_session_factory() as session:
+            stored = session.get(StorageTask, task_id)
+            if stored is not None:
+                session.delete(stored)
+                session.commit()
+
+
+def create_task_store() -> TaskStore:
+    """SESSION_SERVICE に応じて A2Aサーバーのタスクストアを返す"""
+    if SESSION_SERVICE == "database":
+        return DatabaseTaskStore(SESSION_DB_URL)
+    return InMemoryTaskStore()
@@ -0,0 +1,52 @@
+"""コーディネーターが作るメッセージを、エージェント側の1回限りのリクエストの判定に通す"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+from a2a.types import MessageSendParams
+
+from coordinator_agent import REMOTE_TASKS_STATE_KEY, create_task_request_payload
+
+# エージェント側の判定 (adk_agent_executor) は見どころエージェントのものを使う
+sys.path.append(str(Path(__file__).resolve().parents[2] / "midokoro_agent"))
+from adk_agent_executor import OneShotRequestContextBuilder, is_one_shot  # noqa: E402
+
+
+AGENT_NAME = "midokoro_agent"
+PARTS = [{"type": "text", "text": "首里城について教えて"}]
+
+
+def _is_one_shot(payload: dict) -> bool:
+    params = MessageSendParams.model_validate(payload)
+    context = asyncio.run(OneShotRequestContextBuilder().build(params=params))
+    return is_one_shot(context)
+
+
+def test_first_contact_continues_context():
+    payload = create_task_request_payload({}, AGENT_NAME, PARTS)
+    assert payload["message"]["contextId"]
+    assert not _is_one_shot(payload)
+
+
+def test_recorded_context_is_reused():
+    state = {
+        REMOTE_TASKS_STATE_KEY: {
+            AGENT_NAME: {"task_id": "t1", "context_id": "c1", "state": "completed"}
+        }
+    }
+    payload = create_task_request_payload(state, AGENT_NAME, PARTS)
+    assert payload["message"]["contextId"] == "c1"
+    assert payload["message"]["taskId"] != "t1"
+    assert not _is_one_shot(payload)
+
+
+def test_new_context_request_is_one_shot():
+    state = {
+        REMOTE_TASKS_STATE_KEY: {
+            AGENT_NAME: {"task_id": "t1", "context_id": "c1", "state": "completed"}
+        }
+    }
+    payload = create_task_request_payload(state, AGENT_NAME, PARTS, new_context=True)
+    assert "contextId" not in payload["message"]
+    assert _is_one_shot(payload)
@@ -1,28 +1,35 @@
 from pprint import pformat
 from pydantic import BaseModel
-from typing import AsyncIterator
+from typing import AsyncIterator, Callable, Coroutine, Iterator, TypeVar
 from ulid import ULID
 import asyncio
+import queue
 import streamlit as st
+import threading
 import traceback
 
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.adk.events import Event
 from google.adk.sessions import InMemorySessionService
 from google.adk.memory import InMemoryMemoryService
 from google.adk.runners import Runner
 from google.genai import types
 
-from coordinator_agent import CoordinatorAgent
-from config import UCHINA_GUCHI_AGENT_URL, MIDOKORO_AGENT_URL
+from coordinator_agent import CoordinatorAgent, partial_result_listener
+from config import CHAT_HISTORY_WINDOW
 
 
 class ChatMessage(BaseModel):
     role: str
     content: str
+    # トークン単位の部分応答かどうか
+    partial: bool = False
 
 APP_NAME = "技育CAMPアカデミア - DEMO②"
 USER_ID = "default_user"
 
+T = TypeVar("T")
+
 
 @st.cache_resource
 def create_session_service():
@@ -47,40 +54,122 @@ def get_memory_service():
     print("Memory service created.")
     return InMemoryMemoryService()
 
-MEMORY_SERVICE = InMemoryMemoryService()
 
+class AgentBackend:
+    """Streamlitサーバーの生存期間中動き続けるバックグラウンドのイベントループ
 
-async def get_agent_runner():
-    """各リクエストごとに新しいコーディネーターエージェントのインスタンスを作成してイベントループの問題を回避"""
-    # イベントループの問題を避けるため、各リクエストごとに新しいコーディネーターエージェントのインスタンスを作成
-    coordinator_agent_instance = await CoordinatorAgent.create(
-        remote_agent_addresses=[
-            UCHINA_GUCHI_AGENT_URL,
-            MIDOKORO_AGENT_URL,
-        ]
-    )
-    agent = coordinator_agent_instance.create_agent()
+    コーディネーター・Runner・HTTP接続プールはこのループ上で一度だけ作成され、
+    Streamlitの再実行をまたいで再利用される。
+    UIスレッドからは run / stream でコルーチンを投入し、結果を受け取る。
+    """
+
+    _DONE = object()
+
+    def __init__(
+        self,
+        session_service: InMemorySessionService,
+        memory_service: InMemoryMemoryService,
+    ):
+        self.session_service = session_service
+        self.memory_service = memory_service
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._run_loop, name="agent-event-loop", daemon=True
+        )
+        self._thread.start()
+        self._coordinator: CoordinatorAgent | None = None
+        self._runner: Runner | None = None
+        self._runner_lock = asyncio.Lock()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coro: Coroutine[None, None, T]) -> T:
+        """コルーチンをバックグラウンドのループで実行し、結果を待つ"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def stream(
+        self, make_agen: Callable[[Callable[[T], None]], AsyncIterator[T]]
+    ) -> Iterator[T]:
+        """非同期イテレータをバックグラウンドのループで実行し、キュー経由で逐次受け取る
+
+        make_agen にはイテレータとは別に要素をキューへ割り込ませる関数が渡される。
+        ツールの実行中に届いた途中経過を、次のイベントを待たずに表示するために使う。
+        """
+        items: queue.Queue = queue.Queue()
+
+        async def pump():
+            try:
+                async for item in make_agen(items.put):
+                    items.put(item)
+            finally:
+                items.put(self._DONE)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self.loop)
+        try:
+            while (item := items.get()) is not self._DONE:
+                yield item
+            future.result()
+        finally:
+            # Streamlitの再実行などで途中で打ち切られた場合はバックグラウンド側も止める
+            future.cancel()
+
+    async def get_runner(self) -> Runner:
+        """コーディネーターとRunnerを初回のみ作成して返す
+
+        接続するエージェントは登録簿（agent_registry.json）から読み込まれ、登録簿の変更や
+        接続できなかったエージェントの再接続はコーディネーターが実行中に反映する。
+        """
+        async with self._runner_lock:
+            if self._runner is None:
+                self._coordinator = await CoordinatorAgent.create()
+                self._runner = Runner(
+                    agent=self._coordinator.create_agent(),
+                    app_name=APP_NAME,
+                    session_service=self.session_service,
+                    memory_service=self.memory_service,
+                )
+            return self._runner
+
+
+@st.cache_resource
+def get_agent_backend() -> AgentBackend:
+    print("Agent backend created.")
+    return AgentBackend(_session_service, get_memory_service())
 
-    return Runner(
-        agent=agent,
-        app_name=APP_NAME,
-        session_service=_session_service,
-        memory_service=MEMORY_SERVICE
-    )
 
 async def __get_response_from_agent(
-    message: str
+    backend: AgentBackend,
+    message: str,
+    session_id: str,
+    emit: Callable[[ChatMessage], None],
 ) -> AsyncIterator[ChatMessage]:
+    # 並列問い合わせの各タスクの回答を、届いた順にその場で表示する
+    listener_token = partial_result_listener.set(
+        lambda task_id, text: emit(
+            ChatMessage(role="assistant", content=f"📨 **{task_id}**\n\n{text}")
+        )
+    )
     try:
-        # Create a new runner for each request to avoid event loop issues
-        runner = await get_agent_runner()
+        runner = await backend.get_runner()
         events_iterator: AsyncIterator[Event] = runner.run_async(
             user_id=USER_ID,
-            session_id=st.session_state.session_id,
+            session_id=session_id,
             new_message=types.Content(role="user", parts=[types.Part(text=message)]),
+            run_config=RunConfig(streaming_mode=StreamingMode.SSE),
         )
 
+        streamed = False
         async for event in events_iterator:
+            if event.partial:
+                # 部分応答はそのままUIにストリーミングする
+                if event.content and event.content.parts:
+                    for part in event.content.parts:
+                        if part.text:
+                            streamed = True
+                            yield ChatMessage(role="assistant", content=part.text, partial=True)
+                continue
             if event.content and event.content.parts:
                 for part in event.content.parts:
                     if part.function_call:
@@ -109,9 +198,14 @@ async def __get_response_from_agent(
                     # )
                 elif event.actions and event.actions.escalate:
                     final_response_text = f"Agent escalated: {event.error_message or 'No specific message.'}"
-                if final_response_text:
+                # ストリーミング済みの場合は、結合済みの応答を再度表示しない
+                if final_response_text and not streamed:
                     yield ChatMessage(role="assistant", content=final_response_text)
-                break
+                # breakせずにRunnerを最後まで回す。ループを使い回すため、途中で打ち切ると
+                # Runner内部のジェネレータが別のコンテキストで後始末されてしまう
+            # 部分応答の後の非部分イベントは、そのモデル応答を結合したもの。
+            # 次のモデル応答（ツール呼び出し後の回答など）は改めてストリーミングの有無を判定する
+            streamed = False
     except Exception as e:
         print(f"Error in get_response_from_agent (Type: {type(e)}): {e}")
         traceback.print_exc()
@@ -126,70 +220,122 @@ async def __get_response_from_agent(
                     await events_iterator.aclose()
         except Exception as e:
             print(f"Error closing events_iterator: {e}")
+        partial_result_listener.reset(listener_token)
 
 
 def __title():
     st.title(APP_NAME)
 
 
-async def __initialize():
+def __initialize():
     if "session_id" not in st.session_state:
         set_session_id()
-        await _session_service.create_session(
-            app_name=APP_NAME, user_id=USER_ID, session_id=st.session_state.session_id
+        get_agent_backend().run(
+            _session_service.create_session(
+                app_name=APP_NAME, user_id=USER_ID, session_id=st.session_state.session_id
+            )
         )
     if "messages" not in st.session_state:
         st.session_state.messages = []
+    if "older_shown" not in st.session_state:
+        st.session_state.older_shown = 0
+
+    __older_history()
+    # 直近 CHAT_HISTORY_WINDOW 件のみを描画し、アプリ全体の再実行時の描画コストを一定に保つ
+    for msg in st.session_state.messages[-CHAT_HISTORY_WINDOW:]:
+        __render_message(msg)
+    # ここまでに描画したメッセージは、次にアプリ全体を再実行するまで描画し直さない
+    st.session_state.rendered_count = len(st.session_state.messages)
 
-    for msg in st.session_state.messages:
-        with st.chat_message(msg["role"]):
-            st.markdown(msg["content"])
+
+def __render_message(msg: dict):
+    with st.chat_message(msg["role"]):
+        st.markdown(msg["content"])
+
+
+def __show_older():
+    st.session_state.older_shown += CHAT_HISTORY_WINDOW
+
+
+@st.fragment
+def __older_history():
+    """表示ウィンドウより前の履歴を「過去のメッセージを表示」で段階的に描画する
+
+    フラグメント内のボタン操作ではこの部分だけが再実行され、画面全体は再描画されない。
+    """
+    older = st.session_state.messages[:-CHAT_HISTORY_WINDOW]
+    remaining = len(older) - st.session_state.older_shown
+    if remaining > 0:
+        st.button(f"過去のメッセージを表示（残り{remaining}件）", on_click=__show_older)
+    for msg in older[max(remaining, 0):]:
+        __render_message(msg)
 
 
 def __prompt_input():
     return st.chat_input("Say something")
 
 
-async def __chat_field():
+def __render_responses(responses: Iterator[ChatMessage]):
+    """エージェントの応答を描画する。連続する部分応答は一つのプレースホルダーにストリーミングする"""
+    next_response: ChatMessage | None = None
+
+    def chunks(first: ChatMessage) -> Iterator[str]:
+        nonlocal next_response
+        yield first.content
+        for response in responses:
+            if not response.partial:
+                next_response = response
+                return
+            yield response.content
+
+    response = next(responses, None)
+    while response is not None:
+        if response.partial:
+            with st.chat_message(response.role):
+                content = st.write_stream(chunks(response))
+            st.session_state.messages.append({"role": response.role, "content": content})
+            response, next_response = next_response, None
+            if response is None:
+                response = next(responses, None)
+        else:
+            msg = {"role": response.role, "content": response.content}
+            __render_message(msg)
+            st.session_state.messages.append(msg)
+            response = next(responses, None)
+
+
+@st.fragment
+def __chat_field():
+    """入力欄と、アプリ全体を最後に描画した後のメッセージを描画する
+
+    入力欄をフラグメントに置くことで、送信時にはこのフラグメントだけが再実行され、
+    それより前の過去のメッセージは描画し直さない。
+    """
+    for msg in st.session_state.messages[st.session_state.rendered_count:]:
+        __render_message(msg)
+
     if prompt := __prompt_input():
         st.chat_message("user").markdown(prompt)
         st.session_state.messages.append({"role": "user", "content": prompt})
 
-        async def __stream_response():
-            async for response in __get_response_from_agent(prompt):
-                with st.chat_message(response.role):
-                    st.markdown(response.content)
-                st.session_state.messages.append({"role": response.role, "content": response.content})
-
-        await __stream_response()
+        backend = get_agent_backend()
+        # st.session_state はUIスレッドでしか参照できないため、ループに渡す前に取り出しておく
+        session_id = st.session_state.session_id
+        __render_responses(
+            backend.stream(
+                lambda emit: __get_response_from_agent(backend, prompt, session_id, emit)
+            )
+        )
+        # フラグメント内のメッセージが表示ウィンドウを超えたら、アプリ全体を再実行して描画し直す
+        if len(st.session_state.messages) - st.session_state.rendered_count > CHAT_HISTORY_WINDOW:
+            st.rerun()
 
 
-async def __main():
+def __main():
     __title()
-    await __initialize()
-    await __chat_field()
+    __initialize()
+    __chat_field()
 
 
 if __name__ == "__main__":
-    import nest_asyncio
-    nest_asyncio.apply()
-
-    async def run_app():
-        try:
-            await __main()
-        finally:
-            # クリーンアップ処理（必要に応じて）
-            pass
-
-    loop = asyncio.get_event_loop()
-    asyncio.set_event_loop(loop)
-
-    try:
-        loop.run_until_complete(run_app())
-    finally:
-        pending = asyncio.all_tasks(loop)
-        for task in pending:
-            task.cancel()
-        if pending:
-            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
-        loop.close()
+    __main()
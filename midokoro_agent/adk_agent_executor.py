@@ -1,48 +1,144 @@
 # https://github.com/google-a2a/a2a-samples/blob/main/samples/a2a-adk-app/weather_agent/adk_agent_executor.py
 
+import asyncio
+import contextlib
 import logging
+import sys
+import uuid
 
-from collections.abc import AsyncGenerator
+from collections import OrderedDict
+from collections.abc import AsyncGenerator, AsyncIterator
+from typing import Any
 from google.adk import Runner
+from google.adk.agents import LlmAgent
+from google.adk.agents.run_config import RunConfig, StreamingMode
 
 from google.adk.events import Event
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.sessions import InMemorySessionService, Session
 from google.genai import types
 
-from a2a.server.agent_execution import AgentExecutor
+from a2a.server.agent_execution import AgentExecutor, SimpleRequestContextBuilder
 from a2a.server.agent_execution.context import RequestContext
+from a2a.server.context import ServerCallContext
 from a2a.server.events.event_queue import EventQueue
 from a2a.server.tasks import TaskUpdater
 from a2a.types import (
     AgentCard,
+    AgentExtension,
+    Artifact,
+    DataPart,
     FilePart,
     FileWithBytes,
     FileWithUri,
+    InvalidParamsError,
+    MessageSendParams,
     Part,
+    Task,
+    TaskArtifactUpdateEvent,
     TaskState,
     TextPart,
     UnsupportedOperationError,
 )
 from a2a.utils.errors import ServerError
 
+from blob_store import BlobStore, BlobTooLargeError, decode_base64, encode_base64
+
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+# ServerCallContext.state key set by OneShotRequestContextBuilder.
+ONE_SHOT_STATE_KEY = "one_shot"
+
+# ServerCallContext.state key set by PushNotificationRequestHandler for
+# message/stream requests.
+STREAMING_STATE_KEY = "streaming"
+
+# Agent card extension declaring that the agent's answers depend only on the
+# input message. params: {"maxInputChars": int}
+STATELESS_EXTENSION_URI = "urn:adk-agent-executor:stateless"
+
 
 class ADKAgentExecutor(AgentExecutor):
-    """An AgentExecutor that runs an ADK-based Agent."""
+    """An AgentExecutor that runs an ADK-based Agent.
+
+    In addition to plain messages, a message carrying a batch DataPart
+    (see `extract_batch_items`) is processed item by item with bounded
+    concurrency, and each item's answer is returned as its own artifact.
+
+    With `streaming` enabled, message/stream requests (see
+    `is_streaming_request`) run the runner in SSE mode and partial text is
+    appended to a single artifact as it is generated, so the client receives
+    tokens without waiting for the final response. message/send always gets
+    the final response as one artifact, since nobody reads the chunks.
 
-    def __init__(self, runner: Runner, card: AgentCard):
+    With a `blob_store`, large file parts are exchanged as URI references to
+    the store instead of inline base64 (see `convert_genai_part_to_a2a`).
+
+    Session handles are cached per context ID (LRU, `session_cache_size`), so
+    a continued context does not look up its session on every request. With
+    `ephemeral_one_shot`, a request that does not continue a context (see
+    `OneShotRequestContextBuilder`) runs in a temporary in-memory session
+    that is dropped afterwards, and nothing is written to the session service.
+
+    If the card declares the stateless extension (see `stateless_extension`)
+    and the agent is an LlmAgent with a plain instruction and no tools, the
+    runner is bypassed: the model is called directly with the instruction and
+    the input message. Nothing is read from or written to a session, so the
+    prompt never grows, and inputs over `maxInputChars` are rejected.
+    """
+
+    def __init__(
+        self,
+        runner: Runner,
+        card: AgentCard,
+        batch_max_items: int = 100,
+        batch_max_concurrency: int = 4,
+        streaming: bool = True,
+        blob_store: BlobStore | None = None,
+        session_cache_size: int = 1000,
+        ephemeral_one_shot: bool = False,
+    ):
         self.runner = runner
         self._card = card
+        self.batch_max_items = batch_max_items
+        self.batch_max_concurrency = batch_max_concurrency
+        self.streaming = streaming
+        self.blob_store = blob_store
+        self.session_cache_size = session_cache_size
+        self.ephemeral_one_shot = ephemeral_one_shot
 
         self._running_sessions = {}
+        self._stateless_agent, self.stateless_max_input_chars = _stateless_config(
+            runner, card
+        )
+        self._session_handles: OrderedDict[str, Session] = OrderedDict()
+        # Same agent and services, but sessions live only for one request.
+        self._ephemeral_runner = Runner(
+            app_name=runner.app_name,
+            agent=runner.agent,
+            artifact_service=runner.artifact_service,
+            session_service=InMemorySessionService(),
+            memory_service=runner.memory_service,
+        )
 
     def _run_agent(
-        self, session_id, new_message: types.Content
+        self,
+        session_id,
+        new_message: types.Content,
+        streaming: bool = False,
+        runner: Runner | None = None,
     ) -> AsyncGenerator[Event, None]:
-        return self.runner.run_async(
-            session_id=session_id, user_id="self", new_message=new_message
+        run_config = RunConfig(
+            streaming_mode=StreamingMode.SSE if streaming else StreamingMode.NONE
+        )
+        return (runner or self.runner).run_async(
+            session_id=session_id,
+            user_id="self",
+            new_message=new_message,
+            run_config=run_config,
         )
 
     async def _process_request(
@@ -50,53 +146,229 @@ class ADKAgentExecutor(AgentExecutor):
         new_message: types.Content,
         session_id: str,
         task_updater: TaskUpdater,
+        ephemeral: bool = False,
+        streaming: bool = False,
     ) -> None:
-        # The call to self._upsert_session was returning a coroutine object,
-        # leading to an AttributeError when trying to access .id on it directly.
-        # We need to await the coroutine to get the actual session object.
-        session_obj = await self._upsert_session(
-            session_id,
-        )
-        # Update session_id with the ID from the resolved session object
-        # to be used in self._run_agent.
-        session_id = session_obj.id
-
-        async for event in self._run_agent(session_id, new_message):
+        async with self._session(session_id, ephemeral) as (runner, session_id):
+            await self._stream_response(
+                runner, session_id, new_message, task_updater, streaming
+            )
 
+    async def _stream_response(
+        self,
+        runner: Runner,
+        session_id: str,
+        new_message: types.Content,
+        task_updater: TaskUpdater,
+        streaming: bool = False,
+    ) -> None:
+        # Partial chunks are appended to one artifact. The first chunk of each
+        # model response starts the artifact over (append=False), so text
+        # streamed before a tool call is replaced by the answer that follows.
+        artifact_id = str(uuid.uuid4())
+        streamed = False
+        async for event in self._run_agent(
+            session_id, new_message, streaming=streaming, runner=runner
+        ):
+            if event.partial:
+                parts = convert_genai_parts_to_a2a(
+                    event.content.parts if event.content else [], self.blob_store
+                )
+                if parts:
+                    await add_artifact_chunk(
+                        task_updater, artifact_id, parts, append=streamed
+                    )
+                    streamed = True
+                continue
             if event.is_final_response():
-                parts = convert_genai_parts_to_a2a(event.content.parts)
+                parts = convert_genai_parts_to_a2a(
+                    event.content.parts if event.content else [], self.blob_store
+                )
                 logger.debug("Yielding final response: %s", parts)
-                await task_updater.add_artifact(parts)
+                if streamed:
+                    # Replace the chunks with the aggregated response so the
+                    # stored task holds the answer as whole parts.
+                    await add_artifact_chunk(
+                        task_updater, artifact_id, parts, append=False, last_chunk=True
+                    )
+                else:
+                    await task_updater.add_artifact(parts, artifact_id=artifact_id)
                 await task_updater.complete()
                 break
+            streamed = False
             if not event.get_function_calls():
                 logger.debug("Yielding update response")
                 await task_updater.update_status(
                     TaskState.working,
                     message=task_updater.new_agent_message(
-                        convert_genai_parts_to_a2a(event.content.parts),
+                        convert_genai_parts_to_a2a(event.content.parts, self.blob_store),
                     ),
                 )
             else:
                 logger.debug("Skipping event")
 
+    async def _process_stateless(
+        self,
+        new_message: types.Content,
+        task_updater: TaskUpdater,
+        streaming: bool = False,
+    ) -> None:
+        artifact_id = str(uuid.uuid4())
+        streamed = False
+        parts: list[Part] = []
+        async for response in self._call_model(new_message, stream=streaming):
+            parts = convert_genai_parts_to_a2a(
+                response.content.parts if response.content else [], self.blob_store
+            )
+            if response.partial:
+                if parts:
+                    await add_artifact_chunk(
+                        task_updater, artifact_id, parts, append=streamed
+                    )
+                    streamed = True
+                continue
+        if streamed:
+            await add_artifact_chunk(
+                task_updater, artifact_id, parts, append=False, last_chunk=True
+            )
+        else:
+            await task_updater.add_artifact(parts, artifact_id=artifact_id)
+        await task_updater.complete()
+
+    async def _call_model(
+        self, new_message: types.Content, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        """Call the stateless agent's model with its instruction and the input."""
+        agent = self._stateless_agent
+        llm = agent.canonical_model
+        config = (
+            agent.generate_content_config.model_copy(deep=True)
+            if agent.generate_content_config
+            else types.GenerateContentConfig()
+        )
+        llm_request = LlmRequest(model=llm.model, contents=[new_message], config=config)
+        llm_request.append_instructions([agent.instruction])
+        async for response in llm.generate_content_async(llm_request, stream=stream):
+            if response.error_code:
+                raise RuntimeError(
+                    f"Model error {response.error_code}: {response.error_message}"
+                )
+            yield response
+
+    def _check_input_size(self, text_length: int) -> None:
+        if text_length > self.stateless_max_input_chars:
+            raise ValueError(
+                f"Input too long: {text_length} characters "
+                f"(max {self.stateless_max_input_chars})"
+            )
+
+    async def _process_batch(
+        self,
+        items: list[dict[str, str]],
+        context_id: str,
+        task_updater: TaskUpdater,
+        ephemeral: bool = False,
+    ) -> None:
+        # Each item runs in its own session so that items neither see each
+        # other's history nor race on the same session.
+        semaphore = asyncio.Semaphore(self.batch_max_concurrency)
+
+        async def process_item(item: dict[str, str]) -> None:
+            async with semaphore:
+                metadata: dict[str, Any] = {"batch_item_id": item["id"]}
+                try:
+                    parts = await self._answer_batch_item(item, context_id, ephemeral)
+                except Exception as e:
+                    logger.exception("Batch item %s failed", item["id"])
+                    parts = [TextPart(text=f"Error: {e}")]
+                    metadata["error"] = str(e)
+                await task_updater.add_artifact(
+                    parts, name=item["id"], metadata=metadata
+                )
+
+        await asyncio.gather(*(process_item(item) for item in items))
+        await task_updater.complete()
+
+    async def _answer_batch_item(
+        self, item: dict[str, str], context_id: str, ephemeral: bool
+    ) -> list[Part]:
+        new_message = types.UserContent(parts=[types.Part(text=item["text"])])
+        if self._stateless_agent is not None:
+            self._check_input_size(len(item["text"]))
+            parts: list[Part] = []
+            async for response in self._call_model(new_message):
+                parts = convert_genai_parts_to_a2a(
+                    response.content.parts if response.content else [],
+                    self.blob_store,
+                )
+            return parts
+        async with self._session(
+            f"{context_id}:{item['id']}", ephemeral
+        ) as (runner, session_id):
+            return await self._run_to_final(runner, session_id, new_message)
+
+    async def _run_to_final(
+        self, runner: Runner, session_id: str, new_message: types.Content
+    ) -> list[Part]:
+        parts: list[Part] = []
+        async for event in self._run_agent(session_id, new_message, runner=runner):
+            if event.is_final_response() and event.content:
+                parts = convert_genai_parts_to_a2a(event.content.parts, self.blob_store)
+        return parts
+
     async def execute(
         self,
         context: RequestContext,
         event_queue: EventQueue,
     ):
+        batch_items = extract_batch_items(context.message.parts)
+        if batch_items is not None and len(batch_items) > self.batch_max_items:
+            raise ServerError(
+                error=InvalidParamsError(
+                    message=f"Batch too large: {len(batch_items)} items "
+                    f"(max {self.batch_max_items})"
+                )
+            )
+
+        new_message = None
+        if batch_items is None:
+            try:
+                new_message = types.UserContent(
+                    parts=convert_a2a_parts_to_genai(
+                        context.message.parts, self.blob_store
+                    ),
+                )
+            except BlobTooLargeError as e:
+                raise ServerError(error=InvalidParamsError(message=str(e))) from e
+            if self._stateless_agent is not None:
+                try:
+                    self._check_input_size(
+                        sum(len(part.text or "") for part in new_message.parts)
+                    )
+                except ValueError as e:
+                    raise ServerError(error=InvalidParamsError(message=str(e))) from e
+
+        ephemeral = self.ephemeral_one_shot and is_one_shot(context)
+        streaming = self.streaming and is_streaming_request(context)
+
         # Run the agent until either complete or the task is suspended.
         updater = TaskUpdater(event_queue, context.task_id, context.context_id)
         # Immediately notify that the task is submitted.
         if not context.current_task:
             await updater.submit()
         await updater.start_work()
+        if batch_items is not None:
+            await self._process_batch(
+                batch_items, context.context_id, updater, ephemeral
+            )
+            logger.debug("execute exiting")
+            return
+        if self._stateless_agent is not None:
+            await self._process_stateless(new_message, updater, streaming)
+            logger.debug("execute exiting")
+            return
         await self._process_request(
-            types.UserContent(
-                parts=convert_a2a_parts_to_genai(context.message.parts),
-            ),
-            context.context_id,
-            updater,
+            new_message, context.context_id, updater, ephemeral, streaming
         )
         logger.debug("execute exiting")
 
@@ -104,80 +376,268 @@ class ADKAgentExecutor(AgentExecutor):
         # Ideally: kill any ongoing tasks.
         raise ServerError(error=UnsupportedOperationError())
 
+    @contextlib.asynccontextmanager
+    async def _session(
+        self, session_id: str, ephemeral: bool
+    ) -> AsyncIterator[tuple[Runner, str]]:
+        """Yield the runner and session ID to run a request with."""
+        if not ephemeral:
+            session_obj = await self._upsert_session(session_id)
+            yield self.runner, session_obj.id
+            return
+        session_service = self._ephemeral_runner.session_service
+        session_obj = await session_service.create_session(
+            app_name=self.runner.app_name, user_id="self"
+        )
+        try:
+            yield self._ephemeral_runner, session_obj.id
+        finally:
+            await session_service.delete_session(
+                app_name=self.runner.app_name, user_id="self", session_id=session_obj.id
+            )
+
     async def _upsert_session(self, session_id: str):
         """
         Retrieves a session if it exists, otherwise creates a new one.
         Ensures that async session service methods are properly awaited.
+
+        Handles are cached, and a session service providing
+        `get_or_create_session` is asked once instead of get then create.
         """
-        session = await self.runner.session_service.get_session(
-            app_name=self.runner.app_name, user_id="self", session_id=session_id
+        session = self._session_handles.get(session_id)
+        if session is not None:
+            self._session_handles.move_to_end(session_id)
+            return session
+        get_or_create = getattr(
+            self.runner.session_service, "get_or_create_session", None
         )
-        if session is None:
-            session = await self.runner.session_service.create_session(
+        if get_or_create is not None:
+            session = await get_or_create(
                 app_name=self.runner.app_name, user_id="self", session_id=session_id
             )
+        else:
+            session = await self.runner.session_service.get_session(
+                app_name=self.runner.app_name, user_id="self", session_id=session_id
+            )
+            if session is None:
+                session = await self.runner.session_service.create_session(
+                    app_name=self.runner.app_name, user_id="self", session_id=session_id
+                )
         # According to ADK InMemorySessionService, create_session should always return a Session object.
         if session is None:
             logger.error(
                 f"Critical error: Session is None even after create_session for session_id: {session_id}"
             )
             raise RuntimeError(f"Failed to get or create session: {session_id}")
+        self._session_handles[session_id] = session
+        if len(self._session_handles) > self.session_cache_size:
+            self._session_handles.popitem(last=False)
         return session
 
 
-def convert_a2a_parts_to_genai(parts: list[Part]) -> list[types.Part]:
+class OneShotRequestContextBuilder(SimpleRequestContextBuilder):
+    """Request context builder that records whether a request is one-shot.
+
+    RequestContext fills in a new context ID when the message has none, so by
+    the time the executor runs it cannot tell whether the client continued a
+    context. This builder records it in the call context's state.
+    """
+
+    async def build(
+        self,
+        params: MessageSendParams | None = None,
+        task_id: str | None = None,
+        context_id: str | None = None,
+        task: Task | None = None,
+        context: ServerCallContext | None = None,
+    ) -> RequestContext:
+        context = context or ServerCallContext()
+        context.state[ONE_SHOT_STATE_KEY] = (
+            params is not None and params.message.contextId is None and task is None
+        )
+        return await super().build(params, task_id, context_id, task, context)
+
+
+def stateless_extension(max_input_chars: int) -> AgentExtension:
+    """Agent card extension that enables stateless execution."""
+    return AgentExtension(
+        uri=STATELESS_EXTENSION_URI,
+        description=(
+            "Answers depend only on the input message; no conversation history "
+            "is kept."
+        ),
+        params={"maxInputChars": max_input_chars},
+    )
+
+
+def _stateless_config(
+    runner: Runner, card: AgentCard | None
+) -> tuple[LlmAgent | None, int]:
+    """Return the agent to call directly and the input limit, if stateless."""
+    extensions = (card and card.capabilities.extensions) or []
+    extension = next(
+        (e for e in extensions if e.uri == STATELESS_EXTENSION_URI), None
+    )
+    if extension is None:
+        return None, 0
+    agent = runner.agent
+    if (
+        not isinstance(agent, LlmAgent)
+        or not isinstance(agent.instruction, str)
+        or agent.tools
+        or agent.sub_agents
+    ):
+        logger.warning(
+            "Card declares stateless execution, but agent %s needs the runner "
+            "(tools, sub-agents or a dynamic instruction); ignoring",
+            agent.name,
+        )
+        return None, 0
+    return agent, int((extension.params or {}).get("maxInputChars", sys.maxsize))
+
+
+def is_one_shot(context: RequestContext) -> bool:
+    """Whether the request neither continues a context nor a task."""
+    call_context = context.call_context
+    return bool(call_context and call_context.state.get(ONE_SHOT_STATE_KEY))
+
+
+def is_streaming_request(context: RequestContext) -> bool:
+    """Whether the request came in through message/stream."""
+    call_context = context.call_context
+    return bool(call_context and call_context.state.get(STREAMING_STATE_KEY))
+
+
+async def add_artifact_chunk(
+    task_updater: TaskUpdater,
+    artifact_id: str,
+    parts: list[Part],
+    append: bool,
+    last_chunk: bool = False,
+) -> None:
+    """Send a chunk of a streamed artifact.
+
+    `TaskUpdater.add_artifact` has no append/lastChunk arguments, so the
+    event is enqueued directly. With append=False the chunk replaces the
+    artifact's parts; otherwise the parts are appended to it.
+    """
+    await task_updater.event_queue.enqueue_event(
+        TaskArtifactUpdateEvent(
+            taskId=task_updater.task_id,
+            contextId=task_updater.context_id,
+            artifact=Artifact(artifactId=artifact_id, parts=parts),
+            append=append,
+            lastChunk=last_chunk,
+        )
+    )
+
+
+def extract_batch_items(parts: list[Part]) -> list[dict[str, str]] | None:
+    """Return the items of a batch message, or None for a regular message.
+
+    A batch message has a DataPart of the form
+    ``{"batch": [{"id": "1", "text": "..."}, ...]}``. Items without an id
+    are numbered by their position.
+    """
+    for part in parts:
+        part = part.root
+        if isinstance(part, DataPart) and isinstance(part.data.get("batch"), list):
+            return [
+                {"id": str(item.get("id") or i), "text": str(item["text"])}
+                for i, item in enumerate(part.data["batch"], start=1)
+            ]
+    return None
+
+
+def convert_a2a_parts_to_genai(
+    parts: list[Part], blob_store: BlobStore | None = None
+) -> list[types.Part]:
     """Convert a list of A2A Part types into a list of Google Gen AI Part types."""
-    return [convert_a2a_part_to_genai(part) for part in parts]
+    return [convert_a2a_part_to_genai(part, blob_store) for part in parts]
 
 
-def convert_a2a_part_to_genai(part: Part) -> types.Part:
-    """Convert a single A2A Part type into a Google Gen AI Part type."""
+def convert_a2a_part_to_genai(
+    part: Part, blob_store: BlobStore | None = None
+) -> types.Part:
+    """Convert a single A2A Part type into a Google Gen AI Part type.
+
+    With a blob store, file bytes are checked against its size limit before
+    decoding, and URIs pointing into the store are resolved locally since
+    the model cannot fetch them.
+    """
     part = part.root
     if isinstance(part, TextPart):
         return types.Part(text=part.text)
     if isinstance(part, FilePart):
         if isinstance(part.file, FileWithUri):
+            digest = blob_store.digest_for(part.file.uri) if blob_store else None
+            if digest is not None:
+                return types.Part(
+                    inline_data=types.Blob(
+                        data=blob_store.read(digest), mime_type=part.file.mimeType
+                    )
+                )
             return types.Part(
                 file_data=types.FileData(
-                    file_uri=part.file.uri, mime_type=part.file.mime_type
+                    file_uri=part.file.uri, mime_type=part.file.mimeType
                 )
             )
         if isinstance(part.file, FileWithBytes):
+            max_bytes = blob_store.max_bytes if blob_store else sys.maxsize
             return types.Part(
                 inline_data=types.Blob(
-                    data=part.file.bytes, mime_type=part.file.mime_type
+                    data=decode_base64(part.file.bytes, max_bytes),
+                    mime_type=part.file.mimeType,
                 )
             )
         raise ValueError(f"Unsupported file type: {type(part.file)}")
     raise ValueError(f"Unsupported part type: {type(part)}")
 
 
-def convert_genai_parts_to_a2a(parts: list[types.Part]) -> list[Part]:
+def convert_genai_parts_to_a2a(
+    parts: list[types.Part], blob_store: BlobStore | None = None
+) -> list[Part]:
     """Convert a list of Google Gen AI Part types into a list of A2A Part types."""
     return [
-        convert_genai_part_to_a2a(part)
+        convert_genai_part_to_a2a(part, blob_store)
         for part in parts
         if (part.text or part.file_data or part.inline_data)
     ]
 
 
-def convert_genai_part_to_a2a(part: types.Part) -> Part:
-    """Convert a single Google Gen AI Part type into an A2A Part type."""
+def convert_genai_part_to_a2a(
+    part: types.Part, blob_store: BlobStore | None = None
+) -> Part:
+    """Convert a single Google Gen AI Part type into an A2A Part type.
+
+    With a blob store, inline data larger than its inline limit is written
+    to the store and returned as a URI reference instead of base64.
+    """
     if part.text:
         return TextPart(text=part.text)
     if part.file_data:
         return FilePart(
             file=FileWithUri(
                 uri=part.file_data.file_uri,
-                mime_type=part.file_data.mime_type,
+                mimeType=part.file_data.mime_type,
             )
         )
     if part.inline_data:
+        data = part.inline_data.data
+        if blob_store and len(data) > blob_store.inline_max_bytes:
+            return Part(
+                root=FilePart(
+                    file=FileWithUri(
+                        uri=blob_store.url_for(blob_store.put(data)),
+                        mimeType=part.inline_data.mime_type,
+                    )
+                )
+            )
         return Part(
             root=FilePart(
                 file=FileWithBytes(
-                    bytes=part.inline_data.data,
-                    mime_type=part.inline_data.mime_type,
+                    bytes=encode_base64(data),
+                    mimeType=part.inline_data.mime_type,
                 )
             )
         )
@@ -0,0 +1,257 @@
+"""アーティファクトサービスの切り替え
+
+環境変数 ARTIFACT_SERVICE で Runner に渡すアーティファクトサービスを選択する。
+
+* memory (デフォルト): ADK の InMemoryArtifactService
+* file: ディスクに保存する FileArtifactService。
+  同じ内容のアーティファクトは1つだけ保存し、合計サイズの上限を超えると古いものから削除する
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from google.adk.artifacts import BaseArtifactService, InMemoryArtifactService
+from google.genai import types
+from typing_extensions import override
+
+from config import (
+    ARTIFACT_SERVICE,
+    ARTIFACT_STORE_DIR,
+    ARTIFACT_STORE_MAX_BYTES,
+)
+
+
+# バイナリ (inline_data) はそのまま、それ以外のパーツはJSONとして保存する
+_KIND_BLOB = "blob"
+_KIND_PART = "part"
+
+
+@dataclass
+class _Manifest:
+    """1つのアーティファクト (パス) のバージョン一覧"""
+
+    path: str
+    versions: list[dict] = field(default_factory=list)
+    last_access: float = 0.0
+
+
+class FileArtifactService(BaseArtifactService):
+    """ディスクに保存するアーティファクトサービス
+
+    内容は SHA-256 をキーとして objects/ に1回だけ書き込み、アーティファクトのパスごとの
+    バージョン一覧 (内容のハッシュ・MIMEタイプ) を manifests/ に保存する。
+    バージョン番号は InMemoryArtifactService と同じく 0 から連番で、
+    削除したアーティファクトを保存し直すと 0 から振り直す。
+    保存している内容の合計が max_bytes を超えると、最後に使われた時刻が古いアーティファクトから
+    (全バージョンをまとめて) 削除する。
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._objects = self.root / "objects"
+        self._manifests_dir = self.root / "manifests"
+        self._objects.mkdir(parents=True, exist_ok=True)
+        self._manifests_dir.mkdir(parents=True, exist_ok=True)
+
+        # メタデータだけをメモリに持つ (内容はディスクから読む)
+        self._manifests: dict[str, _Manifest] = {}
+        self._refcounts: dict[str, int] = {}
+        self._object_sizes: dict[str, int] = {}
+        self.total_bytes = 0
+        self.stats = {"saved": 0, "deduplicated": 0, "evicted": 0}
+        self._load_manifests()
+
+    def _artifact_path(
+        self, app_name: str, user_id: str, session_id: str, filename: str
+    ) -> str:
+        # InMemoryArtifactService と同じく "user:" で始まるファイル名はユーザー単位で共有する
+        if filename.startswith("user:"):
+            return f"{app_name}/{user_id}/user/{filename}"
+        return f"{app_name}/{user_id}/{session_id}/{filename}"
+
+    @override
+    async def save_artifact(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        filename: str,
+        artifact: types.Part,
+    ) -> int:
+        path = self._artifact_path(app_name, user_id, session_id, filename)
+        if artifact.inline_data is not None:
+            kind, mime_type = _KIND_BLOB, artifact.inline_data.mime_type
+            data = artifact.inline_data.data or b""
+        else:
+            kind, mime_type = _KIND_PART, None
+            data = artifact.model_dump_json(exclude_none=True).encode("utf-8")
+
+        digest = self._put_object(data)
+        manifest = self._manifests.get(path) or _Manifest(path)
+        version = len(manifest.versions)
+        manifest.versions.append(
+            {"digest": digest, "kind": kind, "mime_type": mime_type}
+        )
+        manifest.last_access = time.time()
+        self._manifests[path] = manifest
+        self._refcounts[digest] = self._refcounts.get(digest, 0) + 1
+        self._write_manifest(manifest)
+        self.stats["saved"] += 1
+        self._evict(keep=path)
+        return version
+
+    @override
+    async def load_artifact(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        filename: str,
+        version: Optional[int] = None,
+    ) -> Optional[types.Part]:
+        path = self._artifact_path(app_name, user_id, session_id, filename)
+        manifest = self._manifests.get(path)
+        if manifest is None or not manifest.versions:
+            return None
+        entry = manifest.versions[-1 if version is None else version]
+        manifest.last_access = time.time()
+        data = self._read_object(entry["digest"])
+        if entry["kind"] == _KIND_BLOB:
+            return types.Part(
+                inline_data=types.Blob(data=data, mime_type=entry["mime_type"])
+            )
+        return types.Part.model_validate_json(data)
+
+    @override
+    async def list_artifact_keys(
+        self, *, app_name: str, user_id: str, session_id: str
+    ) -> list[str]:
+        session_prefix = f"{app_name}/{user_id}/{session_id}/"
+        usernamespace_prefix = f"{app_name}/{user_id}/user/"
+        filenames = []
+        for path in self._manifests:
+            if path.startswith(session_prefix):
+                filenames.append(path.removeprefix(session_prefix))
+            elif path.startswith(usernamespace_prefix):
+                filenames.append(path.removeprefix(usernamespace_prefix))
+        return sorted(filenames)
+
+    @override
+    async def delete_artifact(
+        self, *, app_name: str, user_id: str, session_id: str, filename: str
+    ) -> None:
+        path = self._artifact_path(app_name, user_id, session_id, filename)
+        if path in self._manifests:
+            self._remove(path)
+
+    @override
+    async def list_versions(
+        self, *, app_name: str, user_id: str, session_id: str, filename: str
+    ) -> list[int]:
+        path = self._artifact_path(app_name, user_id, session_id, filename)
+        manifest = self._manifests.get(path)
+        if manifest is None:
+            return []
+        return list(range(len(manifest.versions)))
+
+    def _put_object(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in self._object_sizes:
+            self.stats["deduplicated"] += 1
+            return digest
+        object_path = self._object_path(digest)
+        object_path.parent.mkdir(exist_ok=True)
+        _atomic_write(object_path, data)
+        self._object_sizes[digest] = len(data)
+        self.total_bytes += len(data)
+        return digest
+
+    def _read_object(self, digest: str) -> bytes:
+        return self._object_path(digest).read_bytes()
+
+    def _evict(self, keep: str):
+        if self.total_bytes <= self.max_bytes:
+            return
+        candidates = sorted(
+            (m for m in self._manifests.values() if m.path != keep),
+            key=lambda m: m.last_access,
+        )
+        for manifest in candidates:
+            if self.total_bytes <= self.max_bytes:
+                break
+            self._remove(manifest.path)
+            self.stats["evicted"] += 1
+
+    def _remove(self, path: str):
+        manifest = self._manifests.pop(path)
+        self._manifest_path(path).unlink(missing_ok=True)
+        for entry in manifest.versions:
+            digest = entry["digest"]
+            self._refcounts[digest] -= 1
+            if self._refcounts[digest] == 0:
+                del self._refcounts[digest]
+                self.total_bytes -= self._object_sizes.pop(digest)
+                self._object_path(digest).unlink(missing_ok=True)
+
+    def _load_manifests(self):
+        for manifest_path in self._manifests_dir.glob("*.json"):
+            with manifest_path.open(encoding="utf-8") as f:
+                saved = json.load(f)
+            manifest = _Manifest(
+                saved["path"], saved["versions"], manifest_path.stat().st_mtime
+            )
+            self._manifests[manifest.path] = manifest
+            for entry in manifest.versions:
+                digest = entry["digest"]
+                self._refcounts[digest] = self._refcounts.get(digest, 0) + 1
+                if digest not in self._object_sizes:
+                    size = self._object_path(digest).stat().st_size
+                    self._object_sizes[digest] = size
+                    self.total_bytes += size
+
+    def _write_manifest(self, manifest: _Manifest):
+        _atomic_write(
+            self._manifest_path(manifest.path),
+            json.dumps(
+                {"path": manifest.path, "versions": manifest.versions},
+                ensure_ascii=False,
+            ).encode("utf-8"),
+        )
+
+    def _object_path(self, digest: str) -> Path:
+        return self._objects / digest[:2] / digest
+
+    def _manifest_path(self, path: str) -> Path:
+        name = hashlib.sha256(path.encode("utf-8")).hexdigest()
+        return self._manifests_dir / f"{name}.json"
+
+
+def _atomic_write(path: Path, data: bytes):
+    """一時ファイルに書いてから置き換え、書きかけの内容が読まれないようにする"""
+    fd, tmp = tempfile.mkstemp(dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def create_artifact_service() -> BaseArtifactService:
+    """ARTIFACT_SERVICE に応じて Runner に渡すアーティファクトサービスを返す"""
+    if ARTIFACT_SERVICE == "file":
+        return FileArtifactService(
+            ARTIFACT_STORE_DIR,
+            max_bytes=ARTIFACT_STORE_MAX_BYTES,
+        )
+    return InMemoryArtifactService()
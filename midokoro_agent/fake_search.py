@@ -0,0 +1,36 @@
+"""Google検索の代わりに使用する疑似検索ツール (LLM_BACKEND=fake 用)
+
+google_search は Gemini 側で実行される組み込みツールのため、疑似LLMでは動作しない。
+オフラインでの負荷試験では、クエリから決定的に生成した検索結果を返すこのツールを使用する。
+"""
+
+import asyncio
+import hashlib
+
+from config import FAKE_SEARCH_LATENCY_MS
+
+
+async def fake_google_search(query: str) -> dict:
+    """沖縄の観光情報を検索する（疑似検索）
+
+    Args:
+        query: 検索クエリ
+
+    Returns:
+        検索結果のタイトル・URL・抜粋を含む辞書
+    """
+    if FAKE_SEARCH_LATENCY_MS:
+        await asyncio.sleep(FAKE_SEARCH_LATENCY_MS / 1000)
+
+    digest = hashlib.sha256(query.encode("utf-8")).hexdigest()[:8]
+    return {
+        "query": query,
+        "results": [
+            {
+                "title": f"沖縄観光ガイド {i + 1}: {query}",
+                "url": f"https://example.com/okinawa/{digest}/{i + 1}",
+                "snippet": f"「{query}」に関する観光情報（疑似検索結果 {i + 1}）",
+            }
+            for i in range(3)
+        ],
+    }
@@ -1,7 +1,12 @@
+from typing import Optional
+
 from google.adk.agents import LlmAgent
 from google.adk.tools import google_search
 
-from config import LLM_MODEL_ID
+from config import LLM_BACKEND
+from fake_search import fake_google_search
+from history_policy import HistoryPolicy
+from llm_backend import create_model
 
 
 _prompt = """
@@ -45,11 +50,15 @@ _prompt = """
 </RESPONSE_FORMAT>
 """
 
-def create_agent() -> LlmAgent:
+def create_agent(history_policy: Optional[HistoryPolicy] = None) -> LlmAgent:
     return LlmAgent(
-        model=LLM_MODEL_ID,
+        model=create_model(),
         name="midokoro_agent",
         description="Google検索を利用して沖縄の見どころや観光スポットを紹介するエージェントです。",
         instruction=_prompt,
-        tools=[google_search]
+        # 疑似LLMでは組み込みのGoogle検索が使えないため疑似検索ツールに差し替える
+        tools=[fake_google_search if LLM_BACKEND == "fake" else google_search],
+        # モデルに送る会話履歴を絞り込み、プロンプトのトークン数を記録する
+        before_model_callback=history_policy and history_policy.before_model_callback,
+        after_model_callback=history_policy and history_policy.after_model_callback,
     )
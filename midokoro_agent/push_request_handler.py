@@ -0,0 +1,260 @@
+import asyncio
+import logging
+
+from collections.abc import AsyncGenerator
+from datetime import datetime, timezone
+from typing import cast
+
+from a2a.server.context import ServerCallContext
+from a2a.server.events import Event, EventConsumer
+from a2a.server.request_handlers import DefaultRequestHandler
+from a2a.server.tasks import InMemoryPushNotifier, ResultAggregator, TaskManager
+from a2a.types import (
+    InternalError,
+    Message,
+    MessageSendParams,
+    Task,
+    TaskState,
+    TaskStatus,
+)
+from a2a.utils import new_agent_text_message
+from a2a.utils.errors import ServerError
+
+from adk_agent_executor import STREAMING_STATE_KEY
+
+
+logger = logging.getLogger(__name__)
+
+# States after which the caller is expected to act, so a notification is sent.
+NOTIFY_STATES = {
+    TaskState.completed,
+    TaskState.failed,
+    TaskState.canceled,
+    TaskState.rejected,
+    TaskState.input_required,
+    TaskState.auth_required,
+}
+
+# States in which a task no longer runs.
+TERMINAL_STATES = {
+    TaskState.completed,
+    TaskState.failed,
+    TaskState.canceled,
+    TaskState.rejected,
+}
+
+NOTIFICATION_TOKEN_HEADER = "X-A2A-Notification-Token"
+
+
+class TokenPushNotifier(InMemoryPushNotifier):
+    """InMemoryPushNotifier that sends the configured token with each notification.
+
+    The receiver uses the token to verify that the notification belongs to a
+    task it submitted.
+    """
+
+    async def send_notification(self, task: Task) -> None:
+        push_info = await self.get_info(task.id)
+        if not push_info:
+            return
+        headers = {NOTIFICATION_TOKEN_HEADER: push_info.token} if push_info.token else {}
+        try:
+            response = await self._client.post(
+                push_info.url,
+                json=task.model_dump(mode="json", exclude_none=True),
+                headers=headers,
+            )
+            response.raise_for_status()
+            logger.info(f"Push-notification sent for URL: {push_info.url}")
+        except Exception as e:
+            logger.error(f"Error sending push-notification: {e}")
+
+
+class PushNotificationRequestHandler(DefaultRequestHandler):
+    """DefaultRequestHandler with non-blocking message/send.
+
+    When the request sets ``configuration.blocking`` to false, the task is
+    returned as soon as it has been submitted and the agent keeps running in
+    the background. The final task is delivered to the request's push
+    notification config instead of holding the HTTP connection open.
+    Blocking requests are handled by the default implementation.
+
+    For graceful shutdown, `start_draining()` makes the handler reject new
+    messages, `wait_for_running_tasks()` waits for the running executions and
+    `fail_running_tasks()` stops the rest and marks their tasks as failed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._background_tasks: set[asyncio.Task] = set()
+        self.draining = False
+
+    @property
+    def running_task_count(self) -> int:
+        return len(self._running_agents)
+
+    def start_draining(self) -> None:
+        """Reject new messages from now on; running tasks are not affected."""
+        self.draining = True
+
+    async def wait_for_running_tasks(self, timeout: float) -> bool:
+        """Wait until running executions and pending notifications finish.
+
+        Returns False if some are still running after `timeout` seconds.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self._running_agents or self._background_tasks:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            pending = [*self._running_agents.values(), *self._background_tasks]
+            await asyncio.wait(pending, timeout=remaining)
+        return True
+
+    async def fail_running_tasks(self, reason: str) -> None:
+        """Cancel the running executions and mark their tasks as failed.
+
+        The failure is sent to the task's push notification config, so a
+        caller waiting for the notification can retry without waiting for its
+        own timeout.
+        """
+        running = dict(self._running_agents)
+        pending = [*running.values(), *self._background_tasks]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        for task_id in running:
+            task = await self.task_store.get(task_id)
+            if task is None or task.status.state in TERMINAL_STATES:
+                continue
+            logger.warning("Task %s failed: %s", task_id, reason)
+            task.status = TaskStatus(
+                state=TaskState.failed,
+                message=new_agent_text_message(reason, task.contextId, task.id),
+                timestamp=datetime.now(timezone.utc).isoformat(),
+            )
+            await self.task_store.save(task)
+            if self._push_notifier:
+                await self._push_notifier.send_notification(task)
+
+    async def _cleanup_producer(
+        self,
+        producer_task: asyncio.Task,
+        task_id: str,
+    ) -> None:
+        # The default implementation stops at a failed execution, leaving the
+        # task counted as running and blocking the shutdown until the grace
+        # period runs out.
+        try:
+            await producer_task
+        finally:
+            await self._queue_manager.close(task_id)
+            async with self._running_agents_lock:
+                self._running_agents.pop(task_id, None)
+
+    def _check_accepting(self) -> None:
+        if self.draining:
+            raise ServerError(
+                error=InternalError(message="Server is shutting down")
+            )
+
+    async def on_message_send_stream(
+        self,
+        params: MessageSendParams,
+        context: ServerCallContext | None = None,
+    ) -> AsyncGenerator[Event]:
+        self._check_accepting()
+        # Let the executor stream partial output only to message/stream clients.
+        context = context or ServerCallContext()
+        context.state[STREAMING_STATE_KEY] = True
+        async for event in super().on_message_send_stream(params, context):
+            yield event
+
+    async def on_message_send(
+        self,
+        params: MessageSendParams,
+        context: ServerCallContext | None = None,
+    ) -> Message | Task:
+        self._check_accepting()
+        if not (params.configuration and params.configuration.blocking is False):
+            return await super().on_message_send(params, context)
+
+        task_manager = TaskManager(
+            task_id=params.message.taskId,
+            context_id=params.message.contextId,
+            task_store=self.task_store,
+            initial_message=params.message,
+        )
+        task: Task | None = await task_manager.get_task()
+        if task:
+            task = task_manager.update_with_message(params.message, task)
+        request_context = await self._request_context_builder.build(
+            params=params,
+            task_id=task.id if task else None,
+            context_id=params.message.contextId,
+            task=task,
+            context=context,
+        )
+        task_id = cast("str", request_context.task_id)
+        if self.should_add_push_info(params):
+            await self._push_notifier.set_info(
+                task_id, params.configuration.pushNotificationConfig
+            )
+
+        queue = await self._queue_manager.create_or_tap(task_id)
+        result_aggregator = ResultAggregator(task_manager)
+        producer_task = asyncio.create_task(
+            self._run_event_stream(request_context, queue)
+        )
+        await self._register_producer(task_id, producer_task)
+        consumer = EventConsumer(queue)
+        producer_task.add_done_callback(consumer.agent_task_callback)
+        events = result_aggregator.consume_and_emit(consumer)
+
+        # Wait for the first event so that the returned task exists in the store.
+        try:
+            first_event = await anext(events)
+        except BaseException:
+            await self._cleanup_producer(producer_task, task_id)
+            raise
+        if isinstance(first_event, Message):
+            await self._cleanup_producer(producer_task, task_id)
+            return first_event
+
+        background = asyncio.create_task(
+            self._consume_in_background(events, result_aggregator, producer_task, task_id)
+        )
+        self._background_tasks.add(background)
+        background.add_done_callback(self._background_tasks.discard)
+        return await result_aggregator.current_result
+
+    async def _consume_in_background(
+        self,
+        events,
+        result_aggregator: ResultAggregator,
+        producer_task: asyncio.Task,
+        task_id: str,
+    ) -> None:
+        notified_state: TaskState | None = None
+        try:
+            async for _ in events:
+                latest = await result_aggregator.current_result
+                if (
+                    self._push_notifier
+                    and isinstance(latest, Task)
+                    and latest.status.state in NOTIFY_STATES
+                    and latest.status.state != notified_state
+                ):
+                    notified_state = latest.status.state
+                    await self._push_notifier.send_notification(latest)
+        except Exception:
+            logger.exception("Background execution of task %s failed", task_id)
+            latest = await result_aggregator.current_result
+            if self._push_notifier and isinstance(latest, Task):
+                latest.status.state = TaskState.failed
+                await self.task_store.save(latest)
+                await self._push_notifier.send_notification(latest)
+        finally:
+            await self._cleanup_producer(producer_task, task_id)
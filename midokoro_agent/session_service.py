@@ -0,0 +1,91 @@
+"""セッションサービスの切り替え
+
+環境変数 SESSION_SERVICE で Runner に渡すセッションサービスを選択する。
+
+* memory (デフォルト): ADK の InMemorySessionService
+* database: SESSION_DB_URL のデータベースに保存する DatabaseSessionService
+
+どちらもセッションの取得と作成を1回の操作で行う get_or_create_session を持つ。
+"""
+
+import time
+
+from google.adk.sessions import BaseSessionService, InMemorySessionService, Session
+from google.adk.sessions.database_session_service import (
+    DatabaseSessionService,
+    StorageSession,
+)
+from sqlalchemy.exc import IntegrityError
+
+from config import SESSION_SERVICE, SESSION_DB_URL
+
+
+class GetOrCreateInMemorySessionService(InMemorySessionService):
+    """セッションの取得と作成を不可分に行える InMemorySessionService
+
+    get_session → create_session の2段階で作成すると、同じセッションへの2つのリクエストが
+    並行して届いたときに後から作成した側が先のセッション（と履歴）を上書きしてしまう。
+    get_or_create_session は存在の確認から作成までの間に await を挟まないため、
+    イベントループ上で不可分に実行される。
+    """
+
+    async def get_or_create_session(
+        self, *, app_name: str, user_id: str, session_id: str
+    ) -> Session:
+        """セッションのハンドルを返す。存在しなければ作成する
+
+        返すのは ID などの識別情報だけを持つハンドルで、イベントや state は含まない
+        (履歴全体の複製を避けるため)。内容が必要な場合は get_session を使う。
+        """
+        stored = self.sessions.get(app_name, {}).get(user_id, {}).get(session_id)
+        if stored is None:
+            stored = self._create_session_impl(
+                app_name=app_name, user_id=user_id, session_id=session_id
+            )
+        return _session_handle(app_name, user_id, stored.id, stored.last_update_time)
+
+
+class GetOrCreateDatabaseSessionService(DatabaseSessionService):
+    """セッションの取得と作成を1回の問い合わせで行える DatabaseSessionService
+
+    既存のセッションはイベントを読み込まずに主キーだけで確認する。
+    別のプロセスと同時に作成した場合は、主キーの重複を既存のセッションとして扱う。
+    """
+
+    async def get_or_create_session(
+        self, *, app_name: str, user_id: str, session_id: str
+    ) -> Session:
+        """セッションのハンドルを返す。存在しなければ作成する (イベントや state は含まない)"""
+        with self.database_session_factory() as session_factory:
+            stored = session_factory.get(
+                StorageSession, (app_name, user_id, session_id)
+            )
+            if stored is not None:
+                return _session_handle(
+                    app_name, user_id, session_id, stored.update_time.timestamp()
+                )
+        try:
+            await self.create_session(
+                app_name=app_name, user_id=user_id, session_id=session_id
+            )
+        except IntegrityError:
+            pass
+        return _session_handle(app_name, user_id, session_id, time.time())
+
+
+def _session_handle(
+    app_name: str, user_id: str, session_id: str, last_update_time: float
+) -> Session:
+    return Session(
+        app_name=app_name,
+        user_id=user_id,
+        id=session_id,
+        last_update_time=last_update_time,
+    )
+
+
+def create_session_service() -> BaseSessionService:
+    """SESSION_SERVICE に応じて Runner に渡すセッションサービスを返す"""
+    if SESSION_SERVICE == "database":
+        return GetOrCreateDatabaseSessionService(SESSION_DB_URL)
+    return GetOrCreateInMemorySessionService()
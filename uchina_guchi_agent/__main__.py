@@ -1,22 +1,50 @@
 import click
+import httpx
 import os
+from functools import partial
 
 from a2a.server.apps import A2AStarletteApplication
-from a2a.server.request_handlers import DefaultRequestHandler
 from a2a.server.tasks import InMemoryTaskStore
 from a2a.types import (
     AgentCapabilities,
     AgentCard,
     AgentSkill,
 )
-from google.adk.artifacts import InMemoryArtifactService
 from google.adk.memory.in_memory_memory_service import InMemoryMemoryService
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
-import uvicorn
 
 from uchina_guchi_agent import create_agent
-from adk_agent_executor import ADKAgentExecutor
+from adk_agent_executor import (
+    ADKAgentExecutor,
+    OneShotRequestContextBuilder,
+    stateless_extension,
+)
+from push_request_handler import PushNotificationRequestHandler, TokenPushNotifier
+from artifact_service import create_artifact_service
+from blob_store import BlobStore
+from session_service import create_session_service
+from history_policy import create_history_policy
+from lifecycle import ServerLifecycle
+from llm_backend import probe_model
+from config import (
+    LLM_BACKEND,
+    BATCH_MAX_ITEMS,
+    BATCH_MAX_CONCURRENCY,
+    ARTIFACT_STREAMING,
+    BLOB_STORE_DIR,
+    BLOB_PUBLIC_URL,
+    BLOB_STORE_MAX_BYTES,
+    FILE_MAX_BYTES,
+    FILE_INLINE_MAX_BYTES,
+    SESSION_CACHE_SIZE,
+    EPHEMERAL_ONE_SHOT_SESSIONS,
+    SHUTDOWN_GRACE_PERIOD,
+    READY_MAX_RUNNING_TASKS,
+    MODEL_PROBE_INTERVAL,
+    MODEL_PROBE_TIMEOUT,
+    STATELESS_MODE,
+    STATELESS_MAX_INPUT_CHARS,
+)
 
 
 from dotenv import load_dotenv
@@ -30,8 +58,10 @@ logger = getLogger(__name__)
 @click.option("--host", "host", default="0.0.0.0")
 @click.option("--port", "port", default=10001)
 def main(host: str, port: int):
-    if os.getenv("GOOGLE_GENAI_USE_VERTEXAI") != "TRUE" and not os.getenv(
-        "GOOGLE_API_KEY"
+    if (
+        LLM_BACKEND != "fake"
+        and os.getenv("GOOGLE_GENAI_USE_VERTEXAI") != "TRUE"
+        and not os.getenv("GOOGLE_API_KEY")
     ):
         raise ValueError(
             "GOOGLE_API_KEY environment variable not set and "
@@ -46,6 +76,19 @@ def main(host: str, port: int):
         examples=["こんにちは、は、沖縄方言でなんていうの？"],
     )
 
+    batch_skill = AgentSkill(
+        id="uchina_guchi_batch",
+        name="Uchina-guchi (batch)",
+        description=(
+            "複数の文を1つのメッセージでまとめて沖縄方言に変換します。"
+            'DataPart {"batch": [{"id": "...", "text": "..."}]} を送ると、'
+            "各文の変換結果を id ごとのアーティファクトとして返します。"
+        ),
+        tags=["batch", "沖縄方言", "方言"],
+        examples=["「ありがとう」「こんにちは」「おいしい」をそれぞれ沖縄方言にして"],
+        inputModes=["application/json"],
+    )
+
     agent_card = AgentCard(
         name="uchina_guchi_agent",
         description="ユーザーから受け取った日本語を沖縄方言に変換するエージェントです。",
@@ -53,27 +96,59 @@ def main(host: str, port: int):
         version="0.0.1",
         defaultInputModes=["text"],
         defaultOutputModes=["text"],
-        capabilities=AgentCapabilities(streaming=True),
-        skills=[skill],
+        capabilities=AgentCapabilities(
+            streaming=True,
+            pushNotifications=True,
+            # 翻訳は入力だけで決まるため、セッションを使わずにモデルを直接呼び出す
+            extensions=(
+                [stateless_extension(STATELESS_MAX_INPUT_CHARS)]
+                if STATELESS_MODE
+                else None
+            ),
+        ),
+        skills=[skill, batch_skill],
     )
 
-    agent = create_agent()
+    agent = create_agent(history_policy=create_history_policy())
 
     runner = Runner(
         app_name=agent_card.name,
         agent=agent,
-        artifact_service=InMemoryArtifactService(),
-        session_service=InMemorySessionService(),
+        artifact_service=create_artifact_service(),
+        session_service=create_session_service(),
         memory_service=InMemoryMemoryService(),
     )
 
+    # 大きなファイルパートはbase64で埋め込まず、ブロブストアに保存してURIで受け渡す
+    # BLOB_PUBLIC_URL が無い場合、URIはリクエストを受けたURLから作る
+    blob_store = BlobStore(
+        BLOB_STORE_DIR,
+        base_url=BLOB_PUBLIC_URL,
+        max_bytes=FILE_MAX_BYTES,
+        inline_max_bytes=FILE_INLINE_MAX_BYTES,
+        max_total_bytes=BLOB_STORE_MAX_BYTES,
+    )
+
     # リクエストを受けてエージェント固有のロジックを実行するインターフェース
     # プロトコルとロジックの橋渡しや、タスク管理を実施する
-    agent_executor = ADKAgentExecutor(runner, agent_card)
+    agent_executor = ADKAgentExecutor(
+        runner,
+        agent_card,
+        batch_max_items=BATCH_MAX_ITEMS,
+        batch_max_concurrency=BATCH_MAX_CONCURRENCY,
+        streaming=ARTIFACT_STREAMING,
+        blob_store=blob_store,
+        session_cache_size=SESSION_CACHE_SIZE,
+        ephemeral_one_shot=EPHEMERAL_ONE_SHOT_SESSIONS,
+    )
 
     # リクエストハンドラ
-    request_handler = DefaultRequestHandler(
-        agent_executor=agent_executor, task_store=InMemoryTaskStore()
+    # blocking=false のリクエストはタスクを受け付けた時点で応答し、完了をプッシュ通知で知らせる
+    request_handler = PushNotificationRequestHandler(
+        agent_executor=agent_executor,
+        task_store=InMemoryTaskStore(),
+        push_notifier=TokenPushNotifier(httpx.AsyncClient()),
+        request_context_builder=OneShotRequestContextBuilder(),
     )
 
     # A2Aサーバー
@@ -81,8 +156,24 @@ def main(host: str, port: int):
         agent_card=agent_card, http_handler=request_handler
     )
 
+    # 停止時は新しいタスクの受け付けを止め、実行中のタスクの完了を猶予期間まで待つ
+    # /readyz は実行中のタスク数とモデルへの到達性も反映する
+    lifecycle = ServerLifecycle(
+        request_handler,
+        grace_period=SHUTDOWN_GRACE_PERIOD,
+        max_running_tasks=READY_MAX_RUNNING_TASKS,
+        model_probe=partial(probe_model, agent.canonical_model),
+        model_probe_interval=MODEL_PROBE_INTERVAL,
+        model_probe_timeout=MODEL_PROBE_TIMEOUT,
+    )
+
     # サーバーの実行
-    uvicorn.run(a2a_app.build(), host=host, port=port)
+    app = a2a_app.build(
+        routes=[blob_store.route(), *lifecycle.routes()],
+        middleware=[blob_store.middleware()],
+        lifespan=lifecycle.lifespan,
+    )
+    lifecycle.run(app, host=host, port=port)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,214 @@
+import binascii
+import hashlib
+import logging
+import os
+import re
+import tempfile
+
+from collections import OrderedDict
+from contextvars import ContextVar
+from pathlib import Path
+
+from starlette.middleware import Middleware
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+from starlette.routing import Route
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+logger = logging.getLogger(__name__)
+
+BLOB_PATH_PREFIX = "/blobs/"
+_DIGEST_RE = re.compile(r"[0-9a-f]{64}")
+
+# Base URL of the request being handled, set by RequestBaseUrlMiddleware.
+_request_base_url: ContextVar[str | None] = ContextVar(
+    "request_base_url", default=None
+)
+
+
+class BlobTooLargeError(ValueError):
+    """Raised when a file part exceeds the configured size limit."""
+
+
+class BlobStore:
+    """Local content-addressed store for file parts.
+
+    Blobs are stored under their SHA-256 digest, so the same file uploaded
+    twice is written once. Large file parts are exchanged as `FileWithUri`
+    references to `{base_url}/blobs/{digest}` instead of base64 in the
+    JSON-RPC body; the route from `route()` serves them from disk. Files up
+    to `inline_max_bytes` are still sent inline.
+
+    Without a `base_url`, URIs are built from the base URL the current
+    request was sent to (see `middleware()`), so they point at an address
+    the client can reach.
+
+    When the blobs together exceed `max_total_bytes` (0 means no limit), the
+    least recently used ones are deleted. A URI handed out earlier then
+    returns 404, so the limit should leave room for files still being
+    fetched.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        base_url: str,
+        max_bytes: int,
+        inline_max_bytes: int,
+        max_total_bytes: int = 0,
+    ):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.base_url = base_url.rstrip("/")
+        self.max_bytes = max_bytes
+        self.inline_max_bytes = inline_max_bytes
+        self.max_total_bytes = max_total_bytes
+        # digest -> size, least recently used first
+        self._sizes: OrderedDict[str, int] = OrderedDict()
+        self.total_bytes = 0
+        self._load()
+
+    def _load(self) -> None:
+        """Index the blobs left on disk, ordered by their last use (mtime)."""
+        blobs = []
+        for path in self.root.glob("*/*"):
+            if _DIGEST_RE.fullmatch(path.name):
+                stat = path.stat()
+                blobs.append((stat.st_mtime, path.name, stat.st_size))
+        for _, digest, size in sorted(blobs):
+            self._sizes[digest] = size
+            self.total_bytes += size
+        self._evict()
+
+    def put(self, data: bytes | memoryview) -> str:
+        """Store the data and return its digest."""
+        if len(data) > self.max_bytes:
+            raise BlobTooLargeError(
+                f"File too large: {len(data)} bytes (max {self.max_bytes})"
+            )
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if digest in self._sizes:
+            self._touch(digest)
+            return digest
+        path.parent.mkdir(exist_ok=True)
+        # Write to a temporary file first so readers never see a partial blob.
+        fd, tmp = tempfile.mkstemp(dir=path.parent)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self._sizes[digest] = len(data)
+        self.total_bytes += len(data)
+        self._evict()
+        return digest
+
+    def read(self, digest: str) -> bytes:
+        self._touch(digest)
+        return self._path(digest).read_bytes()
+
+    def url_for(self, digest: str) -> str:
+        return f"{self._base_url()}{BLOB_PATH_PREFIX}{digest}"
+
+    def digest_for(self, uri: str) -> str | None:
+        """Return the digest if the URI refers to a blob in this store."""
+        prefix = self._base_url() + BLOB_PATH_PREFIX
+        if not uri.startswith(prefix):
+            return None
+        digest = uri[len(prefix) :]
+        if digest not in self._sizes:
+            return None
+        return digest
+
+    def route(self) -> Route:
+        return Route(BLOB_PATH_PREFIX + "{digest}", self._handle, methods=["GET"])
+
+    def middleware(self) -> Middleware:
+        """Middleware recording each request's base URL for `url_for`."""
+        return Middleware(RequestBaseUrlMiddleware)
+
+    async def _handle(self, request: Request) -> Response:
+        digest = request.path_params["digest"]
+        if digest not in self._sizes:
+            return Response(status_code=404)
+        self._touch(digest)
+        return FileResponse(
+            self._path(digest),
+            headers={"Cache-Control": "public, max-age=31536000, immutable"},
+        )
+
+    def _base_url(self) -> str:
+        if self.base_url:
+            return self.base_url
+        base_url = _request_base_url.get()
+        if base_url is None:
+            raise RuntimeError("No public URL for blobs outside of a request")
+        return base_url
+
+    def _touch(self, digest: str) -> None:
+        self._sizes.move_to_end(digest)
+        try:
+            # The mtime keeps the order across restarts.
+            os.utime(self._path(digest))
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        # The most recently used blob is kept even if it alone is over the
+        # limit, since its URI is about to be handed out.
+        while self.max_total_bytes and (
+            self.total_bytes > self.max_total_bytes and len(self._sizes) > 1
+        ):
+            digest, size = self._sizes.popitem(last=False)
+            self.total_bytes -= size
+            self._path(digest).unlink(missing_ok=True)
+            logger.info("Evicted blob %s (%d bytes)", digest, size)
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+
+class RequestBaseUrlMiddleware:
+    """Record the base URL the request was sent to (scheme, Host header).
+
+    Tasks started while handling the request, such as the agent executor,
+    inherit it through the context.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _request_base_url.set(str(Request(scope).base_url).rstrip("/"))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_base_url.reset(token)
+
+
+def decode_base64(data: str | bytes, max_bytes: int) -> bytes:
+    """Decode base64 file content, rejecting it before decoding if too large.
+
+    `a2b_base64` reads the input in place (a str is read as ASCII, bytes
+    through a memoryview), so no intermediate copy of the encoded payload is
+    made.
+    """
+    decoded_size = len(data) * 3 // 4
+    if decoded_size > max_bytes + 2:
+        raise BlobTooLargeError(
+            f"File too large: about {decoded_size} bytes (max {max_bytes})"
+        )
+    if not isinstance(data, str):
+        data = memoryview(data)
+    return binascii.a2b_base64(data)
+
+
+def encode_base64(data: bytes | memoryview) -> str:
+    return binascii.b2a_base64(data, newline=False).decode("ascii")
@@ -4,3 +4,71 @@ from dotenv import load_dotenv
 load_dotenv()
 
 LLM_MODEL_ID = os.getenv('LLM_MODEL_ID')
+
+# LLMバックエンド: gemini (デフォルト) / fake (オフライン負荷試験用の疑似LLM)
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'gemini')
+
+# バッチ問い合わせ (batch スキル) で1メッセージに含められる最大件数と、同時に処理する件数
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', '100'))
+BATCH_MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', '4'))
+
+# message/stream の応答をトークン単位でアーティファクトに追記して返す (message/send は常に最終応答だけを返す)
+ARTIFACT_STREAMING = os.getenv('ARTIFACT_STREAMING', 'FALSE') == 'TRUE'
+
+# ファイルパートの保存先 (内容のハッシュで管理するローカルのブロブストア)
+BLOB_STORE_DIR = os.getenv('BLOB_STORE_DIR', '.blobs')
+# ブロブの取得URLのベース (未指定の場合はリクエストを受けたURL)
+BLOB_PUBLIC_URL = os.getenv('BLOB_PUBLIC_URL', '')
+# ブロブストアの合計サイズの上限 (バイト、超えると最後に使われた時刻が古いものから削除、0は無制限)
+BLOB_STORE_MAX_BYTES = int(os.getenv('BLOB_STORE_MAX_BYTES', str(1024 * 1024 * 1024)))
+# 受け付けるファイルの最大サイズ (バイト)
+FILE_MAX_BYTES = int(os.getenv('FILE_MAX_BYTES', str(20 * 1024 * 1024)))
+# これより大きいファイルはbase64で埋め込まず、ブロブストアのURIで返す (バイト)
+FILE_INLINE_MAX_BYTES = int(os.getenv('FILE_INLINE_MAX_BYTES', str(64 * 1024)))
+
+# アーティファクトサービス: memory (デフォルト) / file (ディスクに保存し、同じ内容は1つだけ保存)
+ARTIFACT_SERVICE = os.getenv('ARTIFACT_SERVICE', 'memory')
+# file の保存先と、保存する内容の合計サイズの上限 (バイト、超えると最後に使われた時刻が古いものから削除)
+ARTIFACT_STORE_DIR = os.getenv('ARTIFACT_STORE_DIR', '.artifacts')
+ARTIFACT_STORE_MAX_BYTES = int(os.getenv('ARTIFACT_STORE_MAX_BYTES', str(512 * 1024 * 1024)))
+
+# セッションサービス: memory (デフォルト) / database (SESSION_DB_URL のデータベースに保存)
+SESSION_SERVICE = os.getenv('SESSION_SERVICE', 'memory')
+SESSION_DB_URL = os.getenv('SESSION_DB_URL', 'sqlite:///sessions.db')
+# コンテキストIDごとにキャッシュするセッションの数
+SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', '1000'))
+# コンテキストIDを指定しない (会話を続けない) リクエストを、保存しない一時的なセッションで処理する
+EPHEMERAL_ONE_SHOT_SESSIONS = os.getenv('EPHEMERAL_ONE_SHOT_SESSIONS', 'TRUE') == 'TRUE'
+
+# ステートレスモード: セッション・履歴を使わずに、指示と入力だけでモデルを直接呼び出す
+STATELESS_MODE = os.getenv('STATELESS_MODE', 'TRUE') == 'TRUE'
+# ステートレスモードで受け付ける入力の最大文字数 (プロンプトの大きさの上限)
+STATELESS_MAX_INPUT_CHARS = int(os.getenv('STATELESS_MAX_INPUT_CHARS', '4000'))
+
+# モデルに送る会話履歴の絞り込み: 直近のターン数と概算トークン数 (文字数) の上限 (0 は無制限)
+HISTORY_MAX_TURNS = int(os.getenv('HISTORY_MAX_TURNS', '0'))
+HISTORY_MAX_TOKENS = int(os.getenv('HISTORY_MAX_TOKENS', '0'))
+# 絞り込みで送らなくなったターンをバックグラウンドで要約し、履歴の先頭に付ける
+HISTORY_SUMMARY = os.getenv('HISTORY_SUMMARY', 'FALSE') == 'TRUE'
+# 要約を保持するセッションの最大数
+HISTORY_SUMMARY_MAX_SESSIONS = int(os.getenv('HISTORY_SUMMARY_MAX_SESSIONS', '1000'))
+
+# 停止時に実行中のタスクの完了を待つ猶予期間 (秒)。過ぎると残りのタスクを失敗にする
+SHUTDOWN_GRACE_PERIOD = float(os.getenv('SHUTDOWN_GRACE_PERIOD', '30'))
+
+# /readyz で受け付け不可 (busy) とする実行中のタスク数 (0 は無制限)
+READY_MAX_RUNNING_TASKS = int(os.getenv('READY_MAX_RUNNING_TASKS', '0'))
+# /readyz でモデルに到達できるかを確認する間隔とタイムアウト (秒)
+MODEL_PROBE_INTERVAL = float(os.getenv('MODEL_PROBE_INTERVAL', '30'))
+MODEL_PROBE_TIMEOUT = float(os.getenv('MODEL_PROBE_TIMEOUT', '5'))
+
+# 疑似LLMの設定 (LLM_BACKEND=fake のときのみ使用)
+FAKE_LLM_SEED = int(os.getenv('FAKE_LLM_SEED', '0'))
+FAKE_LLM_LATENCY_MS = float(os.getenv('FAKE_LLM_LATENCY_MS', '0'))
+FAKE_LLM_LATENCY_JITTER_MS = float(os.getenv('FAKE_LLM_LATENCY_JITTER_MS', '0'))
+# fixed / uniform / normal / lognormal
+FAKE_LLM_LATENCY_DISTRIBUTION = os.getenv('FAKE_LLM_LATENCY_DISTRIBUTION', 'fixed')
+FAKE_LLM_TOKEN_INTERVAL_MS = float(os.getenv('FAKE_LLM_TOKEN_INTERVAL_MS', '0'))
+FAKE_LLM_CHUNK_SIZE = int(os.getenv('FAKE_LLM_CHUNK_SIZE', '8'))
+# 応答スクリプト(JSON)のパス。未指定の場合は fake_llm_script.json を使用
+FAKE_LLM_SCRIPT = os.getenv('FAKE_LLM_SCRIPT', '')
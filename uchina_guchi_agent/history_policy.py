@@ -0,0 +1,246 @@
+"""会話履歴の絞り込み
+
+contextId ごとのセッションの履歴は、そのままでは毎回すべてモデルに送られるため、
+会話が長くなるほどレイテンシとコストが増える。
+HistoryPolicy はモデルを呼び出す直前 (before_model_callback) に送信する履歴を絞り込む。
+
+* 直近 N ターン (max_turns): ユーザーの発話から次の発話の前までを1ターンとして、直近のターンだけを送る
+* トークン数の上限 (max_tokens): 上限に収まるまで古いターンから削る
+* 要約 (summarize): 削ったターンを要約して履歴の先頭に付ける。
+  要約はモデルの呼び出しとは別にバックグラウンドで作成し、完成するまでは前回の要約を使う
+
+トークン数は文字数で概算する (日本語ではおおむね実際より多めになる)。
+"""
+
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from config import (
+    HISTORY_MAX_TURNS,
+    HISTORY_MAX_TOKENS,
+    HISTORY_SUMMARY,
+    HISTORY_SUMMARY_MAX_SESSIONS,
+)
+
+
+logger = logging.getLogger(__name__)
+
+_SUMMARY_PROMPT = (
+    "以下はユーザーとアシスタントの会話の要約と、その続きの会話です。"
+    "この後の会話で参照できるよう、話題・ユーザーの要望・決まったことを簡潔に1つの要約にまとめてください。"
+)
+
+
+class HistoryPolicy:
+    """モデルに送る会話履歴を絞り込む before_model_callback / after_model_callback"""
+
+    def __init__(
+        self,
+        max_turns: int = 0,
+        max_tokens: int = 0,
+        summarize: bool = False,
+        max_sessions: int = 1000,
+    ):
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.summarize = summarize
+        self.max_sessions = max_sessions
+        # セッションIDごとの (要約に含めたターン数, 要約)
+        self._summaries: OrderedDict[str, tuple[int, str]] = OrderedDict()
+        self._summarizing: dict[str, asyncio.Task] = {}
+        self.stats = {
+            "calls": 0,
+            "trimmed_calls": 0,
+            "estimated_tokens_before": 0,
+            "estimated_tokens_after": 0,
+            "prompt_tokens": 0,
+            "max_prompt_tokens": 0,
+            "summaries": 0,
+            "summary_failures": 0,
+        }
+
+    def before_model_callback(
+        self, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> Optional[LlmResponse]:
+        contents = llm_request.contents
+        turns = _split_turns(contents)
+        before = estimate_tokens(contents)
+        self.stats["calls"] += 1
+        self.stats["estimated_tokens_before"] += before
+
+        start = self._first_kept_turn(turns)
+        session_id = callback_context._invocation_context.session.id
+        summary = self._summaries.get(session_id) if self.summarize else None
+        if summary is not None:
+            self._summaries.move_to_end(session_id)
+            # 要約済みのターンは送らない
+            start = max(start, summary[0])
+
+        if start > 0:
+            kept = [content for turn in turns[start:] for content in turn]
+            if summary is not None:
+                kept.insert(0, _summary_content(summary[1]))
+            llm_request.contents = kept
+            self.stats["trimmed_calls"] += 1
+            if self.summarize and (summary is None or summary[0] < start):
+                self._schedule_summary(callback_context, session_id, turns, start)
+
+        after = estimate_tokens(llm_request.contents)
+        self.stats["estimated_tokens_after"] += after
+        logger.debug(
+            "History for session %s: %d turns, ~%d -> ~%d tokens",
+            session_id,
+            len(turns),
+            before,
+            after,
+        )
+        return None
+
+    def after_model_callback(
+        self, callback_context: CallbackContext, llm_response: LlmResponse
+    ) -> Optional[LlmResponse]:
+        usage = llm_response.usage_metadata
+        if llm_response.partial or usage is None or usage.prompt_token_count is None:
+            return None
+        self.stats["prompt_tokens"] += usage.prompt_token_count
+        self.stats["max_prompt_tokens"] = max(
+            self.stats["max_prompt_tokens"], usage.prompt_token_count
+        )
+        logger.info("Prompt tokens: %d", usage.prompt_token_count)
+        return None
+
+    def _first_kept_turn(self, turns: list[list[types.Content]]) -> int:
+        """送るターンの先頭のインデックス (最後のターンは常に送る)"""
+        start = 0
+        if self.max_turns:
+            start = max(0, len(turns) - self.max_turns)
+        if self.max_tokens:
+            tokens = sum(estimate_tokens(turn) for turn in turns[start:])
+            while start < len(turns) - 1 and tokens > self.max_tokens:
+                tokens -= estimate_tokens(turns[start])
+                start += 1
+        return start
+
+    def _schedule_summary(
+        self,
+        callback_context: CallbackContext,
+        session_id: str,
+        turns: list[list[types.Content]],
+        end: int,
+    ):
+        if session_id in self._summarizing:
+            return
+        covered, previous = self._summaries.get(session_id, (0, ""))
+        llm = callback_context._invocation_context.agent.canonical_model
+        dropped = [content for turn in turns[covered:end] for content in turn]
+        task = asyncio.create_task(
+            self._summarize(llm, session_id, previous, dropped, end)
+        )
+        self._summarizing[session_id] = task
+        task.add_done_callback(lambda _: self._summarizing.pop(session_id, None))
+
+    async def _summarize(
+        self,
+        llm: BaseLlm,
+        session_id: str,
+        previous: str,
+        dropped: list[types.Content],
+        covered: int,
+    ):
+        conversation = "\n".join(
+            f"{content.role}: {_content_text(content)}" for content in dropped
+        )
+        llm_request = LlmRequest(
+            model=llm.model,
+            contents=[
+                types.UserContent(
+                    parts=[
+                        types.Part(
+                            text=f"{_SUMMARY_PROMPT}\n\n# これまでの要約\n{previous}\n\n# 続きの会話\n{conversation}"
+                        )
+                    ]
+                )
+            ],
+            config=types.GenerateContentConfig(),
+        )
+        try:
+            text = ""
+            async for response in llm.generate_content_async(llm_request):
+                if response.content and not response.partial:
+                    text = _content_text(response.content)
+        except Exception:
+            self.stats["summary_failures"] += 1
+            logger.exception("Failed to summarize history of session %s", session_id)
+            return
+        if not text:
+            self.stats["summary_failures"] += 1
+            return
+        self._summaries[session_id] = (covered, text)
+        self._summaries.move_to_end(session_id)
+        while len(self._summaries) > self.max_sessions:
+            self._summaries.popitem(last=False)
+        self.stats["summaries"] += 1
+
+
+def estimate_tokens(contents: list[types.Content]) -> int:
+    """文字数ベースの概算トークン数 (関数呼び出し・結果はJSONの文字数で数える)"""
+    total = 0
+    for content in contents:
+        for part in content.parts or []:
+            if part.text:
+                total += len(part.text)
+            elif part.function_call:
+                total += len(json.dumps(part.function_call.args, ensure_ascii=False))
+            elif part.function_response:
+                total += len(
+                    json.dumps(
+                        part.function_response.response, ensure_ascii=False, default=str
+                    )
+                )
+    return total
+
+
+def _split_turns(contents: list[types.Content]) -> list[list[types.Content]]:
+    """ユーザーの発話ごとにターンに分ける (関数呼び出しと結果の組は分割しない)"""
+    turns: list[list[types.Content]] = []
+    for content in contents:
+        if _is_user_message(content) or not turns:
+            turns.append([content])
+        else:
+            turns[-1].append(content)
+    return turns
+
+
+def _is_user_message(content: types.Content) -> bool:
+    return content.role == "user" and any(
+        part.text for part in content.parts or []
+    )
+
+
+def _content_text(content: types.Content) -> str:
+    return "".join(part.text or "" for part in content.parts or [])
+
+
+def _summary_content(summary: str) -> types.Content:
+    return types.UserContent(
+        parts=[types.Part(text=f"（これまでの会話の要約）\n{summary}")]
+    )
+
+
+def create_history_policy() -> HistoryPolicy:
+    """設定に応じた HistoryPolicy を返す (上限が無い場合も、トークン数の記録のために使う)"""
+    return HistoryPolicy(
+        max_turns=HISTORY_MAX_TURNS,
+        max_tokens=HISTORY_MAX_TOKENS,
+        summarize=HISTORY_SUMMARY,
+        max_sessions=HISTORY_SUMMARY_MAX_SESSIONS,
+    )
@@ -0,0 +1,168 @@
+"""サーバーの停止処理とヘルスチェックのエンドポイント
+
+SIGTERM などで停止するとき、実行中のタスクを途中で打ち切らないように次の順で停止する。
+
+1. 新しいメッセージの受け付けを止める (readyz が 503 を返し、message/send はエラーを返す)
+2. 実行中のタスクが終わるのを猶予期間 (grace_period 秒) まで待つ
+3. 猶予期間内に終わらなかったタスクは中断し、失敗としてプッシュ通知する
+
+オーケストレーター向けに次のエンドポイントを提供する。
+
+* /healthz: プロセスが応答できれば 200 (liveness)
+* /readyz: 新しいタスクを受け付けられれば 200 (readiness)。次の場合は 503 を返す
+  - 停止処理中 (draining)
+  - 実行中のタスク数が上限 (max_running_tasks) に達している (busy)
+  - モデルに到達できない (model_unreachable)。確認結果は model_probe_interval 秒キャッシュする
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Optional
+
+import uvicorn
+from sse_starlette.sse import AppStatus
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from push_request_handler import PushNotificationRequestHandler
+
+
+logger = logging.getLogger(__name__)
+
+SHUTDOWN_REASON = "サーバーの停止により処理を中断しました。再度リクエストしてください。"
+
+
+class ServerLifecycle:
+    """A2Aサーバーの停止処理とヘルスチェック"""
+
+    def __init__(
+        self,
+        request_handler: PushNotificationRequestHandler,
+        grace_period: float,
+        max_running_tasks: int = 0,
+        model_probe: Optional[Callable[[], Awaitable[None]]] = None,
+        model_probe_interval: float = 30.0,
+        model_probe_timeout: float = 5.0,
+    ):
+        self.request_handler = request_handler
+        self.grace_period = grace_period
+        self.max_running_tasks = max_running_tasks
+        self.model_probe = model_probe
+        self.model_probe_interval = model_probe_interval
+        self.model_probe_timeout = model_probe_timeout
+        self._deadline: float | None = None
+        # 直前のモデルの確認結果 (確認した時刻, エラー)
+        self._model_checked_at: float | None = None
+        self._model_error: str | None = None
+        self._model_probe_lock = asyncio.Lock()
+
+    def start_draining(self):
+        """新しいメッセージの受け付けを止め、猶予期間の計測を始める"""
+        if self._deadline is not None:
+            return
+        logger.info(
+            "Draining: %d running task(s), grace period %.0fs",
+            self.request_handler.running_task_count,
+            self.grace_period,
+        )
+        self.request_handler.start_draining()
+        self._deadline = time.monotonic() + self.grace_period
+
+    async def shutdown(self):
+        """猶予期間の残りまで実行中のタスクを待ち、終わらなかったタスクを失敗にする"""
+        self.start_draining()
+        remaining = self._deadline - time.monotonic()
+        if await self.request_handler.wait_for_running_tasks(max(remaining, 0)):
+            return
+        logger.warning(
+            "Grace period exceeded, failing %d running task(s)",
+            self.request_handler.running_task_count,
+        )
+        await self.request_handler.fail_running_tasks(SHUTDOWN_REASON)
+
+    @asynccontextmanager
+    async def lifespan(self, app: Starlette):
+        yield
+        await self.shutdown()
+
+    def routes(self) -> list[Route]:
+        return [
+            Route("/healthz", self._healthz, methods=["GET"]),
+            Route("/readyz", self._readyz, methods=["GET"]),
+        ]
+
+    async def _healthz(self, request: Request) -> JSONResponse:
+        return JSONResponse({"status": "ok"})
+
+    async def _readyz(self, request: Request) -> JSONResponse:
+        running = self.request_handler.running_task_count
+        model_error = await self._check_model()
+        if self.request_handler.draining:
+            status = "draining"
+        elif self.max_running_tasks and running >= self.max_running_tasks:
+            status = "busy"
+        elif model_error is not None:
+            status = "model_unreachable"
+        else:
+            status = "ready"
+        body = {
+            "status": status,
+            "running_tasks": running,
+            "max_running_tasks": self.max_running_tasks,
+            "model": "ok" if model_error is None else model_error,
+        }
+        return JSONResponse(body, status_code=200 if status == "ready" else 503)
+
+    async def _check_model(self) -> str | None:
+        """モデルに到達できなければエラーの内容を返す (確認結果は一定時間キャッシュする)"""
+        if self.model_probe is None:
+            return None
+        async with self._model_probe_lock:
+            if (
+                self._model_checked_at is None
+                or time.monotonic() - self._model_checked_at
+                >= self.model_probe_interval
+            ):
+                try:
+                    await asyncio.wait_for(
+                        self.model_probe(), self.model_probe_timeout
+                    )
+                    self._model_error = None
+                except Exception as e:
+                    self._model_error = f"{type(e).__name__}: {e}"
+                    logger.warning("Model is unreachable: %s", self._model_error)
+                self._model_checked_at = time.monotonic()
+        return self._model_error
+
+    def run(self, app: Starlette, host: str, port: int):
+        """シグナルを受けたら停止処理を始める uvicorn サーバーでアプリを実行する
+
+        uvicorn は接続中のリクエスト (blocking の message/send やストリーミング) の完了を待ってから
+        lifespan の停止処理を呼ぶため、両方の待ち時間を合わせて猶予期間に収める。
+        """
+        config = uvicorn.Config(
+            app,
+            host=host,
+            port=port,
+            timeout_graceful_shutdown=self.grace_period,
+        )
+        # 新しい sse-starlette はサーバーの should_exit も監視してストリーミング中の応答を打ち切るため無効にする
+        AppStatus.enable_automatic_graceful_drain = False
+        _DrainingServer(config, self).run()
+
+
+class _DrainingServer(uvicorn.Server):
+    def __init__(self, config: uvicorn.Config, lifecycle: ServerLifecycle):
+        super().__init__(config)
+        self.lifecycle = lifecycle
+
+    def handle_exit(self, sig, frame):
+        self.lifecycle.start_draining()
+        # sse-starlette は Server.handle_exit を差し替え、シグナルを受けるとストリーミング中の応答
+        # (message/stream) をすぐに打ち切るため、差し替え前の処理を呼ぶ。
+        # 猶予期間を過ぎても終わらない応答は uvicorn が打ち切る
+        (AppStatus.original_handler or uvicorn.Server.handle_exit)(self, sig, frame)
@@ -0,0 +1,249 @@
+"""LLMバックエンドの切り替え
+
+環境変数 LLM_BACKEND で使用するモデルを選択する。
+
+* gemini (デフォルト): LLM_MODEL_ID の Gemini モデルを使用
+* fake: ネットワーク・クォータ不要の決定的な疑似LLM (FakeLlm) を使用。
+  オフラインでの負荷試験・回帰テスト用
+"""
+
+import asyncio
+import json
+import math
+import random
+import re
+from pathlib import Path
+from typing import Any, AsyncGenerator
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+from pydantic import Field
+
+from config import (
+    LLM_BACKEND,
+    LLM_MODEL_ID,
+    FAKE_LLM_SEED,
+    FAKE_LLM_LATENCY_MS,
+    FAKE_LLM_LATENCY_JITTER_MS,
+    FAKE_LLM_LATENCY_DISTRIBUTION,
+    FAKE_LLM_TOKEN_INTERVAL_MS,
+    FAKE_LLM_CHUNK_SIZE,
+    FAKE_LLM_SCRIPT,
+)
+
+
+DEFAULT_SCRIPT_PATH = Path(__file__).parent / "fake_llm_script.json"
+
+
+class FakeLlm(BaseLlm):
+    """スクリプトとシードに基づいて応答を返す疑似LLM
+
+    同じシード・同じ入力に対しては常に同じ応答とレイテンシを返す。
+    スクリプト(JSON)の形式:
+        {
+          "rules": [
+            {"pattern": "方言", "function_call": {"name": "send_message", "args": {"task": "{input}"}}},
+            {"pattern": "こんにちは", "text": "はいさい！"}
+          ],
+          "responses": ["応答候補1", "応答候補2"]
+        }
+    rules は最後のユーザー発話に対して上から順に評価され、最初にマッチしたものが使われる。
+    function_call はリクエストに該当ツールが宣言されている場合のみ発行される。
+    ツールの実行結果を受け取った後は、その内容をそのまま中継するテキストを返す。
+    """
+
+    model: str = "fake-llm"
+    seed: int = 0
+    latency_ms: float = 0.0
+    latency_jitter_ms: float = 0.0
+    latency_distribution: str = "fixed"
+    token_interval_ms: float = 0.0
+    chunk_size: int = 8
+    rules: list[dict[str, Any]] = Field(default_factory=list)
+    responses: list[str] = Field(default_factory=list)
+
+    @classmethod
+    def supported_models(cls) -> list[str]:
+        return [r"fake-.*"]
+
+    @classmethod
+    def from_config(cls) -> "FakeLlm":
+        """config.py の設定から疑似LLMを生成する"""
+        script = load_script(FAKE_LLM_SCRIPT)
+        return cls(
+            model=f"fake-{LLM_MODEL_ID or 'llm'}",
+            seed=FAKE_LLM_SEED,
+            latency_ms=FAKE_LLM_LATENCY_MS,
+            latency_jitter_ms=FAKE_LLM_LATENCY_JITTER_MS,
+            latency_distribution=FAKE_LLM_LATENCY_DISTRIBUTION,
+            token_interval_ms=FAKE_LLM_TOKEN_INTERVAL_MS,
+            chunk_size=FAKE_LLM_CHUNK_SIZE,
+            rules=script.get("rules", []),
+            responses=script.get("responses", []),
+        )
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        last_content = llm_request.contents[-1] if llm_request.contents else None
+        user_text = _content_text(last_content)
+        # 入力ごとに乱数系列を固定し、並行実行の順序に依存しない決定性を保つ
+        rng = random.Random(f"{self.seed}:{user_text}")
+
+        function_responses = _function_responses(last_content)
+        if function_responses:
+            content = _model_text(_relay_text(function_responses))
+        else:
+            content = self._respond(user_text, llm_request, rng)
+
+        await asyncio.sleep(self._sample_latency(rng) / 1000)
+        usage = _usage_metadata(llm_request, content)
+
+        text = _content_text(content)
+        if not stream or not text:
+            yield LlmResponse(content=content, usage_metadata=usage)
+            return
+
+        # SSEストリーミング: 部分応答を送った後に結合済みの応答を送る (Gemini実装と同じ流儀)
+        for i in range(0, len(text), self.chunk_size):
+            if i and self.token_interval_ms:
+                await asyncio.sleep(self.token_interval_ms / 1000)
+            yield LlmResponse(
+                content=_model_text(text[i : i + self.chunk_size]), partial=True
+            )
+        yield LlmResponse(content=content, usage_metadata=usage)
+
+    def _respond(
+        self, user_text: str, llm_request: LlmRequest, rng: random.Random
+    ) -> types.Content:
+        for rule in self.rules:
+            if not re.search(rule.get("pattern", ".*"), user_text):
+                continue
+            function_call = rule.get("function_call")
+            if function_call:
+                if function_call["name"] not in llm_request.tools_dict:
+                    continue
+                return types.ModelContent(
+                    parts=[
+                        types.Part(
+                            function_call=types.FunctionCall(
+                                name=function_call["name"],
+                                args=_fill_template(
+                                    function_call.get("args", {}), user_text
+                                ),
+                            )
+                        )
+                    ]
+                )
+            if "text" in rule:
+                return _model_text(_fill_template(rule["text"], user_text))
+
+        if self.responses:
+            return _model_text(_fill_template(rng.choice(self.responses), user_text))
+        return _model_text(f"[{self.model}] {user_text}")
+
+    def _sample_latency(self, rng: random.Random) -> float:
+        """設定された分布に従ってレイテンシ(ms)をサンプリングする"""
+        mean, jitter = self.latency_ms, self.latency_jitter_ms
+        if self.latency_distribution == "uniform":
+            value = rng.uniform(mean - jitter, mean + jitter)
+        elif self.latency_distribution == "normal":
+            value = rng.gauss(mean, jitter)
+        elif self.latency_distribution == "lognormal" and mean > 0:
+            # mean を中央値、jitter/mean を対数標準偏差として扱う
+            value = rng.lognormvariate(math.log(mean), jitter / mean)
+        else:
+            value = mean
+        return max(value, 0.0)
+
+
+def load_script(path: str) -> dict[str, Any]:
+    """疑似LLMのスクリプトを読み込む（未指定時はモジュール横の fake_llm_script.json）"""
+    script_path = Path(path) if path else DEFAULT_SCRIPT_PATH
+    if not script_path.exists():
+        return {}
+    with script_path.open(encoding="utf-8") as f:
+        return json.load(f)
+
+
+def create_model() -> str | BaseLlm:
+    """LLM_BACKEND に応じて LlmAgent に渡すモデルを返す"""
+    if LLM_BACKEND == "fake":
+        return FakeLlm.from_config()
+    return LLM_MODEL_ID
+
+
+async def probe_model(model: BaseLlm) -> None:
+    """モデルに到達できるかを確認する。到達できない場合は例外を送出する
+
+    Gemini はトークンを消費しないモデル情報の取得で確認する。疑似LLMは常に到達できる。
+    """
+    if isinstance(model, FakeLlm):
+        return
+    await model.api_client.aio.models.get(model=model.model)
+
+
+def _model_text(text: str) -> types.Content:
+    return types.ModelContent(parts=[types.Part(text=text)])
+
+
+def _content_text(content: types.Content | None) -> str:
+    if not content or not content.parts:
+        return ""
+    return "".join(part.text for part in content.parts if part.text)
+
+
+def _function_responses(content: types.Content | None) -> list[Any]:
+    if not content or not content.parts:
+        return []
+    return [
+        part.function_response.response
+        for part in content.parts
+        if part.function_response
+    ]
+
+
+def _relay_text(responses: list[Any]) -> str:
+    """ツールの実行結果に含まれるテキストをそのまま中継する"""
+    texts = []
+    for response in responses:
+        found = _collect_texts(response)
+        texts.extend(found or [json.dumps(response, ensure_ascii=False)])
+    return "\n".join(texts)
+
+
+def _collect_texts(obj: Any) -> list[str]:
+    if isinstance(obj, dict):
+        if isinstance(obj.get("text"), str):
+            return [obj["text"]]
+        return [text for value in obj.values() for text in _collect_texts(value)]
+    if isinstance(obj, list):
+        return [text for item in obj for text in _collect_texts(item)]
+    return []
+
+
+def _fill_template(value: Any, user_text: str) -> Any:
+    if isinstance(value, str):
+        return value.replace("{input}", user_text)
+    if isinstance(value, dict):
+        return {k: _fill_template(v, user_text) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_fill_template(v, user_text) for v in value]
+    return value
+
+
+def _usage_metadata(
+    llm_request: LlmRequest, content: types.Content
+) -> types.GenerateContentResponseUsageMetadata:
+    """文字数ベースの概算トークン数を返す"""
+    prompt_chars = sum(len(_content_text(c)) for c in llm_request.contents)
+    if llm_request.config and isinstance(llm_request.config.system_instruction, str):
+        prompt_chars += len(llm_request.config.system_instruction)
+    output_chars = len(_content_text(content))
+    return types.GenerateContentResponseUsageMetadata(
+        prompt_token_count=prompt_chars,
+        candidates_token_count=output_chars,
+        total_token_count=prompt_chars + output_chars,
+    )
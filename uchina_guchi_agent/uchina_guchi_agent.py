@@ -1,6 +1,9 @@
+from typing import Optional
+
 from google.adk.agents import LlmAgent
 
-from config import LLM_MODEL_ID
+from history_policy import HistoryPolicy
+from llm_backend import create_model
 
 
 _prompt = """
@@ -25,10 +28,13 @@ _prompt = """
 </CONSTRAINTS>
 """
 
-def create_agent() -> LlmAgent:
+def create_agent(history_policy: Optional[HistoryPolicy] = None) -> LlmAgent:
     return LlmAgent(
-        model=LLM_MODEL_ID,
+        model=create_model(),
         name="uchina_guchi_agent",
         description="ユーザーから受け取った日本語を沖縄方言に変換するエージェントです。",
-        instruction=_prompt
+        instruction=_prompt,
+        # モデルに送る会話履歴を絞り込み、プロンプトのトークン数を記録する
+        before_model_callback=history_policy and history_policy.before_model_callback,
+        after_model_callback=history_policy and history_policy.after_model_callback,
     )